@@ -0,0 +1,382 @@
+import time
+import pickle
+import logging
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+
+from project.forecasting import CompactProphetEngine
+
+from .global_model import GlobalBikeForecaster
+
+logger = logging.getLogger(__name__)
+
+# Width of the prediction intervals of the baseline, the same as the default of Prophet
+_INTERVAL_WIDTH = 0.8
+
+# Minimum number of observations of a station to fit a per-station model
+_MIN_OBSERVATIONS = 2
+
+class PersistenceBacktestModel:
+    per_station = True
+
+    def fit(self, train_df):
+        """
+        Fits the persistence baseline, which predicts the last observed availability of every station, with an
+        interval from the spread of the changes of the availability over each horizon in the training data.
+
+        :param train_df: DataFrame with consecutive hourly timestamps as index and the station IDs as columns.
+        :type train_df: pandas.DataFrame
+
+        :returns: The fitted model.
+        :rtype: PersistenceBacktestModel
+        """
+        self.last_time = train_df.index[-1]
+        self.last_values = train_df.ffill().iloc[-1].values.astype(float)
+        self.values = train_df.values.T.astype(float)
+        return self
+
+    def predict(self, timestamps):
+        horizons = np.round((pd.DatetimeIndex(timestamps) - self.last_time) / pd.Timedelta(hours=1)).astype(int)
+        yhat = np.repeat(self.last_values[:, None], len(horizons), axis=1)
+        changes_std = np.array([
+            np.nanstd(self.values[:, h:] - self.values[:, :-h], axis=1) if 0 < h < self.values.shape[1] else np.full(len(yhat), np.nan)
+            for h in horizons
+        ]).T
+        half_width = NormalDist().inv_cdf(0.5 + _INTERVAL_WIDTH / 2) * changes_std
+        return yhat, yhat - half_width, yhat + half_width
+
+    def forecasters(self):
+        return {'persistence': (self.predict, self.last_values)}
+
+
+class ProphetBacktestModel:
+    per_station = True
+
+    def __init__(self, model_params=None, sampled=True, engine=True):
+        """
+        Initializes the per-station Prophet models of the backtest. The same fitted models are evaluated with the
+        uncertainty sampling of Prophet and with the compact engine, which differ only by their inference.
+
+        :param model_params: The keyword arguments of the Prophet models.
+        :type model_params: dict, optional
+        :param sampled: Whether to evaluate the Prophet forecasts with uncertainty sampling.
+        :type sampled: bool
+        :param engine: Whether to evaluate the compact engine forecasts with the analytic interval.
+        :type engine: bool
+        """
+        self.model_params = {'changepoint_prior_scale': 0.01} if model_params is None else model_params
+        self.sampled = sampled
+        self.engine = engine
+
+    def fit(self, train_df):
+        from prophet import Prophet
+
+        self.station_ids = list(train_df.columns)
+        self.models = {}
+        for station_id in self.station_ids:
+            series_df = pd.DataFrame({'ds': train_df.index, 'y': train_df[station_id].values}).dropna()
+            if len(series_df) >= _MIN_OBSERVATIONS:
+                self.models[station_id] = Prophet(**self.model_params).fit(series_df)
+        return self
+
+    def predict_prophet(self, timestamps):
+        forecasts = np.full((3, len(self.station_ids), len(timestamps)), np.nan)
+        future = pd.DataFrame({'ds': timestamps})
+        for i, station_id in enumerate(self.station_ids):
+            if station_id in self.models:
+                forecast = self.models[station_id].predict(future)
+                forecasts[:, i] = forecast[['yhat', 'yhat_lower', 'yhat_upper']].values.T
+        return tuple(forecasts)
+
+    def forecasters(self):
+        forecasters = {}
+        if self.sampled:
+            forecasters['prophet'] = (self.predict_prophet, self.models)
+        if self.engine and self.models:
+            try:
+                engine = CompactProphetEngine.from_models(self.models)
+            except ValueError as e:
+                logger.warning("Compact engine skipped: %s", e)
+            else:
+                rows = [i for i, station_id in enumerate(self.station_ids) if station_id in self.models]
+
+                def predict_engine(timestamps):
+                    forecasts = np.full((3, len(self.station_ids), len(timestamps)), np.nan)
+                    forecasts[:, rows] = np.array(engine.predict_interval(pd.Series(timestamps)))
+                    return tuple(forecasts)
+
+                forecasters['engine'] = (predict_engine, engine)
+        return forecasters
+
+
+class GlobalBacktestModel:
+    per_station = False
+
+    def __init__(self, **kwargs):
+        """
+        Initializes the global lag-feature model of the backtest, trained on all the stations at once.
+
+        :param kwargs: The keyword arguments of GlobalBikeForecaster.
+        :type kwargs: dict
+        """
+        self.kwargs = kwargs
+
+    def fit(self, train_df):
+        self.forecaster = GlobalBikeForecaster(**self.kwargs).fit(train_df)
+        return self
+
+    def predict(self, timestamps):
+        # The last batch is cached by the forecaster, so it is dropped to time the inference
+        self.forecaster.clear_cache()
+        return self.forecaster.predict_batch(pd.Series(timestamps))
+
+    def forecasters(self):
+        return {'global': (self.predict, self.forecaster)}
+
+
+def run_backtest_task(model, hourly_df, origins, horizon_hours, train_hours):
+    """
+    Replays the rolling forecast origins for a model and a subset of the stations. It runs in the worker processes
+    of the backtest.
+
+    At every origin, the model is fitted on the hours up to and including the origin, and the hours after it are
+    predicted and compared with the observed availability. The first prediction of every forecaster is run again
+    under tracemalloc to measure its peak memory, outside of the timed call.
+
+    :param model: The unfitted backtest model.
+    :type model: object
+    :param hourly_df: DataFrame with consecutive hourly timestamps as index and the station IDs as columns.
+    :type hourly_df: pandas.DataFrame
+    :param origins: The forecast origins.
+    :type origins: list of pandas.Timestamp
+    :param horizon_hours: The number of hours predicted after every origin.
+    :type horizon_hours: int
+    :param train_hours: The number of hours of history the models are fitted on.
+    :type train_hours: int
+
+    :returns: A dictionary per forecaster with the absolute errors and interval hits, each of shape
+              (stations, origins, horizons), the seconds of every prediction, the size of the pickled model and
+              the peak memory of a prediction.
+    :rtype: dict
+    """
+    results = {}
+    for o, origin in enumerate(origins):
+        train_df = hourly_df.loc[origin - pd.Timedelta(hours=train_hours - 1):origin]
+        timestamps = pd.date_range(origin + pd.Timedelta(hours=1), periods=horizon_hours, freq='1H')
+        actual = hourly_df.reindex(timestamps).values.T
+
+        model.fit(train_df)
+        for name, (predict, artifact) in model.forecasters().items():
+            start = time.perf_counter()
+            yhat, yhat_lower, yhat_upper = predict(timestamps)
+            seconds = time.perf_counter() - start
+
+            if name not in results:
+                shape = (hourly_df.shape[1], len(origins), horizon_hours)
+                tracemalloc.start()
+                predict(timestamps)
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results[name] = {
+                    'abs_errors': np.full(shape, np.nan),
+                    'covered': np.full(shape, np.nan),
+                    'seconds': [],
+                    'model_bytes': len(pickle.dumps(artifact)),
+                    'peak_bytes': peak_bytes
+                }
+
+            result = results[name]
+            known = ~np.isnan(actual) & ~np.isnan(yhat)
+            result['abs_errors'][:, o] = np.where(known, np.abs(yhat - actual), np.nan)
+            result['covered'][:, o] = np.where(known, (yhat_lower <= actual) & (actual <= yhat_upper), np.nan)
+            result['seconds'].append(seconds)
+    return results
+
+
+class ForecastBacktest:
+
+    def __init__(self, hourly_df, models, n_origins=14, origin_step=24, horizon_hours=48, train_days=28, n_workers=None,
+                 station_chunks=None):
+        """
+        Initializes a rolling-origin backtest of bike availability forecasters on the historical hourly availability.
+        The forecast origins are spaced by `origin_step` hours and end `horizon_hours` before the end of the data, so
+        that every prediction can be compared with the observed availability.
+
+        The per-station models are split into chunks of stations evaluated in a process pool, while the models
+        trained on all the stations at once run as a single task. The mean absolute error and the coverage of the
+        prediction interval are reported per station and horizon, next to the inference latency and memory, so that
+        faster forecasters can be compared with Prophet on the same data.
+
+        :param hourly_df: DataFrame with consecutive hourly timestamps as index and the station IDs as columns.
+        :type hourly_df: pandas.DataFrame
+        :param models: The unfitted backtest models, e.g. ProphetBacktestModel, GlobalBacktestModel and
+                       PersistenceBacktestModel.
+        :type models: list
+        :param n_origins: The number of forecast origins.
+        :type n_origins: int
+        :param origin_step: The number of hours between consecutive origins.
+        :type origin_step: int
+        :param horizon_hours: The number of hours predicted after every origin.
+        :type horizon_hours: int
+        :param train_days: The number of days of history the models are fitted on at every origin.
+        :type train_days: int
+        :param n_workers: The number of worker processes. The tasks run in the current process if 1.
+        :type n_workers: int, optional
+        :param station_chunks: The number of chunks the stations of the per-station models are split into. Defaults
+                               to the number of workers.
+        :type station_chunks: int, optional
+        """
+        self.hourly_df = hourly_df
+        self.models = models
+        self.n_origins = n_origins
+        self.origin_step = origin_step
+        self.horizon_hours = horizon_hours
+        self.train_hours = train_days * 24
+        self.n_workers = n_workers
+        self.station_chunks = station_chunks
+
+    def get_origins(self):
+        """
+        Calculates the forecast origins, the last one `horizon_hours` before the end of the data.
+
+        :returns: The forecast origins, in chronological order.
+        :rtype: list of pandas.Timestamp
+
+        :raises ValueError: If the data does not cover the training window, the origins and the horizon.
+        """
+        last = len(self.hourly_df) - 1 - self.horizon_hours
+        positions = [last - i * self.origin_step for i in range(self.n_origins)][::-1]
+        if positions[0] < self.train_hours - 1:
+            raise ValueError(
+                f"At least {self.train_hours + (self.n_origins - 1) * self.origin_step + self.horizon_hours} hours of "
+                "history are required."
+            )
+        return [self.hourly_df.index[position] for position in positions]
+
+    def get_tasks(self):
+        """
+        Splits the backtest into tasks: one per chunk of stations for the per-station models, and one per model for
+        the models trained on all the stations.
+
+        :returns: The model and the station IDs of every task.
+        :rtype: list of tuple
+        """
+        n_chunks = self.station_chunks or self.n_workers or 1
+        station_ids = list(self.hourly_df.columns)
+        tasks = []
+        for model in self.models:
+            if model.per_station:
+                tasks.extend((model, chunk.tolist()) for chunk in np.array_split(station_ids, n_chunks) if len(chunk))
+            else:
+                tasks.append((model, station_ids))
+        return tasks
+
+    @staticmethod
+    def merge_results(task_results, station_ids):
+        """
+        Merges the results of the tasks of every forecaster, concatenating the stations and adding up the latency
+        and memory of the chunks.
+
+        :param task_results: The station IDs and the results of every task.
+        :type task_results: list of tuple
+        :param station_ids: The station IDs, in the order of the merged arrays.
+        :type station_ids: list
+
+        :returns: The merged results of every forecaster.
+        :rtype: dict
+        """
+        positions = {station_id: i for i, station_id in enumerate(station_ids)}
+        merged = {}
+        for task_station_ids, results in task_results:
+            rows = [positions[station_id] for station_id in task_station_ids]
+            for name, result in results.items():
+                if name not in merged:
+                    shape = (len(station_ids),) + result['abs_errors'].shape[1:]
+                    merged[name] = {
+                        'abs_errors': np.full(shape, np.nan),
+                        'covered': np.full(shape, np.nan),
+                        'seconds': np.zeros(len(result['seconds'])),
+                        'model_bytes': 0,
+                        'peak_bytes': 0
+                    }
+                merged[name]['abs_errors'][rows] = result['abs_errors']
+                merged[name]['covered'][rows] = result['covered']
+                merged[name]['seconds'] += result['seconds']
+                merged[name]['model_bytes'] += result['model_bytes']
+                merged[name]['peak_bytes'] += result['peak_bytes']
+        return merged
+
+    def run(self):
+        """
+        Runs the backtest and summarises the accuracy, latency and memory of every forecaster.
+
+        :returns: A dictionary with the backtest settings and, per forecaster, the overall and per-horizon mean
+                  absolute error and coverage, the per-station mean absolute error, the mean seconds to predict all the
+                  stations at an origin, the size of the pickled models and the peak memory of a prediction.
+        :rtype: dict
+        """
+        origins = self.get_origins()
+        station_ids = list(self.hourly_df.columns)
+        tasks = self.get_tasks()
+        arguments = [
+            (model, self.hourly_df[task_station_ids], origins, self.horizon_hours, self.train_hours)
+            for model, task_station_ids in tasks
+        ]
+
+        if self.n_workers == 1:
+            outputs = [run_backtest_task(*args) for args in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+                outputs = list(executor.map(run_backtest_task, *zip(*arguments)))
+        merged = self.merge_results([(task[1], output) for task, output in zip(tasks, outputs)], station_ids)
+
+        self.results = merged
+        return {
+            'run_time': datetime.now().isoformat(timespec='seconds'),
+            'n_stations': len(station_ids),
+            'n_origins': len(origins),
+            'horizon_hours': self.horizon_hours,
+            'origins': [origin.isoformat() for origin in origins],
+            'models': {
+                name: {
+                    'mae': float(np.nanmean(result['abs_errors'])),
+                    'coverage': float(np.nanmean(result['covered'])),
+                    'mae_by_horizon': np.nanmean(result['abs_errors'], axis=(0, 1)).tolist(),
+                    'coverage_by_horizon': np.nanmean(result['covered'], axis=(0, 1)).tolist(),
+                    'mae_by_station': dict(zip(
+                        [int(station_id) for station_id in station_ids],
+                        np.nanmean(result['abs_errors'], axis=(1, 2)).tolist()
+                    )),
+                    'seconds_per_forecast': float(np.mean(result['seconds'])),
+                    'model_bytes': result['model_bytes'],
+                    'peak_predict_bytes': result['peak_bytes']
+                }
+                for name, result in merged.items()
+            }
+        }
+
+    def to_frame(self):
+        """
+        Converts the results of the last run into a DataFrame with the mean absolute error and coverage of every
+        forecaster, station and horizon.
+
+        :returns: DataFrame with the model, station_id, horizon, mae and coverage columns.
+        :rtype: pandas.DataFrame
+        """
+        station_ids = list(self.hourly_df.columns)
+        frames = []
+        for name, result in self.results.items():
+            mae = np.nanmean(result['abs_errors'], axis=1)
+            coverage = np.nanmean(result['covered'], axis=1)
+            frames.append(pd.DataFrame({
+                'model': name,
+                'station_id': np.repeat(station_ids, mae.shape[1]),
+                'horizon': np.tile(np.arange(1, mae.shape[1] + 1), len(station_ids)),
+                'mae': mae.ravel(),
+                'coverage': coverage.ravel()
+            }))
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,274 @@
+import time
+import subprocess
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from scipy.spatial.distance import cdist
+
+from .recommender import BikeRecommender
+from .simulator import InventorySimulator
+
+# Phases of the recommender that are timed, mapped to the methods implementing them
+_PHASE_METHODS = {
+    'probabilities': 'calculate_run_out_probabilities',
+    'surplus': 'calculate_bike_surplus',
+    'priority': 'rank_destination_stations',
+    'moves': 'move_bike_surplus'
+}
+
+class StubForecastModel:
+
+    def __init__(self, yhat, band_width):
+        """
+        Initializes a stub forecast model that returns a canned forecast instead of running Prophet.
+
+        :param yhat: The predicted number of available bikes for each timestamp to predict.
+        :type yhat: numpy.ndarray
+        :param band_width: The width of the uncertainty band around the predictions.
+        :type band_width: float
+        """
+        self.yhat = yhat
+        self.band_width = band_width
+
+    def predict(self, future):
+        """
+        Returns the canned forecast for the requested timestamps, in the format of a Prophet forecast.
+
+        :param future: DataFrame with a 'ds' column containing the timestamps to predict.
+        :type future: pandas.DataFrame
+
+        :returns: DataFrame with columns ds, yhat, yhat_lower and yhat_upper.
+        :rtype: pandas.DataFrame
+        """
+        yhat = np.resize(self.yhat, len(future))
+        return pd.DataFrame({
+            'ds': future['ds'].values,
+            'yhat': yhat,
+            'yhat_lower': yhat - self.band_width / 2,
+            'yhat_upper': yhat + self.band_width / 2
+        })
+
+
+class SyntheticBikeNetwork:
+
+    def __init__(self, n_stations, hours_to_predict=10, station_density=5.0, seed=0):
+        """
+        Initializes a generator of synthetic bike station networks with the structure expected by the recommender.
+
+        :param n_stations: The number of stations in the network.
+        :type n_stations: int
+        :param hours_to_predict: The number of hourly timestamps to predict.
+        :type hours_to_predict: int
+        :param station_density: The number of stations per square kilometer, used to size the network area.
+        :type station_density: float
+        :param seed: Seed of the random number generator.
+        :type seed: int
+        """
+        self.n_stations = n_stations
+        self.hours_to_predict = hours_to_predict
+        self.station_density = station_density
+        self.rng = np.random.default_rng(seed)
+
+    def generate_stations(self):
+        """
+        Generates stations with capacities between 15 and 40 stands, similar to the Dublin bikes network,
+        and a random occupancy for each station.
+
+        :returns: DataFrame with columns id, x, y, capacity, available_bikes and available_bike_stands,
+                  where x and y are the station coordinates in kilometres, the unit of the
+                  BikeDistance table.
+        :rtype: pandas.DataFrame
+        """
+        side = np.sqrt(self.n_stations / self.station_density)
+        capacity = self.rng.integers(15, 41, self.n_stations)
+        available_bikes = self.rng.binomial(capacity, self.rng.beta(2, 2, self.n_stations))
+        return pd.DataFrame({
+            'id': np.arange(1, self.n_stations + 1),
+            'x': self.rng.uniform(0, side, self.n_stations),
+            'y': self.rng.uniform(0, side, self.n_stations),
+            'capacity': capacity,
+            'available_bikes': available_bikes,
+            'available_bike_stands': capacity - available_bikes
+        })
+
+    def generate_distances(self, stations_df):
+        """
+        Generates the Euclidean distance matrix between all pairs of different stations.
+
+        :param stations_df: DataFrame with the station ids and coordinates.
+        :type stations_df: pandas.DataFrame
+
+        :returns: DataFrame with columns station_from, station_to and distance.
+        :rtype: pandas.DataFrame
+        """
+        coords = stations_df[['x', 'y']].values
+        distances = cdist(coords, coords)
+        station_from, station_to = np.nonzero(~np.eye(self.n_stations, dtype=bool))
+        ids = stations_df['id'].values.astype(np.int32)
+        return pd.DataFrame({
+            'station_from': ids[station_from],
+            'station_to': ids[station_to],
+            'distance': distances[station_from, station_to]
+        })
+
+    def generate_forecast_models(self, stations_df):
+        """
+        Generates a stub forecast model per station. The predicted availability drifts from the current
+        availability with a daily pattern, and the uncertainty band grows with the station capacity.
+
+        :param stations_df: DataFrame with the station ids, capacities and available bikes.
+        :type stations_df: pandas.DataFrame
+
+        :returns: A dictionary with station ids as keys and stub forecast models as values.
+        :rtype: dict
+        """
+        hours = np.arange(self.hours_to_predict)
+        forecast_models = {}
+        for station in stations_df.itertuples():
+            phase = self.rng.uniform(0, 2 * np.pi)
+            yhat = station.available_bikes + 0.3 * station.capacity * np.sin(2 * np.pi * hours / 24 + phase)
+            yhat = np.clip(yhat, 0, station.capacity)
+            forecast_models[station.id] = StubForecastModel(yhat, band_width=0.4 * station.capacity)
+        return forecast_models
+
+    def generate(self):
+        """
+        Generates the inputs of the bike recommender for a synthetic network.
+
+        :returns: A dictionary with the stations_df, distances_df, forecast_model and timestamps_to_predict
+                  arguments of the recommender.
+        :rtype: dict
+        """
+        stations_df = self.generate_stations()
+        timestamps_to_predict = pd.date_range(datetime(2024, 1, 1, 8), periods=self.hours_to_predict, freq='1H')
+        return {
+            'stations_df': stations_df[['id', 'capacity', 'available_bikes', 'available_bike_stands']],
+            'distances_df': self.generate_distances(stations_df),
+            'forecast_model': self.generate_forecast_models(stations_df),
+            'timestamps_to_predict': pd.DataFrame(timestamps_to_predict, columns=['ds'])
+        }
+
+
+class RecommenderBenchmark:
+
+    def __init__(self, sizes, candidate_neighbours=None, candidate_radius=None, n_scenarios=500, seed=0):
+        """
+        Initializes a benchmark of the bike recommender on synthetic networks of different sizes.
+
+        :param sizes: The numbers of stations of the benchmarked networks.
+        :type sizes: list of int
+        :param candidate_neighbours: The candidate_neighbours option of the recommender.
+        :type candidate_neighbours: int, optional
+        :param candidate_radius: The candidate_radius option of the recommender, in kilometres.
+        :type candidate_radius: float, optional
+        :param n_scenarios: The number of Monte Carlo scenarios used to evaluate the plans. Plans are not
+                            evaluated if 0.
+        :type n_scenarios: int
+        :param seed: Seed used to generate the synthetic networks.
+        :type seed: int
+        """
+        self.sizes = sizes
+        self.candidate_neighbours = candidate_neighbours
+        self.candidate_radius = candidate_radius
+        self.n_scenarios = n_scenarios
+        self.seed = seed
+
+    @staticmethod
+    def get_commit():
+        """
+        Retrieves the current git commit, so that results can be compared across commits.
+
+        :returns: The abbreviated commit hash, or None if it cannot be determined.
+        :rtype: str or None
+        """
+        try:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def time_phases(recommender):
+        """
+        Wraps the methods of a recommender instance implementing each phase, so that the time spent in
+        every phase is accumulated in the returned dictionary.
+
+        :param recommender: The recommender instance to instrument.
+        :type recommender: BikeRecommender
+
+        :returns: A dictionary with phase names as keys and accumulated seconds as values.
+        :rtype: dict
+        """
+        phase_seconds = dict.fromkeys(_PHASE_METHODS, 0.0)
+
+        def timed(phase, method):
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    phase_seconds[phase] += time.perf_counter() - start
+            return wrapper
+
+        for phase, method_name in _PHASE_METHODS.items():
+            setattr(recommender, method_name, timed(phase, getattr(recommender, method_name)))
+        return phase_seconds
+
+    def run_size(self, n_stations):
+        """
+        Generates a synthetic network and times the generation of recommendations end to end and per phase.
+        The resulting plan is then evaluated with the Monte Carlo inventory simulator against doing nothing.
+
+        :param n_stations: The number of stations of the network.
+        :type n_stations: int
+
+        :returns: A dictionary with the benchmark result for the network.
+        :rtype: dict
+        """
+        network = SyntheticBikeNetwork(n_stations, seed=self.seed).generate()
+        recommender = BikeRecommender(
+            candidate_neighbours=self.candidate_neighbours,
+            candidate_radius=self.candidate_radius,
+            **network
+        )
+        phase_seconds = self.time_phases(recommender)
+
+        start = time.perf_counter()
+        recommendations = recommender.generate_recommendations()
+        total_seconds = time.perf_counter() - start
+
+        result = {
+            'n_stations': n_stations,
+            'candidate_neighbours': self.candidate_neighbours,
+            'candidate_radius': self.candidate_radius,
+            'total_seconds': total_seconds,
+            'phase_seconds': phase_seconds,
+            'n_moves': len(recommendations),
+            'bikes_moved': int(sum(move['bikes_to_move'] for move in recommendations))
+        }
+
+        if self.n_scenarios > 0:
+            simulator = InventorySimulator(
+                stations_df=network['stations_df'],
+                forecast_model=network['forecast_model'],
+                timestamps_to_predict=network['timestamps_to_predict'],
+                n_scenarios=self.n_scenarios,
+                seed=self.seed
+            )
+            baseline = simulator.evaluate([])
+            evaluation = simulator.evaluate(recommendations)
+            result['baseline_empty_station_hours'] = baseline['expected_empty_station_hours']
+            result['baseline_full_station_hours'] = baseline['expected_full_station_hours']
+            result['expected_empty_station_hours'] = evaluation['expected_empty_station_hours']
+            result['expected_full_station_hours'] = evaluation['expected_full_station_hours']
+        return result
+
+    def run(self):
+        """
+        Runs the benchmark for every network size.
+
+        :returns: A list with the benchmark results, each tagged with the commit and the time of the run.
+        :rtype: list of dict
+        """
+        commit = self.get_commit()
+        run_time = datetime.now().isoformat(timespec='seconds')
+        return [{'commit': commit, 'run_time': run_time, **self.run_size(n_stations)} for n_stations in self.sizes]
@@ -0,0 +1,116 @@
+import pandas as pd
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from project.caching import invalidate_post_responses
+
+from .models import BikeStation, BikeForecast
+
+# Number of hours ahead materialised in the forecasts table
+FORECAST_HORIZON_HOURS = 48
+
+# Namespace of the cached prediction responses, invalidated when new forecasts are stored
+PREDICTIONS_CACHE_NAMESPACE = 'bike_predictions'
+
+def get_forecast_hour(timestamp):
+    """
+    Truncates a timestamp to the start of its hour, which is the resolution of the materialised forecasts.
+
+    :param timestamp: The timestamp to truncate.
+    :type timestamp: datetime
+
+    :returns: The start of the hour of the timestamp.
+    :rtype: datetime
+    """
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+class BikeForecastMaterialiser:
+
+    def __init__(self, forecast_model, start_time=None, horizon_hours=FORECAST_HORIZON_HOURS):
+        """
+        Initializes a job that predicts the hourly bike availability of every station over the next hours
+        and stores the predictions in the bike forecasts table.
+
+        :param forecast_model: A dictionary of forecasting models, one per station ID.
+        :type forecast_model: dict
+        :param start_time: The first hour to forecast. Defaults to the current hour.
+        :type start_time: datetime, optional
+        :param horizon_hours: The number of hourly timestamps to forecast.
+        :type horizon_hours: int
+        """
+        self.forecast_model = forecast_model
+        self.start_time = get_forecast_hour(datetime.now()) if start_time is None else start_time
+        self.horizon_hours = horizon_hours
+
+    def get_timestamps(self):
+        """
+        Creates the hourly timestamps of the forecast horizon.
+
+        :returns: DataFrame with a 'ds' column containing the timestamps to forecast.
+        :rtype: pandas.DataFrame
+        """
+        return pd.DataFrame({ 'ds': pd.date_range(self.start_time, periods=self.horizon_hours, freq='1H') })
+
+    def predict_stations(self):
+        """
+        Predicts the whole horizon of every station with a single call to each station model.
+
+        :returns: DataFrame with columns station_id, ts, prediction, prediction_lower and prediction_upper.
+        :rtype: pandas.DataFrame
+        """
+        future = self.get_timestamps()
+        station_ids = BikeStation.objects.values_list('id', flat=True)
+
+        forecasts = []
+        for station_id in station_ids:
+            if station_id not in self.forecast_model:
+                continue
+            forecast = self.forecast_model[station_id].predict(future)
+            forecasts.append(pd.DataFrame({
+                'station_id': station_id,
+                'ts': future['ds'].values,
+                'prediction': forecast['yhat'].values,
+                'prediction_lower': forecast['yhat_lower'].values,
+                'prediction_upper': forecast['yhat_upper'].values
+            }))
+        columns = ['station_id', 'ts', 'prediction', 'prediction_lower', 'prediction_upper']
+        return pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(columns=columns)
+
+    def store(self, forecasts_df):
+        """
+        Replaces the materialised forecasts with the given predictions in a single transaction, so that
+        requests never read a partially written horizon.
+
+        :param forecasts_df: DataFrame with columns station_id, ts, prediction, prediction_lower and prediction_upper.
+        :type forecasts_df: pandas.DataFrame
+
+        :returns: The number of stored forecasts.
+        :rtype: int
+        """
+        forecasts = [
+            BikeForecast(
+                station_id=int(row.station_id),
+                ts=timezone.make_aware(pd.Timestamp(row.ts).to_pydatetime()),
+                prediction=float(row.prediction),
+                prediction_lower=float(row.prediction_lower),
+                prediction_upper=float(row.prediction_upper)
+            )
+            for row in forecasts_df.itertuples()
+        ]
+        with transaction.atomic():
+            BikeForecast.objects.all().delete()
+            BikeForecast.objects.bulk_create(forecasts, batch_size=5000)
+        invalidate_post_responses(PREDICTIONS_CACHE_NAMESPACE)
+        return len(forecasts)
+
+    def run(self):
+        """
+        Predicts and stores the forecasts of every station over the horizon.
+
+        :returns: The number of stored forecasts.
+        :rtype: int
+        """
+        return self.store(self.predict_stations())
@@ -0,0 +1,297 @@
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from statistics import NormalDist
+
+from django.db.models import Avg
+from django.db.models.functions import Trunc
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from .models import BikeAvailability
+
+# Hours before the forecast origin used as lag features: the last hours, the same hour of the previous day and week
+_LAG_HOURS = (0, 1, 2, 3, 23, 167)
+
+# Number of hours ahead predicted by the model
+GLOBAL_MODEL_HORIZON_HOURS = 48
+
+# Width of the prediction interval, the same as the default of Prophet
+_INTERVAL_WIDTH = 0.8
+
+# Station codes are categorical features, which the histogram gradient boosting supports below this cardinality
+_MAX_CATEGORICAL_STATIONS = 254
+
+def load_hourly_availability(start_time, end_time, station_ids=None):
+    """
+    Reads the hourly average of the available bikes of every station from the bike availability table, averaged
+    over hourly buckets in the database.
+
+    :param start_time: The start of the time range.
+    :type start_time: datetime
+    :param end_time: The end of the time range.
+    :type end_time: datetime
+    :param station_ids: The IDs of the stations to read. All stations are read if None.
+    :type station_ids: list of int, optional
+
+    :returns: DataFrame with the hourly timestamps as index and the station IDs as columns, with NaN for the hours
+              without data.
+    :rtype: pandas.DataFrame
+    """
+    availability = BikeAvailability.objects.filter(last_update_time__gte=start_time, last_update_time__lt=end_time)
+    if station_ids is not None:
+        availability = availability.filter(station_id__in=station_ids)
+    buckets = availability.annotate(ts=Trunc('last_update_time', 'hour')).values('station_id', 'ts').annotate(
+        available_bikes=Avg('available_bikes')
+    )
+    buckets_df = pd.DataFrame(buckets, columns=['station_id', 'ts', 'available_bikes'])
+    buckets_df['ts'] = pd.to_datetime(buckets_df['ts'], utc=True).dt.tz_localize(None)
+    hours = pd.date_range(pd.Timestamp(start_time).tz_localize(None).floor('H'), pd.Timestamp(end_time).tz_localize(None).floor('H'), freq='1H', inclusive='left')
+    return buckets_df.pivot_table(index='ts', columns='station_id', values='available_bikes').reindex(hours)
+
+
+class GlobalStationModel:
+
+    def __init__(self, forecaster, station_id):
+        """
+        Initializes a view of a single station of a global forecaster, exposing the `predict` interface of a
+        Prophet model so that it can replace one in the existing code.
+
+        :param forecaster: The global forecaster.
+        :type forecaster: GlobalBikeForecaster
+        :param station_id: The ID of the station.
+        :type station_id: int
+        """
+        self.forecaster = forecaster
+        self.station_id = station_id
+
+    def predict(self, future):
+        """
+        Predicts the availability of the station for the requested timestamps. All the stations are predicted
+        together on the first call with new timestamps, and the next stations are served from that batch.
+
+        :param future: DataFrame with a 'ds' column containing the timestamps to predict.
+        :type future: pandas.DataFrame
+
+        :returns: DataFrame with columns ds, yhat, yhat_lower and yhat_upper.
+        :rtype: pandas.DataFrame
+        """
+        yhat, yhat_lower, yhat_upper = self.forecaster.predict_batch(future['ds'])
+        index = self.forecaster.station_index[self.station_id]
+        return pd.DataFrame({
+            'ds': pd.to_datetime(future['ds']).values,
+            'yhat': yhat[index],
+            'yhat_lower': yhat_lower[index],
+            'yhat_upper': yhat_upper[index]
+        })
+
+
+class GlobalBikeForecaster:
+
+    def __init__(self, regressor=None, horizon_hours=GLOBAL_MODEL_HORIZON_HOURS, origin_step=6):
+        """
+        Initializes a single forecasting model shared by all the bike stations, as an alternative to one Prophet model
+        per station. Each sample predicts the availability of a station a number of hours after a forecast origin from
+        lag features at the origin, the horizon, the calendar features of the target hour and the station, both as a
+        categorical code and as the mean and standard deviation of its availability.
+
+        The forecaster keeps the recent hourly availability of the stations to build the lag features, which
+        `update_history` refreshes without retraining. It exposes the dictionary interface of the Prophet models,
+        with one model per station ID. As the served forecaster is shared by the threads of a process, a refresh
+        swaps in a new history rather than modifying the current one.
+
+        :param regressor: The scikit-learn regressor. Defaults to a histogram gradient boosting regressor.
+        :type regressor: sklearn.base.RegressorMixin, optional
+        :param horizon_hours: The number of hours ahead predicted by the model.
+        :type horizon_hours: int
+        :param origin_step: The number of hours between the forecast origins of the training samples.
+        :type origin_step: int
+        """
+        self.regressor = HistGradientBoostingRegressor(max_iter=200) if regressor is None else regressor
+        self.horizon_hours = horizon_hours
+        self.origin_step = origin_step
+
+        self.station_ids = []
+        self.station_index = {}
+        self.station_stats = None
+        self.residual_std = None
+        self.history = None
+        self._batch = None
+
+    @property
+    def max_lag(self):
+        return max(_LAG_HOURS)
+
+    @property
+    def history_end(self):
+        return None if self.history is None else self.history[2]
+
+    def make_features(self, values, origin_times, origins, horizons):
+        """
+        Builds the features of every station, origin and horizon with vectorised indexing.
+
+        :param values: The hourly availability of the stations, with shape (stations, hours).
+        :type values: numpy.ndarray
+        :param origin_times: The timestamps of the origins.
+        :type origin_times: numpy.ndarray of datetime64
+        :param origins: The positions of the origins in the hours of `values`.
+        :type origins: numpy.ndarray of int
+        :param horizons: The horizons in hours.
+        :type horizons: numpy.ndarray of int
+
+        :returns: The features, with shape (stations, origins, horizons, features).
+        :rtype: numpy.ndarray
+        """
+        n_stations, n_origins, n_horizons = values.shape[0], len(origins), len(horizons)
+        shape = (n_stations, n_origins, n_horizons)
+
+        lags = values[:, origins[:, None] - np.array(_LAG_HOURS)[None, :]]
+        lags = np.broadcast_to(lags[:, :, None, :], shape + (len(_LAG_HOURS),))
+
+        target_times = pd.DatetimeIndex((origin_times[:, None] + horizons[None, :] * np.timedelta64(1, 'h')).ravel())
+        calendar = np.stack([target_times.hour, target_times.dayofweek], axis=-1).reshape(n_origins, n_horizons, 2)
+
+        columns = [
+            lags,
+            np.broadcast_to(horizons[None, None, :, None], shape + (1,)),
+            np.broadcast_to(calendar[None], shape + (2,)),
+            np.broadcast_to(np.arange(n_stations)[:, None, None, None], shape + (1,)),
+            np.broadcast_to(self.station_stats[:, None, None, :], shape + (2,))
+        ]
+        return np.concatenate(columns, axis=-1).astype(float)
+
+    def fit(self, hourly_df, end_time=None):
+        """
+        Trains the model on the hourly availability of the stations, with a sample for every station, origin and
+        horizon. The residuals of every horizon give the width of the prediction interval.
+
+        :param hourly_df: DataFrame with consecutive hourly timestamps as index and the station IDs as columns.
+        :type hourly_df: pandas.DataFrame
+        :param end_time: The end of the history, exclusive, as passed to `refresh_history`.
+        :type end_time: datetime, optional
+
+        :returns: The trained forecaster.
+        :rtype: GlobalBikeForecaster
+        """
+        self.station_ids = [int(station_id) for station_id in hourly_df.columns]
+        self.station_index = {station_id: i for i, station_id in enumerate(self.station_ids)}
+        values = hourly_df.values.T.astype(float)
+        self.station_stats = np.stack([np.nanmean(values, axis=1), np.nanstd(values, axis=1)], axis=-1)
+
+        origins = np.arange(self.max_lag, values.shape[1] - self.horizon_hours, self.origin_step)
+        if len(origins) == 0:
+            raise ValueError(f"At least {self.max_lag + self.horizon_hours + 1} hours of history are required.")
+        horizons = np.arange(1, self.horizon_hours + 1)
+        features = self.make_features(values, hourly_df.index.values[origins], origins, horizons)
+        targets = values[:, origins[:, None] + horizons[None, :]]
+
+        X, y = features.reshape(-1, features.shape[-1]), targets.ravel()
+        known = ~np.isnan(y)
+        if len(self.station_ids) <= _MAX_CATEGORICAL_STATIONS and isinstance(self.regressor, HistGradientBoostingRegressor):
+            categorical = np.zeros(X.shape[1], dtype=bool)
+            categorical[len(_LAG_HOURS) + 3] = True
+            self.regressor.set_params(categorical_features=categorical)
+        self.regressor.fit(X[known], y[known])
+
+        residuals = np.full(targets.shape, np.nan)
+        residuals.reshape(-1)[known] = y[known] - self.regressor.predict(X[known])
+        self.residual_std = np.sqrt(np.nanmean(residuals ** 2, axis=(0, 1)))
+
+        self.update_history(hourly_df, end_time)
+        return self
+
+    def update_history(self, hourly_df, end_time=None):
+        """
+        Replaces the recent hourly availability used to build the lag features, e.g. with the latest data read from
+        the database, without retraining the model. The last hour is the forecast origin. The new history is built
+        aside and swapped in with a single assignment, so that concurrent predictions use either the previous or the
+        new history, and the batches predicted from the previous one are no longer served.
+
+        :param hourly_df: DataFrame with consecutive hourly timestamps as index and the station IDs as columns.
+        :type hourly_df: pandas.DataFrame
+        :param end_time: The end of the history, exclusive, compared by `refresh_history` to skip reloading it.
+        :type end_time: datetime, optional
+        """
+        history = hourly_df.reindex(columns=self.station_ids).iloc[-(self.max_lag + 1):]
+        self.history = (history.index.values, history.values.T.astype(float), end_time)
+
+    def refresh_history(self, end_time):
+        """
+        Reads the hourly availability of the hours before `end_time` from the database into the lag history, unless
+        it has already been read for the same end time.
+
+        :param end_time: The end of the history, exclusive, e.g. the hour after the latest snapshot.
+        :type end_time: datetime
+
+        :returns: The forecaster, with the refreshed history.
+        :rtype: GlobalBikeForecaster
+        """
+        if end_time != self.history_end:
+            start_time = end_time - timedelta(hours=self.max_lag + 1)
+            self.update_history(load_hourly_availability(start_time, end_time, station_ids=self.station_ids), end_time)
+        return self
+
+    def predict_batch(self, timestamps):
+        """
+        Predicts every station for the requested timestamps with a single call to the regressor. The last batch is
+        kept with the history it was predicted from, so that per-station calls with the same timestamps are served
+        from it until the history is refreshed.
+
+        :param timestamps: The timestamps to predict, between one hour and `horizon_hours` after the forecast origin.
+        :type timestamps: list of datetime or pandas.Series
+
+        :returns: The yhat, yhat_lower and yhat_upper arrays, each with shape (stations, timestamps).
+        :rtype: tuple of numpy.ndarray
+
+        :raises ValueError: If the history is too short or a timestamp is outside the horizon of the model.
+        """
+        timestamps = pd.to_datetime(pd.Series(timestamps))
+        if timestamps.dt.tz is not None:
+            timestamps = timestamps.dt.tz_convert(None)
+        batch_key = tuple(timestamps.values.astype('datetime64[ns]').astype(np.int64))
+        history, batch = self.history, self._batch
+        if batch is not None and batch[0] is history and batch[1] == batch_key:
+            return batch[2]
+
+        times, values, _ = history
+        if values.shape[1] <= self.max_lag:
+            raise ValueError(f"At least {self.max_lag + 1} hours of history are required to predict.")
+        origin = values.shape[1] - 1
+        horizons = np.round((timestamps.values - times[origin]) / np.timedelta64(1, 'h')).astype(int)
+        if len(horizons) and (horizons.min() < 1 or horizons.max() > self.horizon_hours):
+            raise ValueError(
+                f"The timestamps must be between 1 and {self.horizon_hours} hours after the forecast origin "
+                f"{pd.Timestamp(times[origin])}."
+            )
+
+        features = self.make_features(values, times[[origin]], np.array([origin]), horizons)
+        yhat = self.regressor.predict(features.reshape(-1, features.shape[-1])).reshape(len(self.station_ids), len(horizons))
+        half_width = NormalDist().inv_cdf(0.5 + _INTERVAL_WIDTH / 2) * self.residual_std[horizons - 1]
+        result = (yhat, yhat - half_width, yhat + half_width)
+        self._batch = (history, batch_key, result)
+        return result
+
+    def clear_cache(self):
+        """
+        Drops the last predicted batch, so that the next call to `predict_batch` runs the regressor again, e.g. to
+        time the inference.
+        """
+        self._batch = None
+
+    def keys(self):
+        return list(self.station_ids)
+
+    def __contains__(self, station_id):
+        return station_id in self.station_index
+
+    def __getitem__(self, station_id):
+        if station_id not in self.station_index:
+            raise KeyError(station_id)
+        return GlobalStationModel(self, station_id)
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_batch'] = None
+        return state
@@ -0,0 +1,194 @@
+import numpy as np
+from datetime import timedelta
+
+from django.db.models import Avg
+from django.db.models.functions import Trunc
+
+from .models import BikeAvailability
+
+# Truncation units of the time buckets, from the finest to the coarsest, with their (maximum) duration
+_BUCKET_UNITS = [
+    ('minute', timedelta(minutes=1)),
+    ('hour', timedelta(hours=1)),
+    ('day', timedelta(days=1)),
+    ('week', timedelta(weeks=1)),
+    ('month', timedelta(days=31))
+]
+
+DOWNSAMPLING_METHODS = ('bucket', 'lttb')
+
+def get_bucket_unit(start_time, end_time, n_points):
+    """
+    Selects the finest truncation unit that splits a time range in at most the requested number of buckets.
+
+    :param start_time: The start of the time range.
+    :type start_time: datetime
+    :param end_time: The end of the time range.
+    :type end_time: datetime
+    :param n_points: The maximum number of buckets.
+    :type n_points: int
+
+    :returns: The truncation unit, one of minute, hour, day, week or month.
+    :rtype: str
+    """
+    for unit, duration in _BUCKET_UNITS:
+        if (end_time - start_time) / duration <= n_points:
+            return unit
+    return _BUCKET_UNITS[-1][0]
+
+
+def largest_triangle_three_buckets(x, y, n_points):
+    """
+    Downsamples a series with the Largest-Triangle-Three-Buckets algorithm, which keeps the first and last points
+    and, from each of the buckets in between, the point forming the largest triangle with the point kept from the
+    previous bucket and the average of the next bucket. The shape of the series, including its peaks, is preserved.
+
+    :param x: The x values of the series (e.g. timestamps in seconds), in increasing order.
+    :type x: numpy.ndarray
+    :param y: The y values of the series.
+    :type y: numpy.ndarray
+    :param n_points: The number of points to keep.
+    :type n_points: int
+
+    :returns: The indices of the kept points, in increasing order.
+    :rtype: numpy.ndarray
+    """
+    n = len(x)
+    if n_points >= n or n_points < 3:
+        return np.arange(n)
+
+    edges = np.floor(np.linspace(1, n - 1, n_points - 1)).astype(int)
+    selected = np.empty(n_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        areas = np.abs((x[a] - average_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (average_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+class BikeAvailabilityHistory:
+
+    def __init__(self, station_ids, start_time, end_time, n_points):
+        """
+        Initializes a query of the availability history of bike stations, downsampled to a number of points
+        per station so that long time ranges can be charted.
+
+        :param station_ids: The IDs of the bike stations.
+        :type station_ids: list of int
+        :param start_time: The start of the time range.
+        :type start_time: datetime
+        :param end_time: The end of the time range.
+        :type end_time: datetime
+        :param n_points: The maximum number of points per station.
+        :type n_points: int
+        """
+        self.station_ids = station_ids
+        self.start_time = start_time
+        self.end_time = end_time
+        self.n_points = n_points
+
+    def get_queryset(self):
+        """
+        Filters the availability records of the stations in the time range, which is served by the
+        (station_id, last_update_time) index.
+
+        :returns: The filtered availability records.
+        :rtype: QuerySet
+        """
+        return BikeAvailability.objects.filter(
+            station_id__in=self.station_ids,
+            last_update_time__gte=self.start_time,
+            last_update_time__lte=self.end_time
+        )
+
+    def get_bucketed_series(self):
+        """
+        Averages the availability of each station over time buckets, computed in the database by truncating the
+        update times to the finest unit giving at most the requested number of points.
+
+        :returns: A dictionary with station IDs as keys and a dictionary of timestamps, available_bikes and
+                  available_bike_stands lists as values.
+        :rtype: dict
+        """
+        unit = get_bucket_unit(self.start_time, self.end_time, self.n_points)
+        buckets = self.get_queryset().annotate(
+            bucket=Trunc('last_update_time', unit)
+        ).values('station_id', 'bucket').annotate(
+            average_bikes=Avg('available_bikes'),
+            average_bike_stands=Avg('available_bike_stands')
+        ).order_by('station_id', 'bucket')
+
+        series = self.get_empty_series()
+        for bucket in buckets:
+            station_series = series[bucket['station_id']]
+            station_series['timestamps'].append(bucket['bucket'])
+            station_series['available_bikes'].append(round(bucket['average_bikes'], 2))
+            station_series['available_bike_stands'].append(round(bucket['average_bike_stands'], 2))
+        return series
+
+    def get_lttb_series(self):
+        """
+        Downsamples the availability of each station with the Largest-Triangle-Three-Buckets algorithm on the
+        available bikes, keeping actual records rather than averages.
+
+        :returns: A dictionary with station IDs as keys and a dictionary of timestamps, available_bikes and
+                  available_bike_stands lists as values.
+        :rtype: dict
+        """
+        records = self.get_queryset().values_list(
+            'station_id', 'last_update_time', 'available_bikes', 'available_bike_stands'
+        ).order_by('station_id', 'last_update_time')
+
+        records_per_station = {station_id: [] for station_id in self.station_ids}
+        for record in records:
+            records_per_station[record[0]].append(record[1:])
+
+        series = self.get_empty_series()
+        for station_id, station_records in records_per_station.items():
+            if not station_records:
+                continue
+            timestamps, available_bikes, available_bike_stands = zip(*station_records)
+            x = np.array([timestamp.timestamp() for timestamp in timestamps])
+            indices = largest_triangle_three_buckets(x, np.array(available_bikes, dtype=float), self.n_points)
+            series[station_id] = {
+                'timestamps': [timestamps[i] for i in indices],
+                'available_bikes': [available_bikes[i] for i in indices],
+                'available_bike_stands': [available_bike_stands[i] for i in indices]
+            }
+        return series
+
+    def get_empty_series(self):
+        """
+        Creates an empty series for every station, so that stations without records in the range are returned.
+
+        :returns: A dictionary with station IDs as keys and a dictionary of empty lists as values.
+        :rtype: dict
+        """
+        return {station_id: { 'timestamps': [], 'available_bikes': [], 'available_bike_stands': [] } for station_id in self.station_ids}
+
+    def get_series(self, method='bucket'):
+        """
+        Retrieves the downsampled availability series of the stations.
+
+        :param method: The downsampling method, 'bucket' for time bucket averages or 'lttb' for
+                       Largest-Triangle-Three-Buckets.
+        :type method: str
+
+        :returns: A dictionary with station IDs as keys and a dictionary of timestamps, available_bikes and
+                  available_bike_stands lists as values.
+        :rtype: dict
+
+        :raises ValueError: If the downsampling method is unknown.
+        """
+        if method == 'bucket':
+            return self.get_bucketed_series()
+        if method == 'lttb':
+            return self.get_lttb_series()
+        raise ValueError(f"Unknown downsampling method '{method}'.")
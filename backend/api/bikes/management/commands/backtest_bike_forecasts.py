@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import make_aware
+
+from bikes.backtesting import ForecastBacktest, GlobalBacktestModel, PersistenceBacktestModel, ProphetBacktestModel
+from bikes.global_model import load_hourly_availability
+
+class Command(BaseCommand):
+    help = 'Backtests the bike availability forecasters on the bike_availability history with rolling forecast origins.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=['prophet', 'engine', 'global', 'persistence'],
+                            default=['prophet', 'engine', 'global', 'persistence'], help='Forecasters to backtest.')
+        parser.add_argument('--origins', type=int, default=14, help='Number of forecast origins.')
+        parser.add_argument('--origin-step', type=int, default=24, help='Hours between consecutive forecast origins.')
+        parser.add_argument('--horizon', type=int, default=48, help='Hours predicted after every origin.')
+        parser.add_argument('--train-days', type=int, default=28, help='Days of history the models are fitted on at every origin.')
+        parser.add_argument('--workers', type=int, default=None, help='Number of worker processes. Defaults to the number of CPUs.')
+        parser.add_argument('--output', default=None, help='File the summary is appended to, as one JSON object per line.')
+        parser.add_argument('--csv', default=None, help='CSV file the error and coverage per model, station and horizon are written to.')
+
+    def get_models(self, options):
+        """
+        Creates the backtest models of the selected forecasters. The Prophet forecasts with uncertainty sampling and
+        the compact engine share the same fitted models.
+        """
+        models = []
+        if 'prophet' in options['models'] or 'engine' in options['models']:
+            models.append(ProphetBacktestModel(sampled='prophet' in options['models'], engine='engine' in options['models']))
+        if 'global' in options['models']:
+            models.append(GlobalBacktestModel(horizon_hours=options['horizon']))
+        if 'persistence' in options['models']:
+            models.append(PersistenceBacktestModel())
+        return models
+
+    def handle(self, *args, **options):
+        """
+        Reads the hourly availability of every station covering the training window, the origins and the horizon,
+        replays the forecasts and prints the accuracy of every forecaster next to its latency and memory.
+        """
+        hours = options['train_days'] * 24 + (options['origins'] - 1) * options['origin_step'] + options['horizon'] + 1
+        end_time = make_aware(datetime.now().replace(minute=0, second=0, microsecond=0))
+        hourly_df = load_hourly_availability(end_time - timedelta(hours=hours), end_time)
+
+        backtest = ForecastBacktest(
+            hourly_df,
+            self.get_models(options),
+            n_origins=options['origins'],
+            origin_step=options['origin_step'],
+            horizon_hours=options['horizon'],
+            train_days=options['train_days'],
+            n_workers=options['workers']
+        )
+        try:
+            result = backtest.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'a') as f:
+                f.write(json.dumps(result) + '\n')
+        if options['csv']:
+            backtest.to_frame().to_csv(options['csv'], index=False)
+
+        self.stdout.write(f"{result['n_stations']} stations, {result['n_origins']} origins, {result['horizon_hours']} hours")
+        for name, model_result in result['models'].items():
+            self.stdout.write(
+                f"    {name}: MAE {model_result['mae']:.2f} bikes, coverage {100 * model_result['coverage']:.1f}%, "
+                f"{model_result['seconds_per_forecast']:.3f}s per forecast, "
+                f"{model_result['model_bytes'] / 1024 ** 2:.1f} MiB model, "
+                f"{model_result['peak_predict_bytes'] / 1024 ** 2:.1f} MiB peak"
+            )
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from bikes.benchmark import RecommenderBenchmark
+
+class Command(BaseCommand):
+    help = 'Times the bike recommender on synthetic station networks and records the results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 1000, 2000, 5000], help='Numbers of stations of the synthetic networks.')
+        parser.add_argument('--candidate-neighbours', type=int, default=None, help='Nearest stations considered as destinations of each source station.')
+        parser.add_argument('--candidate-radius', type=float, default=None, help='Maximum distance in kilometres to the destinations of each source station.')
+        parser.add_argument('--scenarios', type=int, default=500, help='Monte Carlo scenarios used to evaluate the plans, 0 to skip the evaluation.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed used to generate the synthetic networks.')
+        parser.add_argument('--output', default='bikes/analytics/recommender_benchmark.jsonl', help='File the results are appended to, one JSON object per line.')
+
+    def handle(self, *args, **options):
+        """
+        Runs the recommender benchmark for every network size, prints the end to end and per phase timings
+        and appends the results, tagged with the current commit, to the output file.
+        """
+        benchmark = RecommenderBenchmark(
+            sizes=options['sizes'],
+            candidate_neighbours=options['candidate_neighbours'],
+            candidate_radius=options['candidate_radius'],
+            n_scenarios=options['scenarios'],
+            seed=options['seed']
+        )
+        results = benchmark.run()
+
+        with open(options['output'], 'a') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+
+        for result in results:
+            phases = ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in result['phase_seconds'].items())
+            self.stdout.write(f"{result['n_stations']} stations: {result['total_seconds']:.3f}s ({phases}), {result['n_moves']} moves")
+            if 'expected_empty_station_hours' in result:
+                self.stdout.write(
+                    f"    empty station-hours {result['baseline_empty_station_hours']:.1f} -> {result['expected_empty_station_hours']:.1f}, "
+                    f"full station-hours {result['baseline_full_station_hours']:.1f} -> {result['expected_full_station_hours']:.1f}"
+                )
@@ -0,0 +1,32 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from bikes.forecasts import BikeForecastMaterialiser, get_forecast_hour
+from bikes.views import load_bike_forecast_models
+
+class Command(BaseCommand):
+    help = 'Materialises the hourly bike availability forecasts of every station in the bike_forecasts table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=60, help='Seconds to wait between checks for a new hour or new models.')
+        parser.add_argument('--once', action='store_true', help='Materialise the forecasts once and exit.')
+
+    def handle(self, *args, **options):
+        """
+        Materialises the forecasts whenever the forecasting models are loaded or refreshed in the model registry,
+        and whenever a new hour starts so that the forecast horizon moves forward.
+        """
+        last_models = None
+        last_hour = None
+        while True:
+            prophet_models = load_bike_forecast_models()
+            current_hour = get_forecast_hour(datetime.now())
+            if prophet_models is not None and (prophet_models is not last_models or current_hour != last_hour):
+                stored = BikeForecastMaterialiser(prophet_models, start_time=current_hour).run()
+                self.stdout.write(f"Stored {stored} bike forecasts starting at {current_hour}.")
+                last_models, last_hour = prophet_models, current_hour
+            if options['once']:
+                break
+            time.sleep(options['interval'])
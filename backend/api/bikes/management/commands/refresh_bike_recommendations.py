@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from project.caching import invalidate_local_caches
+
+from bikes.models import BikeRecommendationPlan
+from bikes.views import get_latest_harvest_time, refresh_bike_recommendations
+
+class Command(BaseCommand):
+    help = 'Precomputes the bike recommendations once for every new bike availability snapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=60, help='Seconds to wait between checks for a new snapshot.')
+        parser.add_argument('--once', action='store_true', help='Check for a new snapshot once and exit.')
+        parser.add_argument('--full-every', type=int, default=12, help='Recompute the plan from scratch every N snapshots and update the previous plan otherwise.')
+
+    def handle(self, *args, **options):
+        """
+        Polls the bike availability table for new snapshots written by the ETL pipeline. Whenever the latest
+        harvest time has no stored recommendation plan, the recommender is run and its plan is stored, so that
+        the recommendations endpoint can serve it without recomputing. Between full runs, which happen every
+        --full-every snapshots, the previous plan is updated incrementally for the stations whose availability
+        has changed. The in-process caches of the API workers are invalidated whenever a new snapshot lands.
+        """
+        refreshes = 0
+        last_harvest_time = None
+        while True:
+            harvest_time = get_latest_harvest_time()
+            if harvest_time != last_harvest_time:
+                # Drop the data of the previous snapshot from the in-process caches of the API workers
+                invalidate_local_caches()
+                last_harvest_time = harvest_time
+            if harvest_time is not None and not BikeRecommendationPlan.objects.filter(harvest_time=harvest_time).exists():
+                incremental = options['full_every'] > 1 and refreshes % options['full_every'] != 0
+                plan = refresh_bike_recommendations(harvest_time, incremental=incremental)
+                refreshes += 1
+                self.stdout.write(f"Stored {len(plan.recommendations)} bike recommendations for snapshot {harvest_time}.")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
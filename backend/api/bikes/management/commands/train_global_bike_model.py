@@ -0,0 +1,33 @@
+import pickle
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import make_aware
+
+from bikes.global_model import GlobalBikeForecaster, load_hourly_availability
+from bikes.views import _GLOBAL_MODEL_FILE
+
+class Command(BaseCommand):
+    help = 'Trains the global lag-feature bike availability model on the bike_availability history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Days of history used for training.')
+        parser.add_argument('--origin-step', type=int, default=6, help='Hours between the forecast origins of the training samples.')
+        parser.add_argument('--output', default=_GLOBAL_MODEL_FILE, help='Path of the pickled model.')
+
+    def handle(self, *args, **options):
+        """
+        Reads the hourly availability of every station over the last days, trains the global model on it and
+        pickles it. The model is served when the BIKE_FORECAST_MODEL setting is 'global'.
+        """
+        end_time = make_aware(datetime.now().replace(minute=0, second=0, microsecond=0))
+        hourly_df = load_hourly_availability(end_time - timedelta(days=options['days']), end_time)
+
+        try:
+            forecaster = GlobalBikeForecaster(origin_step=options['origin_step']).fit(hourly_df, end_time)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with open(options['output'], 'wb') as f:
+            pickle.dump(forecaster, f)
+        self.stdout.write(f"Trained the global model on {len(forecaster)} stations and saved it to {options['output']}.")
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BikeRecommendationPlan',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('harvest_time', models.DateTimeField(unique=True)),
+                ('created_time', models.DateTimeField(auto_now=True)),
+                ('recommendations', models.JSONField()),
+            ],
+            options={
+                'db_table': 'bike_recommendation_plans',
+                'managed': True,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0002_bikerecommendationplan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bikerecommendationplan',
+            name='station_state',
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0003_bikerecommendationplan_station_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BikeForecast',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('ts', models.DateTimeField()),
+                ('prediction', models.FloatField()),
+                ('prediction_lower', models.FloatField()),
+                ('prediction_upper', models.FloatField()),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bikes.bikestation')),
+            ],
+            options={
+                'db_table': 'bike_forecasts',
+                'managed': True,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bikeforecast',
+            constraint=models.UniqueConstraint(fields=('ts', 'station'), name='bike_forecasts_ts_station_unique'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_latest_availability(apps, schema_editor):
+    # Seed the table with the latest record of each station, the ETL pipeline keeps it up to date afterwards
+    BikeAvailability = apps.get_model('bikes', 'BikeAvailability')
+    BikeAvailabilityLatest = apps.get_model('bikes', 'BikeAvailabilityLatest')
+    BikeStation = apps.get_model('bikes', 'BikeStation')
+    latest = []
+    for station_id in BikeStation.objects.values_list('id', flat=True):
+        availability = BikeAvailability.objects.filter(station_id=station_id).order_by('-last_update_time').first()
+        if availability is not None:
+            latest.append(BikeAvailabilityLatest(
+                station_id=station_id,
+                harvest_time=availability.harvest_time,
+                last_update_time=availability.last_update_time,
+                available_bike_stands=availability.available_bike_stands,
+                available_bikes=availability.available_bikes,
+                status=availability.status
+            ))
+    BikeAvailabilityLatest.objects.bulk_create(latest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0004_bikeforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BikeAvailabilityLatest',
+            fields=[
+                ('station', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest_availability', serialize=False, to='bikes.bikestation')),
+                ('harvest_time', models.DateTimeField()),
+                ('last_update_time', models.DateTimeField()),
+                ('available_bike_stands', models.IntegerField()),
+                ('available_bikes', models.IntegerField()),
+                ('status', models.TextField()),
+            ],
+            options={
+                'db_table': 'bike_availability_latest',
+                'managed': True,
+            },
+        ),
+        migrations.RunPython(populate_latest_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0005_bikeavailabilitylatest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bikeavailability',
+            index=models.Index(fields=['station', 'last_update_time'], name='bike_availability_station_time'),
+        ),
+    ]
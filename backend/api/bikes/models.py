@@ -53,6 +53,38 @@ class BikeAvailability(models.Model):
     class Meta:
         managed = True
         db_table = 'bike_availability'
+        indexes = [
+            models.Index(fields=['station', 'last_update_time'], name='bike_availability_station_time')
+        ]
+
+
+class BikeAvailabilityLatest(models.Model):
+    """
+    Represents the most recent availability of bikes at a bike station.
+
+    This model stores one row per bike station with its latest availability record. The rows are upserted by the
+    ETL pipeline on each snapshot, so that the current state of the network is read without scanning the history
+    stored in the bike availability table. A row is only replaced by a newer reading of the station.
+
+    Fields:
+        station (BikeStation): The bike station to which the availability data belongs, and the primary key.
+        harvest_time (datetime): The time when the current reading of the station was first harvested, which later
+                                 snapshots with the same reading leave unchanged.
+        last_update_time (datetime): The time when the availability data was last updated.
+        available_bike_stands (int): The number of available bike stands at the station.
+        available_bikes (int): The number of available bikes at the station.
+        status (str): The status of the bike station (e.g., operational, maintenance).
+    """
+    station = models.OneToOneField('BikeStation', on_delete=models.CASCADE, primary_key=True, related_name='latest_availability')
+    harvest_time = models.DateTimeField()
+    last_update_time = models.DateTimeField()
+    available_bike_stands = models.IntegerField()
+    available_bikes = models.IntegerField()
+    status = models.TextField()
+
+    class Meta:
+        managed = True
+        db_table = 'bike_availability_latest'
 
 
 class BikeDistance(models.Model):
@@ -75,4 +107,60 @@ class BikeDistance(models.Model):
 
     class Meta:
         managed = True
-        db_table = 'bike_distances'
\ No newline at end of file
+        db_table = 'bike_distances'
+
+class BikeRecommendationPlan(models.Model):
+    """
+    Represents a precomputed plan of bike movements for a bike availability snapshot.
+
+    This model stores the recommendations generated for the bike availability harvested at a specific time,
+    so that they can be served without running the recommender on every request.
+
+    Fields:
+        id (int): The primary key of the recommendation plan.
+        harvest_time (datetime): The harvest time of the bike availability snapshot used for the plan.
+        created_time (datetime): The time when the plan was computed.
+        recommendations (list): The recommended bike movements between stations.
+        station_state (list): The station state reached by the plan, used to update the plan incrementally.
+    """
+    id = models.AutoField(primary_key=True)
+    harvest_time = models.DateTimeField(unique=True)
+    created_time = models.DateTimeField(auto_now=True)
+    recommendations = models.JSONField()
+    station_state = models.JSONField(null=True)
+
+    class Meta:
+        managed = True
+        db_table = 'bike_recommendation_plans'
+
+
+class BikeForecast(models.Model):
+    """
+    Represents the forecasted availability of bikes at a bike station for a specific hour.
+
+    This model stores the hourly predictions of the forecasting models for every station over the next hours,
+    so that prediction requests are served from the database instead of running the models.
+
+    Fields:
+        id (int): The primary key of the forecast record.
+        station (BikeStation): The bike station to which the forecast belongs.
+        ts (datetime): The hour for which the availability is forecasted.
+        prediction (float): The predicted number of available bikes.
+        prediction_lower (float): The lower bound of the prediction uncertainty interval.
+        prediction_upper (float): The upper bound of the prediction uncertainty interval.
+        created_time (datetime): The time when the forecast was computed.
+    """
+    id = models.AutoField(primary_key=True)
+    station = models.ForeignKey(BikeStation, on_delete=models.CASCADE)
+    ts = models.DateTimeField()
+    prediction = models.FloatField()
+    prediction_lower = models.FloatField()
+    prediction_upper = models.FloatField()
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        managed = True
+        db_table = 'bike_forecasts'
+        constraints = [
+            models.UniqueConstraint(fields=['ts', 'station'], name='bike_forecasts_ts_station_unique')
+        ]
@@ -4,7 +4,7 @@ import matplotlib.pyplot as plt
 
 class BikeRecommender:
 
-    def __init__(self, stations_df, distances_df, forecast_model, timestamps_to_predict):
+    def __init__(self, stations_df, distances_df, forecast_model, timestamps_to_predict, candidate_neighbours=None, candidate_radius=None):
         """
         Initializes a BikeRecommender instance for managing and optimizing bike distribution 
         across stations based on forecasts and distances between stations.
@@ -20,6 +20,12 @@ class BikeRecommender:
         :param timestamps_to_predict: List of timestamps for which bike availability predictions
                                       are required.
         :type timestamps_to_predict: list of datetime
+        :param candidate_neighbours: Maximum number of nearest stations considered as destinations for the
+                                     surplus of a source station. All stations are considered if None.
+        :type candidate_neighbours: int, optional
+        :param candidate_radius: Maximum distance in kilometres between a source station and its candidate
+                                 destinations. No distance limit is applied if None.
+        :type candidate_radius: float, optional
         """
     
         self.stations_df = stations_df
@@ -30,6 +36,10 @@ class BikeRecommender:
         self._critical_probability = 0.5
         self._surplus_probability = 0.35
         self._maximum_moves = 20
+        self._candidate_neighbours = candidate_neighbours
+        self._candidate_radius = candidate_radius
+        self._candidate_index = None
+        self.recommendation_state = None
 
 
     def calculate_run_out_probability(self, station_id, bike_moves, forecast=None):
@@ -124,6 +134,81 @@ class BikeRecommender:
         return distances_arr
 
     
+    def build_candidate_index(self):
+        """
+        Builds a nearest neighbour index over the distance matrix, mapping every station to the stations 
+        it may send its surplus bikes to. Candidates are the closest stations that lie within the candidate 
+        radius, limited to the configured number of neighbours.
+
+        :returns: A dictionary with station IDs as keys and a tuple of (candidate station IDs, distances) as values,
+                  both sorted by increasing distance.
+        :rtype: dict
+
+        The index is computed once per recommender from the distance matrix, so that the cost of ranking 
+        destinations for a source station scales with the number of neighbours instead of the network size.
+        """
+        distances_df = self.distances_df[self.distances_df['station_from'] != self.distances_df['station_to']]
+        if self._candidate_radius is not None:
+            distances_df = distances_df[distances_df['distance'] <= self._candidate_radius]
+        distances_df = distances_df.sort_values(by=['station_from', 'distance'], kind='stable')
+        if self._candidate_neighbours is not None:
+            distances_df = distances_df.groupby('station_from').head(self._candidate_neighbours)
+
+        candidate_index = {}
+        for station_id, station_df in distances_df.groupby('station_from'):
+            candidate_index[station_id] = (station_df['station_to'].values, station_df['distance'].values)
+        return candidate_index
+
+
+    def get_candidate_stations(self, station_id):
+        """
+        Retrieves the candidate destination stations of a source station from the nearest neighbour index, 
+        building the index on first use.
+
+        :param station_id: Identifier for the source station
+        :type station_id: int
+
+        :returns: A tuple containing the candidate station IDs and their distances from the source station.
+        :rtype: tuple of numpy.ndarray
+        """
+        if self._candidate_index is None:
+            self._candidate_index = self.build_candidate_index()
+        return self._candidate_index.get(station_id, (np.array([], dtype=int), np.array([], dtype=float)))
+
+
+    def rank_destination_stations(self, stations_df, station_from_id):
+        """
+        Ranks the possible destination stations for the surplus of a source station by a priority score, 
+        which is the run out probability of the destination divided by its distance from the source. If 
+        candidate pruning is enabled, only the nearest neighbours of the source station are ranked.
+
+        :param stations_df: DataFrame with the current state of the stations, including run out probabilities.
+        :type stations_df: pandas.DataFrame
+        :param station_from_id: Identifier for the source station
+        :type station_from_id: int
+
+        :returns: The destination stations sorted by decreasing priority, excluding the source station.
+        :rtype: pandas.DataFrame
+        """
+        if self._candidate_neighbours is None and self._candidate_radius is None:
+            # Get the distances from the selected station to all other stations
+            distances_arr = self.get_station_distances(station_from_id)
+
+            # Create a priority score for bike stations which is the run out probability divided by the distance
+            ranked_df = stations_df.sort_values(by='id')
+            ranked_df = ranked_df.assign(priority=ranked_df['run_out_prob'].values / distances_arr)
+        else:
+            # Score only the nearest neighbours of the selected station
+            candidate_ids, candidate_distances = self.get_candidate_stations(station_from_id)
+            known_candidates = np.isin(candidate_ids, stations_df['id'].values)
+            ranked_df = stations_df.set_index('id').loc[candidate_ids[known_candidates]].reset_index()
+            ranked_df = ranked_df.assign(priority=ranked_df['run_out_prob'].values / candidate_distances[known_candidates])
+
+        # Sort the bike stations by priority and remove the selected station
+        ranked_df = ranked_df.sort_values(by='priority', ascending=False)
+        return ranked_df[ranked_df['id'] != station_from_id]
+
+
     def move_bike_surplus(self, station_from_surplus, station_to_df):
         """
         Determines the number of surplus bikes that can be moved from one station to another, 
@@ -164,61 +249,58 @@ class BikeRecommender:
         return bikes_to_move, station_from_surplus, station_to_prob
 
 
-    # stations_df --> dataframe with columns id, available_bikes, availablke_bike_stands
-    # distances_df --> dataframe with columns station_from, station_to, distance
-    def generate_recommendations(self):
+    def calculate_run_out_probabilities(self, stations_df):
         """
-        Generates a list of recommended bike movements across stations to optimize bike availability and prevent stations from running out of bikes. The function calculates the run out probabilities for each station, identifies surplus bikes, and then moves them to other stations based on a priority score calculated from run out probability and distance.
-
-        This function performs several operations including:
-        - Copying the station dataframe and initializing a recommended moves column.
-        - Calculating run out probabilities for all stations.
-        - Iteratively selecting stations with surplus bikes and identifying target stations based on a calculated priority score.
-        - Moving bikes and updating the status (available bikes, recommended moves, run out probabilities) of both source and target stations.
+        Calculates the run out probability of every station, taking into account the bikes already 
+        recommended to be moved to or from each station.
 
-        :returns: A list of dictionaries where each dictionary contains 'station_from_id', 'station_to_id', and 'bikes_to_move' indicating the movements between stations.
-        :rtype: list of dict
+        :param stations_df: DataFrame with columns id and recommended_moves.
+        :type stations_df: pandas.DataFrame
 
-            The method loops a predefined number of times (self._maximum_moves), each time:
-        - Selecting a source station based on the lowest run out probability.
-        - Calculating bike surplus at the source station.
-        - Determining the destination stations based on a priority score (run out probability divided by distance).
-        - Moving bikes to optimize the distribution across the network.
-        Each move is recorded and the database is updated in each iteration to reflect the changes.
-        """        
-        # Add a column to the stations dataframe with the total recommnended moves
-        stations_df = self.stations_df.copy()
-        stations_df['recommended_moves'] = 0
-        
-        # Calculate run out probabilities for all stations
+        :returns: The run out probabilities of the stations, in the order of the DataFrame rows.
+        :rtype: list of float
+        """
         run_out_prob = []
-        for station_id in stations_df['id']:
-            moved_bikes = stations_df[stations_df['id'] == station_id]['recommended_moves'].values[0]
+        for station_id, moved_bikes in zip(stations_df['id'], stations_df['recommended_moves']):
             run_out_prob.append(self.calculate_run_out_probability(station_id, moved_bikes))
-        stations_df['run_out_prob'] = run_out_prob
-        
+        return run_out_prob
+
+
+    def plan_bike_moves(self, stations_df, source_station_ids=None, iterations=None):
+        """
+        Runs the greedy redistribution loop on the given station state. In every iteration, the station 
+        with the lowest run out probability gives away its surplus bikes to the stations with the highest 
+        priority score. The station state is updated in place with every move.
+
+        :param stations_df: DataFrame with columns id, available_bikes, available_bike_stands, recommended_moves 
+                            and run_out_prob.
+        :type stations_df: pandas.DataFrame
+        :param source_station_ids: Stations allowed to give away bikes. All stations are allowed if None.
+        :type source_station_ids: list of int, optional
+        :param iterations: Number of source stations to process. Defaults to the maximum number of moves.
+        :type iterations: int, optional
+
+        :returns: A list of dictionaries where each dictionary contains 'station_from_id', 'station_to_id', and 'bikes_to_move'.
+        :rtype: list of dict
+        """
+        iterations = self._maximum_moves if iterations is None else iterations
+        source_stations = stations_df['id'].isin(source_station_ids) if source_station_ids is not None else stations_df['id'].notna()
+
         recommended_moves = []
-        for k in range(self._maximum_moves):
-            
+        for k in range(iterations):
+            if not source_stations.any():
+                break
+
             # Start from the station with the lowest probability of running out of bikes
-            station_from_id = stations_df.sort_values(by='run_out_prob').iloc[0]['id']
+            station_from_id = stations_df[source_stations].sort_values(by='run_out_prob').iloc[0]['id']
 
             # Calculate the suplus of bikes at the selected station
             curr_available_bikes = stations_df[stations_df['id'] == station_from_id]['available_bikes'].values[0]
             curr_prob = stations_df[stations_df['id'] == station_from_id]['run_out_prob'].values[0]
             bike_surplus = self.calculate_bike_surplus(station_from_id, curr_available_bikes, curr_prob)
 
-            # Get the distances from the selected station to all other stations
-            distances_arr = self.get_station_distances(station_from_id)
-
-            # Create a priority score for bike stations which is the run out probability divided by the distance
-            prob_arr = np.array(stations_df.sort_values(by='id')['run_out_prob'].values)
-            priority_arr = prob_arr / distances_arr
-            stations_df['priority'] = priority_arr
-
-            # Sort the bike stations by priority and remove the selected station
-            sorted_stations_df = stations_df.sort_values(by='priority', ascending=False)
-            sorted_stations_df = sorted_stations_df[sorted_stations_df['id'] != station_from_id]
+            # Rank the destination stations by priority score
+            sorted_stations_df = self.rank_destination_stations(stations_df, station_from_id)
 
             # Move bikes from the selected station to the next station in the sorted list
             i = 0
@@ -244,10 +326,140 @@ class BikeRecommender:
             stations_df.loc[stations_df['id'] == station_from_id, 'recommended_moves'] -= total_bikes_moved
             stations_df.loc[stations_df['id'] == station_from_id, 'run_out_prob'] = self.calculate_run_out_probability(station_from_id, -total_bikes_moved)
 
-        # Create a dataframe to remove the moves with 0 bikes and aggregate moves with same source and destination
+        return recommended_moves
+
+
+    def aggregate_bike_moves(self, recommended_moves):
+        """
+        Removes the moves with 0 bikes and aggregates the moves with the same source and destination.
+
+        :param recommended_moves: A list of dictionaries with 'station_from_id', 'station_to_id' and 'bikes_to_move'.
+        :type recommended_moves: list of dict
+
+        :returns: The aggregated moves, as a list of dictionaries with the same keys.
+        :rtype: list of dict
+        """
         moves_df = pd.DataFrame(recommended_moves, columns=['station_from_id', 'station_to_id', 'bikes_to_move'])
         moves_df = moves_df[moves_df['bikes_to_move'] > 0]
         moves_df = moves_df.groupby(['station_from_id', 'station_to_id']).sum().reset_index()
-        recommended_moves = moves_df.to_dict(orient='records') # List of dictionaries without the index
+        return moves_df.to_dict(orient='records') # List of dictionaries without the index
+
+
+    def save_recommendation_state(self, stations_df):
+        """
+        Keeps the station state reached at the end of a recommendation run, so that the next run can 
+        update the recommendations incrementally. The state contains the snapshot availability of every 
+        station together with its recommended moves and its final run out probability.
+
+        :param stations_df: DataFrame with the station state after all the moves have been applied.
+        :type stations_df: pandas.DataFrame
+        """
+        state_df = self.stations_df[['id', 'available_bikes', 'available_bike_stands']].copy()
+        final_df = stations_df.set_index('id')
+        state_df['recommended_moves'] = final_df.loc[state_df['id'], 'recommended_moves'].values
+        state_df['run_out_prob'] = final_df.loc[state_df['id'], 'run_out_prob'].values
+        self.recommendation_state = state_df
+
+
+    # stations_df --> dataframe with columns id, available_bikes, availablke_bike_stands
+    # distances_df --> dataframe with columns station_from, station_to, distance
+    def generate_recommendations(self):
+        """
+        Generates a list of recommended bike movements across stations to optimize bike availability and prevent stations from running out of bikes. The function calculates the run out probabilities for each station, identifies surplus bikes, and then moves them to other stations based on a priority score calculated from run out probability and distance.
 
-        return recommended_moves
\ No newline at end of file
+        This function performs several operations including:
+        - Copying the station dataframe and initializing a recommended moves column.
+        - Calculating run out probabilities for all stations.
+        - Iteratively selecting stations with surplus bikes and identifying target stations based on a calculated priority score.
+        - Moving bikes and updating the status (available bikes, recommended moves, run out probabilities) of both source and target stations.
+
+        :returns: A list of dictionaries where each dictionary contains 'station_from_id', 'station_to_id', and 'bikes_to_move' indicating the movements between stations.
+        :rtype: list of dict
+
+            The method loops a predefined number of times (self._maximum_moves), each time:
+        - Selecting a source station based on the lowest run out probability.
+        - Calculating bike surplus at the source station.
+        - Determining the destination stations based on a priority score (run out probability divided by distance).
+        - Moving bikes to optimize the distribution across the network.
+        Each move is recorded and the database is updated in each iteration to reflect the changes.
+        The final station state is kept in `recommendation_state` for incremental updates.
+        """        
+        # Add a column to the stations dataframe with the total recommnended moves
+        stations_df = self.stations_df.copy()
+        stations_df['recommended_moves'] = 0
+        
+        # Calculate run out probabilities for all stations
+        stations_df['run_out_prob'] = self.calculate_run_out_probabilities(stations_df)
+        
+        recommended_moves = self.plan_bike_moves(stations_df)
+        self.save_recommendation_state(stations_df)
+
+        return self.aggregate_bike_moves(recommended_moves)
+
+
+    def update_recommendations(self, previous_state_df, previous_moves):
+        """
+        Updates the recommendations of a previous run for a new availability snapshot, recomputing only 
+        what depends on the stations whose availability has changed. Moves between unchanged stations are 
+        kept as they are, while moves touching changed stations are dropped and replanned.
+
+        The update performs the following steps:
+        - Diffing the new snapshot against the previous state to find the changed and new stations.
+        - Keeping the previous moves whose source and destination stations are both unchanged.
+        - Recomputing run out probabilities only for the stations affected by the changes, i.e. the changed 
+          stations and the counterparts of the dropped moves. Other stations keep their previous probability.
+        - Running the greedy redistribution loop with the affected stations as the only sources, for the iterations 
+          of the maximum number of moves not used by the source stations of the kept moves.
+
+        :param previous_state_df: The `recommendation_state` of the previous run.
+        :type previous_state_df: pandas.DataFrame
+        :param previous_moves: The recommendations returned by the previous run.
+        :type previous_moves: list of dict
+
+        :returns: A list of dictionaries where each dictionary contains 'station_from_id', 'station_to_id', and 'bikes_to_move'.
+        :rtype: list of dict
+
+        The forecasts of unchanged stations are not re-evaluated, so a full run should still be performed 
+        periodically as the prediction window moves forward.
+        """
+        stations_df = self.stations_df.copy()
+        previous_df = previous_state_df.set_index('id').reindex(stations_df['id'])
+
+        # Find the stations whose availability has changed since the previous snapshot
+        changed = (
+            previous_df['run_out_prob'].isna().values |
+            (previous_df['available_bikes'].values != stations_df['available_bikes'].values) |
+            (previous_df['available_bike_stands'].values != stations_df['available_bike_stands'].values)
+        )
+        changed_ids = set(stations_df['id'][changed])
+
+        # Keep the moves between unchanged stations and collect the stations affected by the dropped moves
+        kept_moves = []
+        affected_ids = set(changed_ids)
+        for move in previous_moves:
+            if move['station_from_id'] in changed_ids or move['station_to_id'] in changed_ids:
+                affected_ids.update([move['station_from_id'], move['station_to_id']])
+            else:
+                kept_moves.append(move)
+
+        # Apply the kept moves to the new snapshot
+        moves_df = pd.DataFrame(kept_moves, columns=['station_from_id', 'station_to_id', 'bikes_to_move'])
+        moves_in = moves_df.groupby('station_to_id')['bikes_to_move'].sum()
+        moves_out = moves_df.groupby('station_from_id')['bikes_to_move'].sum()
+        net_moves = moves_in.sub(moves_out, fill_value=0).reindex(stations_df['id'], fill_value=0).values
+        stations_df['recommended_moves'] = net_moves.astype(int)
+        stations_df['available_bikes'] += stations_df['recommended_moves']
+
+        # Recompute the run out probabilities of the affected stations only
+        affected = stations_df['id'].isin(affected_ids).values
+        stations_df['run_out_prob'] = previous_df['run_out_prob'].values
+        stations_df.loc[affected, 'run_out_prob'] = self.calculate_run_out_probabilities(stations_df[affected])
+
+        # Replan the moves starting from the affected stations, within the iterations left by the kept moves, so that
+        # no more source stations are processed than in a full run
+        kept_sources = len({move['station_from_id'] for move in kept_moves})
+        iterations = max(0, min(self._maximum_moves - kept_sources, int(affected.sum())))
+        recommended_moves = kept_moves + self.plan_bike_moves(stations_df, source_station_ids=list(affected_ids), iterations=iterations)
+        self.save_recommendation_state(stations_df)
+
+        return self.aggregate_bike_moves(recommended_moves)
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+# Half width of the Prophet uncertainty interval (80% by default) in standard deviations
+_INTERVAL_Z_SCORE = 1.2816
+
+class InventorySimulator:
+
+    def __init__(self, stations_df, forecast_model, timestamps_to_predict, n_scenarios=2000, seed=None):
+        """
+        Initializes a Monte Carlo simulator of the bike inventory of every station over the prediction window,
+        used to evaluate recommendation plans by the expected number of empty and full station-hours.
+
+        :param stations_df: DataFrame with columns id, available_bikes and available_bike_stands, and optionally
+                            capacity. The capacity defaults to the sum of available bikes and bike stands.
+        :type stations_df: pandas.DataFrame
+        :param forecast_model: A dictionary of forecast models, one per station, returning yhat, yhat_lower and
+                               yhat_upper for the timestamps to predict.
+        :type forecast_model: dict
+        :param timestamps_to_predict: DataFrame with a 'ds' column containing the hourly timestamps to simulate.
+        :type timestamps_to_predict: pandas.DataFrame
+        :param n_scenarios: The number of demand trajectories sampled per station.
+        :type n_scenarios: int
+        :param seed: Seed of the random number generator.
+        :type seed: int, optional
+        """
+        self.station_ids = stations_df['id'].values
+        self.available_bikes = stations_df['available_bikes'].values.astype(np.float32)
+        if 'capacity' in stations_df:
+            self.capacity = stations_df['capacity'].values.astype(np.float32)
+        else:
+            self.capacity = (stations_df['available_bikes'] + stations_df['available_bike_stands']).values.astype(np.float32)
+        self.forecast_model = forecast_model
+        self.timestamps_to_predict = timestamps_to_predict
+        self.n_scenarios = n_scenarios
+        self.rng = np.random.default_rng(seed)
+        self._station_index = {station_id: i for i, station_id in enumerate(self.station_ids)}
+        self._net_flows = None
+
+    def get_forecast_arrays(self):
+        """
+        Predicts the availability of every station over the timestamps to predict.
+
+        :returns: A tuple with the yhat, yhat_lower and yhat_upper arrays, each of shape (stations, hours).
+        :rtype: tuple of numpy.ndarray
+        """
+        forecasts = [self.forecast_model[station_id].predict(self.timestamps_to_predict) for station_id in self.station_ids]
+        yhat = np.array([forecast['yhat'].values for forecast in forecasts], dtype=np.float32)
+        yhat_lower = np.array([forecast['yhat_lower'].values for forecast in forecasts], dtype=np.float32)
+        yhat_upper = np.array([forecast['yhat_upper'].values for forecast in forecasts], dtype=np.float32)
+        return yhat, yhat_lower, yhat_upper
+
+    def sample_net_flows(self):
+        """
+        Samples the hourly net flow of bikes (returns minus rentals) of every station for every scenario.
+        The expected flows follow the forecast trajectory starting from the current availability, and the
+        noise of every hour is sized so that the spread of the cumulative flow matches the forecast bands.
+
+        :returns: An array of shape (scenarios, stations, hours) with the net flows.
+        :rtype: numpy.ndarray
+        """
+        yhat, yhat_lower, yhat_upper = self.get_forecast_arrays()
+        expected_flows = np.diff(yhat, axis=1, prepend=self.available_bikes[:, None])
+
+        # Split the variance of the forecast at each hour into independent hourly increments
+        variance = ((yhat_upper - yhat_lower) / (2 * _INTERVAL_Z_SCORE)) ** 2
+        variance = np.maximum.accumulate(np.nan_to_num(variance), axis=1)
+        increment_std = np.sqrt(np.diff(variance, axis=1, prepend=0))
+
+        noise = self.rng.standard_normal((self.n_scenarios,) + yhat.shape, dtype=np.float32)
+        return (np.nan_to_num(expected_flows) + noise * increment_std).astype(np.float32)
+
+    def get_net_flows(self):
+        """
+        Retrieves the sampled net flows, sampling them on first use. The same flows are reused for every plan,
+        so that different plans are compared on the same scenarios.
+
+        :returns: An array of shape (scenarios, stations, hours) with the net flows.
+        :rtype: numpy.ndarray
+        """
+        if self._net_flows is None:
+            self._net_flows = self.sample_net_flows()
+        return self._net_flows
+
+    def get_plan_moves(self, plan):
+        """
+        Converts a recommendation plan into the net number of bikes moved to every station.
+
+        :param plan: A list of dictionaries with 'station_from_id', 'station_to_id' and 'bikes_to_move'.
+        :type plan: list of dict
+
+        :returns: An array with the net bikes moved to each station, negative for stations giving bikes away.
+        :rtype: numpy.ndarray
+        """
+        moves = np.zeros(len(self.station_ids), dtype=np.float32)
+        for move in plan:
+            moves[self._station_index[move['station_from_id']]] -= move['bikes_to_move']
+            moves[self._station_index[move['station_to_id']]] += move['bikes_to_move']
+        return moves
+
+    def simulate(self, plan):
+        """
+        Simulates the bike inventory of every station under a recommendation plan. The moves of the plan are
+        applied at the start of the window, and then the sampled net flows are applied hour by hour, keeping
+        the inventory between zero and the station capacity.
+
+        :param plan: A list of dictionaries with 'station_from_id', 'station_to_id' and 'bikes_to_move'.
+        :type plan: list of dict
+
+        :returns: An array of shape (scenarios, stations, hours) with the inventory at the end of each hour.
+        :rtype: numpy.ndarray
+        """
+        net_flows = self.get_net_flows()
+        inventory = np.clip(self.available_bikes + self.get_plan_moves(plan), 0, self.capacity)
+        inventory = np.broadcast_to(inventory, net_flows.shape[:2]).copy()
+
+        # Hours are the leading axis of the working array so that each step updates a contiguous block
+        inventory_per_hour = np.empty((net_flows.shape[2],) + net_flows.shape[:2], dtype=np.float32)
+        for hour in range(net_flows.shape[2]):
+            np.add(inventory, net_flows[:, :, hour], out=inventory)
+            np.clip(inventory, 0, self.capacity, out=inventory)
+            inventory_per_hour[hour] = inventory
+        return np.moveaxis(inventory_per_hour, 0, -1)
+
+    def evaluate(self, plan):
+        """
+        Evaluates a recommendation plan by the expected number of hours that stations spend empty or full.
+
+        :param plan: A list of dictionaries with 'station_from_id', 'station_to_id' and 'bikes_to_move'.
+                     An empty list evaluates the network without any moves.
+        :type plan: list of dict
+
+        :returns: A dictionary with the expected empty and full station-hours over the whole network, and a
+                  DataFrame with the expected empty and full hours of each station.
+        :rtype: dict
+        """
+        inventory = self.simulate(plan)
+        empty_hours = (inventory < 1).sum(axis=(0, 2)) / self.n_scenarios
+        full_hours = (inventory > self.capacity[:, None] - 1).sum(axis=(0, 2)) / self.n_scenarios
+        return {
+            'expected_empty_station_hours': float(empty_hours.sum()),
+            'expected_full_station_hours': float(full_hours.sum()),
+            'stations': pd.DataFrame({
+                'id': self.station_ids,
+                'expected_empty_hours': empty_hours,
+                'expected_full_hours': full_hours
+            })
+        }
@@ -2,14 +2,17 @@ import json
 import pandas as pd
 from datetime import datetime, timezone
 
+from django.core.cache import cache
 from django.test import TestCase, RequestFactory
 from django.http import JsonResponse
 from django.urls import reverse
 
 from unittest.mock import patch, MagicMock, mock_open
 
-from .models import BikeStation, BikeAvailability
+from .models import BikeStation, BikeAvailability, BikeAvailabilityLatest, BikeDistance, BikeRecommendationPlan, BikeForecast
 from .views import *
+from .views import _CANDIDATE_RADIUS
+from project.responses import pa, ARROW_STREAM_CONTENT_TYPE
 import unittest
 import numpy as np
 
@@ -47,6 +50,25 @@ class BikeDisplayDataTests(TestCase):
             available_bikes=5,
             status='Open'
         )
+        BikeAvailabilityLatest.objects.create(
+            station=cls.station_1,
+            harvest_time='2024-03-12T12:00:00Z',
+            last_update_time='2024-03-12T12:00:00Z',
+            available_bike_stands=5,
+            available_bikes=5,
+            status='Open'
+        )
+        BikeAvailabilityLatest.objects.create(
+            station=cls.station_2,
+            harvest_time='2024-03-12T12:00:00Z',
+            last_update_time='2024-03-12T12:00:00Z',
+            available_bike_stands=10,
+            available_bikes=5,
+            status='Open'
+        )
+
+    def setUp(self):
+        cache.clear()
 
     def test_get_latest_bike_availability(self):
         from bikes.views import get_latest_bike_availability
@@ -76,6 +98,58 @@ class BikeDisplayDataTests(TestCase):
         self.assertEqual(station_2_data['available_bike_stands'], 10)
         self.assertEqual(station_2_data['last_update_time'], datetime(2024, 3, 12, 12, 0, tzinfo=timezone.utc))
 
+    def test_get_latest_bike_availability_without_data(self):
+        from bikes.views import get_latest_bike_availability, get_latest_harvest_time
+
+        BikeStation.objects.create(id=3, name='Station 3', latitude=40.75, longitude=-73.98, capacity=20)
+        latest_data = get_latest_bike_availability()
+
+        station_3_data = next(data for data in latest_data if data['id'] == 3)
+        self.assertEqual(station_3_data['available_bikes'], 0)
+        self.assertEqual(station_3_data['available_bike_stands'], 0)
+        self.assertIsNone(station_3_data['last_update_time'])
+        self.assertEqual(get_latest_harvest_time(), datetime(2024, 3, 12, 12, 0, tzinfo=timezone.utc))
+
+    def test_get_bike_display_data_not_modified(self):
+        request = RequestFactory().get(reverse('get_bike_display_data'))
+        response = get_bike_display_data(request)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        request = RequestFactory().get(reverse('get_bike_display_data'), HTTP_IF_NONE_MATCH=etag)
+        response = get_bike_display_data(request)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+        # A client holding the ETag of the snapshot has merged it, whatever delta it asks for
+        request = RequestFactory().get(reverse('get_bike_display_data'), {'since': '2024-03-12T12:00:00Z'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(get_bike_display_data(request).status_code, 304)
+
+    def test_get_bike_display_data_delta_leaves_out_unchanged_stations(self):
+        response = get_bike_display_data(RequestFactory().get(reverse('get_bike_display_data')))
+        harvest_time = json.loads(response.content)['harvest_time']
+
+        # The next snapshot has a new reading of station 2, and the same reading of station 1, whose row the ETL
+        # pipeline leaves as it is
+        BikeAvailabilityLatest.objects.filter(station_id=2).update(
+            harvest_time='2024-03-12T12:05:00Z', last_update_time='2024-03-12T12:00:30Z', available_bikes=6
+        )
+        request = RequestFactory().get(reverse('get_bike_display_data'), {'since': harvest_time}, HTTP_IF_NONE_MATCH=response['ETag'])
+        response = get_bike_display_data(request)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([station['id'] for station in data['bike_station_data']], [2])
+        self.assertEqual(data['harvest_time'], '2024-03-12T12:05:00Z')
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_get_bike_display_data_arrow(self):
+        request = RequestFactory().get(reverse('get_bike_display_data'), HTTP_ACCEPT=ARROW_STREAM_CONTENT_TYPE)
+        response = get_bike_display_data(request)
+
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column('available_bike_stands').to_pylist(), [5, 10])
+        self.assertEqual(json.loads(table.schema.metadata[b'harvest_time']), '2024-03-12T12:00:00Z')
+
     def test_get_bike_display_data(self):
         factory = RequestFactory()
         request = factory.get(reverse('get_bike_display_data'))
@@ -115,6 +189,7 @@ class BikeDisplayDataTests(TestCase):
 
 class GetBikeRecommendationsTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.factory = RequestFactory()
         self.bike_stations_data = [
             {'id': 1, 'name': 'Central Station', 'latitude': 40.7128, 'longitude': -74.0060, 'capacity': 20},
@@ -130,8 +205,8 @@ class GetBikeRecommendationsTests(TestCase):
             {'id': 2, 'name': 'Station 2', 'latitude': 41.0, 'longitude': -74.0, 'capacity': 10, 'available_bikes': 8, 'available_bike_stands': 2}
         ]
         mock_distances.return_value.values.return_value = [
-            {'station_from': 1, 'station_to': 2, 'distance': 1000},
-            {'station_from': 2, 'station_to': 1, 'distance': 1000}
+            {'station_from': 1, 'station_to': 2, 'distance': 1.0},
+            {'station_from': 2, 'station_to': 1, 'distance': 1.0}
         ]
         mock_load_models.return_value = {1: MockModel(), 2: MockModel()}
 
@@ -142,15 +217,56 @@ class GetBikeRecommendationsTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('bike_recommendations', response_data)
 
+    @patch('bikes.views.compute_bike_recommendations')
+    @patch('bikes.views.get_latest_harvest_time')
+    def test_get_bike_recommendations_stored_plan(self, mock_harvest_time, mock_compute):
+        harvest_time = datetime(2024, 3, 12, 12, 0, tzinfo=timezone.utc)
+        mock_harvest_time.return_value = harvest_time
+        BikeRecommendationPlan.objects.create(
+            harvest_time=harvest_time,
+            recommendations=[{'station_from_id': 1, 'station_to_id': 2, 'bikes_to_move': 3}]
+        )
+
+        response = get_bike_recommendations(self.factory.get('/'))
+        response_data = json.loads(response.content.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_data['bike_recommendations'][0]['bikes_to_move'], 3)
+        mock_compute.assert_not_called()
+
+        mock_compute.return_value = ([], [], None)
+        response = get_bike_recommendations(self.factory.get('/', {'fresh': '1'}))
+        response_data = json.loads(response.content.decode())
+        self.assertEqual(response_data['bike_recommendations'], [])
+        mock_compute.assert_called_once()
+        self.assertEqual(BikeRecommendationPlan.objects.get(harvest_time=harvest_time).recommendations, [])
+
+    @patch('bikes.views.load_prophet_models')
+    def test_refresh_uses_snapshot_of_computation(self, mock_load_models):
+        stations = [BikeStation.objects.create(id=station_id, name=f'Station {station_id}', latitude=53.3, longitude=-6.2, capacity=20) for station_id in (1, 2)]
+        BikeDistance.objects.create(id=1, station_from_id=1, station_to_id=2, distance=1.0)
+        BikeDistance.objects.create(id=2, station_from_id=2, station_to_id=1, distance=1.0)
+        read_harvest_time = datetime(2024, 3, 12, 12, 0, tzinfo=timezone.utc)
+        newer_harvest_time = datetime(2024, 3, 12, 12, 5, tzinfo=timezone.utc)
+        # The ETL pipeline has written a newer snapshot after the harvest time was read
+        for station, available_bikes in zip(stations, (18, 2)):
+            BikeAvailabilityLatest.objects.create(
+                station=station, harvest_time=newer_harvest_time, last_update_time=newer_harvest_time,
+                available_bikes=available_bikes, available_bike_stands=20 - available_bikes, status='OPEN'
+            )
+        mock_load_models.return_value = {1: MockModel(), 2: MockModel()}
+
+        plan = refresh_bike_recommendations(read_harvest_time)
+        self.assertEqual(plan.harvest_time, newer_harvest_time)
+        self.assertFalse(BikeRecommendationPlan.objects.filter(harvest_time=read_harvest_time).exists())
+
     @patch('os.path.exists')
-    @patch('builtins.open', new_callable=mock_open, read_data='binary data here')
-    @patch('pickle.load')
-    def test_load_prophet_models(self, mock_pickle_load, mock_open, mock_exists):
+    @patch('bikes.views.model_registry')
+    def test_load_prophet_models(self, mock_registry, mock_exists):
         mock_exists.return_value = True
-        mock_pickle_load.return_value = {'model_id': 'model_data'}
+        mock_registry.get.return_value = {'model_id': 'model_data'}
         models = load_prophet_models('fake_path/prophet_model.pkl')
         mock_exists.assert_called_once_with('fake_path/prophet_model.pkl')
-        mock_open.assert_called_once_with('fake_path/prophet_model.pkl', 'rb')
+        mock_registry.get.assert_called_once_with('fake_path/prophet_model.pkl')
         self.assertEqual(models, {'model_id': 'model_data'})
 
     @patch('bikes.views.load_prophet_models')
@@ -176,6 +292,163 @@ class GetBikeRecommendationsTests(TestCase):
         self.assertEqual(response_data['bike_predictions'][1]['prediction'], 8)  
 
 
+class BikeForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        BikeStation.objects.create(id=1, name='Station 1', latitude=40.7128, longitude=-74.0060, capacity=10)
+        BikeStation.objects.create(id=2, name='Station 2', latitude=40.7338, longitude=-73.9910, capacity=15)
+
+    def test_materialise_forecasts(self):
+        from .forecasts import BikeForecastMaterialiser
+
+        stored = BikeForecastMaterialiser({1: MockModel(), 2: MockModel()}, start_time=datetime(2024, 3, 12, 12), horizon_hours=48).run()
+        self.assertEqual(stored, 96)
+        self.assertEqual(BikeForecast.objects.filter(station_id=1).count(), 48)
+        self.assertEqual(BikeForecast.objects.get(station_id=2, ts=datetime(2024, 3, 13, 11, tzinfo=timezone.utc)).prediction, 10)
+
+    @patch('bikes.views.load_prophet_models')
+    def test_get_bike_predictions_materialised(self, mock_load_models):
+        from .forecasts import BikeForecastMaterialiser, get_forecast_hour
+
+        start_time = get_forecast_hour(datetime.now() + timedelta(hours=10))
+        BikeForecastMaterialiser({1: MockModel(), 2: MockModel()}, start_time=start_time, horizon_hours=3).run()
+
+        request_data = {'forecast_timedelta': 10, 'horizon': 3}
+        request = self.factory.post('/', json.dumps(request_data), content_type='application/json')
+        response = get_bike_predictions(request)
+        response_data = json.loads(response.content.decode())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response_data['bike_predictions']), 6)
+        self.assertEqual(response_data['bike_predictions'][0]['prediction'], 10)
+        self.assertEqual(response_data['bike_predictions'][0]['name'], 'Station 1')
+        self.assertEqual(response_data['bike_predictions'][0]['timestamp'], make_aware(start_time).isoformat().replace('+00:00', 'Z'))
+        mock_load_models.assert_not_called()
+
+    def test_forecast_hour_truncated(self):
+        from .forecasts import get_forecast_hour
+
+        self.assertEqual(get_forecast_hour(datetime(2024, 3, 12, 12, 50, 10)), datetime(2024, 3, 12, 12))
+
+
+class BikeAvailabilityHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        station = BikeStation.objects.create(id=1, name='Station 1', latitude=40.7128, longitude=-74.0060, capacity=20)
+        BikeStation.objects.create(id=2, name='Station 2', latitude=40.7338, longitude=-73.9910, capacity=15)
+        start_time = datetime(2024, 3, 10, tzinfo=timezone.utc)
+        BikeAvailability.objects.bulk_create([
+            BikeAvailability(
+                station=station,
+                harvest_time=start_time + timedelta(minutes=5 * i),
+                last_update_time=start_time + timedelta(minutes=5 * i),
+                available_bikes=20 if i == 300 else i % 10,
+                available_bike_stands=20 - (20 if i == 300 else i % 10),
+                status='OPEN'
+            ) for i in range(576)
+        ])
+
+    def get_history(self, **params):
+        request = RequestFactory().get(reverse('get_bike_availability_history'), params)
+        response = get_bike_availability_history(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_bucketed_history(self):
+        status, response_data = self.get_history(station_id=[1, 2], start='2024-03-10T00:00:00', end='2024-03-11T23:59:59', points=100)
+
+        self.assertEqual(status, 200)
+        station_1, station_2 = response_data['bike_history']
+        self.assertEqual(len(station_1['timestamps']), 48)
+        self.assertEqual(station_1['available_bikes'][0], 3.83)
+        self.assertEqual(station_2, {'station_id': 2, 'timestamps': [], 'available_bikes': [], 'available_bike_stands': []})
+
+    def test_lttb_history(self):
+        status, response_data = self.get_history(station_id=1, start='2024-03-10T00:00:00', end='2024-03-11T23:59:59', points=50, method='lttb')
+
+        self.assertEqual(status, 200)
+        station_1 = response_data['bike_history'][0]
+        self.assertEqual(len(station_1['timestamps']), 50)
+        self.assertEqual(station_1['timestamps'][0], '2024-03-10T00:00:00Z')
+        self.assertIn(20, station_1['available_bikes'])
+
+    def test_invalid_history_request(self):
+        self.assertEqual(self.get_history()[0], 400)
+        self.assertEqual(self.get_history(station_id=1, method='average')[0], 400)
+        self.assertEqual(self.get_history(station_id=1, start='yesterday')[0], 400)
+
+
+class GlobalBikeForecasterTests(TestCase):
+    def setUp(self):
+        from .global_model import GlobalBikeForecaster
+
+        rng = np.random.default_rng(0)
+        hours = pd.date_range('2024-01-01', periods=24 * 10, freq='1H')
+        values = np.array([5, 10, 15])[None, :] + 3 * np.sin(2 * np.pi * hours.hour.values / 24)[:, None] + rng.normal(0, 0.5, (len(hours), 3))
+        self.hourly_df = pd.DataFrame(values, index=hours, columns=[1, 2, 3])
+        self.forecaster = GlobalBikeForecaster(horizon_hours=6).fit(self.hourly_df)
+        self.future = pd.DataFrame({'ds': pd.date_range(hours[-1] + pd.Timedelta(hours=1), periods=4, freq='1H')})
+
+    def test_dictionary_interface(self):
+        self.assertEqual(self.forecaster.keys(), [1, 2, 3])
+        self.assertIn(2, self.forecaster)
+        self.assertNotIn(4, self.forecaster)
+
+        forecast = self.forecaster[3].predict(self.future)
+        self.assertEqual(list(forecast.columns), ['ds', 'yhat', 'yhat_lower', 'yhat_upper'])
+        self.assertTrue((forecast.yhat_lower < forecast.yhat).all() and (forecast.yhat < forecast.yhat_upper).all())
+        self.assertLess(abs(forecast.yhat.mean() - 15), 4)
+
+    def test_single_batched_call(self):
+        with patch.object(self.forecaster.regressor, 'predict', wraps=self.forecaster.regressor.predict) as mock_predict:
+            forecasts = [self.forecaster[station_id].predict(self.future) for station_id in self.forecaster.keys()]
+        self.assertEqual(mock_predict.call_count, 1)
+        self.assertLess(forecasts[0].yhat.mean(), forecasts[2].yhat.mean())
+
+    def test_clear_cache(self):
+        with patch.object(self.forecaster.regressor, 'predict', wraps=self.forecaster.regressor.predict) as mock_predict:
+            self.forecaster.predict_batch(self.future['ds'])
+            self.forecaster.predict_batch(self.future['ds'])
+            self.forecaster.clear_cache()
+            self.forecaster.predict_batch(self.future['ds'])
+        self.assertEqual(mock_predict.call_count, 2)
+
+    def test_timestamps_outside_horizon(self):
+        origin = self.hourly_df.index[-1]
+        for timestamp in [origin, origin + pd.Timedelta(hours=7)]:
+            with self.assertRaises(ValueError):
+                self.forecaster.predict_batch([timestamp])
+
+    def test_update_history_swaps_history(self):
+        history = self.forecaster.history
+        previous_values = history[1].copy()
+        before = self.forecaster.predict_batch(self.future['ds'])
+
+        self.forecaster.update_history(self.hourly_df + 5, end_time=datetime(2024, 1, 11))
+        self.assertIsNot(self.forecaster.history, history)
+        np.testing.assert_array_equal(history[1], previous_values)
+        self.assertEqual(self.forecaster.history_end, datetime(2024, 1, 11))
+
+        # The batch predicted from the previous history is not served
+        after = self.forecaster.predict_batch(self.future['ds'])
+        self.assertGreater(after[0].mean(), before[0].mean())
+
+    def test_load_hourly_availability(self):
+        from .global_model import load_hourly_availability
+
+        station = BikeStation.objects.create(id=1, name='Station 1', latitude=40.7128, longitude=-74.0060, capacity=10)
+        for minute, available_bikes in [(0, 4), (30, 6)]:
+            BikeAvailability.objects.create(
+                station=station, harvest_time=datetime(2024, 3, 12, 12, minute, tzinfo=timezone.utc),
+                last_update_time=datetime(2024, 3, 12, 12, minute, tzinfo=timezone.utc),
+                available_bike_stands=4, available_bikes=available_bikes, status='Open'
+            )
+        hourly_df = load_hourly_availability(datetime(2024, 3, 12, 11, tzinfo=timezone.utc), datetime(2024, 3, 12, 14, tzinfo=timezone.utc))
+        self.assertEqual(len(hourly_df), 3)
+        self.assertEqual(hourly_df.loc['2024-03-12 12:00', 1], 5)
+        self.assertTrue(np.isnan(hourly_df.loc['2024-03-12 11:00', 1]))
+
+
 class MockModel:
     def predict(self, df):
         return pd.DataFrame({
@@ -186,6 +459,19 @@ class MockModel:
         })
 
 
+class ConstantModel:
+    def __init__(self, yhat):
+        self.yhat = float(yhat)
+
+    def predict(self, df):
+        return pd.DataFrame({
+            'ds': df['ds'],
+            'yhat': [self.yhat for _ in df['ds']],
+            'yhat_lower': [self.yhat - 3 for _ in df['ds']],
+            'yhat_upper': [self.yhat + 3 for _ in df['ds']]
+        })
+
+
 class TestBikeRecommender(unittest.TestCase):
     def setUp(self):
         self.stations_df = pd.DataFrame({
@@ -197,7 +483,7 @@ class TestBikeRecommender(unittest.TestCase):
         self.distances_df = pd.DataFrame({
             'station_from': [1, 1, 2, 2, 3, 3],
             'station_to': [2, 3, 1, 3, 1, 2],
-            'distance': [1000, 1500, 1000, 500, 1500, 500]
+            'distance': [1.0, 1.5, 1.0, 0.5, 1.5, 0.5]
         })
 
         self.forecast_model = MagicMock()
@@ -228,8 +514,8 @@ class TestBikeRecommender(unittest.TestCase):
 
     def test_get_station_distances(self):
         test_cases = [
-            (1, np.array([1e-3, 1000, 1500])),
-            (2, np.array([1e-3, 500, 1000]))
+            (1, np.array([1e-3, 1.0, 1.5])),
+            (2, np.array([1e-3, 0.5, 1.0]))
         ]
         for station_id, expected_distances in test_cases:
             actual_distances = self.recommender.get_station_distances(station_id)
@@ -241,11 +527,195 @@ class TestBikeRecommender(unittest.TestCase):
                                                 err_msg=f"Distances do not match expected values for station {station_id}")
             
 
+    def test_build_candidate_index(self):
+        self.recommender._candidate_neighbours = 1
+        self.recommender._candidate_radius = 1.2
+        candidate_index = self.recommender.build_candidate_index()
+
+        np.testing.assert_array_equal(candidate_index[1][0], np.array([2]))
+        np.testing.assert_array_equal(candidate_index[3][0], np.array([2]))
+        np.testing.assert_array_almost_equal(candidate_index[3][1], np.array([0.5]))
+
+    def test_candidate_radius_in_kilometres(self):
+        # The distances of the BikeDistance table are in kilometres, up to about 7 km across the network
+        distances_df = pd.DataFrame({
+            'station_from': [1, 1, 2, 2, 3, 3],
+            'station_to': [2, 3, 1, 3, 1, 2],
+            'distance': [1.2, 6.9, 1.2, 5.8, 6.9, 5.8]
+        })
+        recommender = BikeRecommender(self.stations_df, distances_df, MagicMock(), self.timestamps_to_predict, candidate_radius=_CANDIDATE_RADIUS)
+        candidate_index = recommender.build_candidate_index()
+
+        np.testing.assert_array_equal(candidate_index[1][0], np.array([2]))
+        self.assertNotIn(3, candidate_index)
+
+    def test_rank_destination_stations_with_candidates(self):
+        stations_df = self.stations_df.assign(run_out_prob=[0.1, 0.8, 0.6])
+        self.recommender._candidate_radius = 1.2
+        ranked_df = self.recommender.rank_destination_stations(stations_df, 1)
+
+        self.assertEqual(ranked_df['id'].tolist(), [2])
+        self.assertAlmostEqual(ranked_df['priority'].iloc[0], 0.8 / 1.0)
+
+    def test_update_recommendations(self):
+        recommender = BikeRecommender(
+            stations_df=self.stations_df,
+            distances_df=self.distances_df,
+            forecast_model={1: MockModel(), 2: MockModel(), 3: MockModel()},
+            timestamps_to_predict=pd.DataFrame({'ds': self.timestamps_to_predict})
+        )
+        previous_state_df = self.stations_df.assign(recommended_moves=[-2, 2, 0], run_out_prob=[0.1, 0.4, 0.1])
+        previous_moves = [{'station_from_id': 1, 'station_to_id': 2, 'bikes_to_move': 2}]
+        recommender.calculate_run_out_probabilities = MagicMock(return_value=[0.2])
+        recommender.plan_bike_moves = MagicMock(return_value=[{'station_from_id': 3, 'station_to_id': 2, 'bikes_to_move': 1}])
+        recommender.stations_df = self.stations_df.assign(available_bikes=[15, 5, 18])
+
+        moves = recommender.update_recommendations(previous_state_df, previous_moves)
+
+        self.assertEqual(len(recommender.calculate_run_out_probabilities.call_args[0][0]), 1)
+        self.assertEqual(recommender.plan_bike_moves.call_args[1]['source_station_ids'], [3])
+        self.assertEqual(moves, [
+            {'station_from_id': 1, 'station_to_id': 2, 'bikes_to_move': 2},
+            {'station_from_id': 3, 'station_to_id': 2, 'bikes_to_move': 1}
+        ])
+        self.assertEqual(recommender.recommendation_state['run_out_prob'].tolist(), [0.1, 0.4, 0.2])
+
+    def make_network_recommender(self, available_bikes, maximum_moves):
+        # Three pairs of a full and an empty station, the pairs 10 km apart from each other
+        stations_df = pd.DataFrame({
+            'id': [1, 2, 3, 4, 5, 6],
+            'available_bikes': available_bikes,
+            'available_bike_stands': [30 - bikes for bikes in available_bikes]
+        })
+        positions = {1: 0.0, 2: 0.5, 3: 10.0, 4: 10.5, 5: 20.0, 6: 20.5}
+        distances_df = pd.DataFrame(
+            [(a, b, abs(positions[a] - positions[b])) for a in positions for b in positions if a != b],
+            columns=['station_from', 'station_to', 'distance']
+        )
+        forecast_model = {station_id: ConstantModel(bikes) for station_id, bikes in zip(stations_df['id'], [25, 2, 24, 2, 23, 2])}
+        recommender = BikeRecommender(stations_df, distances_df, forecast_model, pd.DataFrame({'ds': self.timestamps_to_predict}), candidate_neighbours=1)
+        recommender._maximum_moves = maximum_moves
+        return recommender
+
+    def test_update_recommendations_matches_full_run(self):
+        previous = self.make_network_recommender([25, 2, 24, 2, 23, 2], maximum_moves=1)
+        previous_moves = previous.generate_recommendations()
+        self.assertEqual(len(previous_moves), 1)
+
+        # Unchanged snapshot: the previous plan is kept as it is
+        recommender = self.make_network_recommender([25, 2, 24, 2, 23, 2], maximum_moves=1)
+        self.assertEqual(recommender.update_recommendations(previous.recommendation_state, previous_moves), previous_moves)
+
+        # A changed station does not add sources beyond the maximum number of moves of a full run
+        recommender = self.make_network_recommender([25, 2, 24, 2, 24, 2], maximum_moves=1)
+        moves = recommender.update_recommendations(previous.recommendation_state, previous_moves)
+        full_moves = self.make_network_recommender([25, 2, 24, 2, 24, 2], maximum_moves=1).generate_recommendations()
+        self.assertEqual(moves, full_moves)
+
     def test_generate_recommendations(self):
         self.recommender.calculate_run_out_probability = MagicMock(return_value=0.1)
         self.recommender.calculate_bike_surplus = MagicMock(return_value=5)
-        self.recommender.get_station_distances = MagicMock(return_value=np.array([0.001, 500, 1000]))
+        self.recommender.get_station_distances = MagicMock(return_value=np.array([0.001, 0.5, 1.0]))
         
 
 
 
+
+
+class TestRecommenderBenchmark(unittest.TestCase):
+    def test_synthetic_network(self):
+        from .benchmark import SyntheticBikeNetwork
+
+        network = SyntheticBikeNetwork(20, hours_to_predict=4).generate()
+        self.assertEqual(len(network['stations_df']), 20)
+        self.assertEqual(len(network['distances_df']), 20 * 19)
+        self.assertTrue((network['stations_df']['available_bike_stands'] >= 0).all())
+
+        forecast = network['forecast_model'][1].predict(network['timestamps_to_predict'])
+        self.assertEqual(len(forecast), 4)
+        self.assertTrue((forecast['yhat_upper'] > forecast['yhat_lower']).all())
+
+    def test_run_benchmark(self):
+        from .benchmark import RecommenderBenchmark
+
+        results = RecommenderBenchmark(sizes=[20], candidate_neighbours=5).run()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['n_stations'], 20)
+        self.assertEqual(set(results[0]['phase_seconds']), {'probabilities', 'surplus', 'priority', 'moves'})
+        self.assertGreaterEqual(results[0]['total_seconds'], sum(results[0]['phase_seconds'].values()))
+
+
+class TestInventorySimulator(unittest.TestCase):
+    def setUp(self):
+        from .simulator import InventorySimulator
+
+        stations_df = pd.DataFrame({
+            'id': [1, 2],
+            'available_bikes': [20, 0],
+            'available_bike_stands': [0, 20]
+        })
+        full_model, empty_model = MagicMock(), MagicMock()
+        full_model.predict.side_effect = lambda df: pd.DataFrame({'yhat': [20.0] * len(df), 'yhat_lower': [18.0] * len(df), 'yhat_upper': [22.0] * len(df)})
+        empty_model.predict.side_effect = lambda df: pd.DataFrame({'yhat': [0.0] * len(df), 'yhat_lower': [-2.0] * len(df), 'yhat_upper': [2.0] * len(df)})
+        self.simulator = InventorySimulator(
+            stations_df=stations_df,
+            forecast_model={1: full_model, 2: empty_model},
+            timestamps_to_predict=pd.DataFrame({'ds': pd.date_range("2024-01-01", periods=3, freq='H')}),
+            n_scenarios=200,
+            seed=0
+        )
+
+    def test_simulate_shape_and_bounds(self):
+        inventory = self.simulator.simulate([])
+        self.assertEqual(inventory.shape, (200, 2, 3))
+        self.assertTrue((inventory >= 0).all())
+        self.assertTrue((inventory <= 20).all())
+
+    def test_evaluate_plan(self):
+        baseline = self.simulator.evaluate([])
+        evaluation = self.simulator.evaluate([{'station_from_id': 1, 'station_to_id': 2, 'bikes_to_move': 8}])
+        self.assertLess(evaluation['expected_empty_station_hours'], baseline['expected_empty_station_hours'])
+        self.assertLess(evaluation['expected_full_station_hours'], baseline['expected_full_station_hours'])
+        self.assertEqual(len(evaluation['stations']), 2)
+
+
+class TestForecastBacktest(unittest.TestCase):
+    def setUp(self):
+        hours = pd.date_range('2024-01-01', periods=24 * 12, freq='H')
+        daily = 10 + 5 * np.sin(2 * np.pi * hours.hour / 24)
+        self.hourly_df = pd.DataFrame({1: daily, 2: np.full(len(hours), 7.0), 3: daily + 3}, index=hours)
+
+    def test_persistence_backtest(self):
+        from .backtesting import ForecastBacktest, PersistenceBacktestModel
+
+        backtest = ForecastBacktest(self.hourly_df, [PersistenceBacktestModel()], n_origins=3, origin_step=12, horizon_hours=6, train_days=2, n_workers=1, station_chunks=2)
+        result = backtest.run()
+        persistence = result['models']['persistence']
+
+        self.assertEqual(result['n_origins'], 3)
+        self.assertEqual(len(persistence['mae_by_horizon']), 6)
+        self.assertEqual(persistence['mae_by_station'][2], 0.0)
+        self.assertGreater(persistence['mae_by_station'][1], 0.0)
+        self.assertEqual(len(backtest.to_frame()), 3 * 6)
+
+    def test_models_in_process_pool(self):
+        from .backtesting import ForecastBacktest, GlobalBacktestModel, PersistenceBacktestModel
+
+        result = ForecastBacktest(
+            self.hourly_df,
+            [PersistenceBacktestModel(), GlobalBacktestModel(horizon_hours=6, origin_step=12)],
+            n_origins=2, origin_step=24, horizon_hours=6, train_days=8, n_workers=2
+        ).run()
+
+        self.assertEqual(set(result['models']), {'persistence', 'global'})
+        for model_result in result['models'].values():
+            self.assertGreater(model_result['model_bytes'], 0)
+            self.assertGreater(model_result['seconds_per_forecast'], 0)
+            self.assertTrue(0 <= model_result['coverage'] <= 1)
+        self.assertEqual(len(result['models']['global']['mae_by_station']), 3)
+
+    def test_insufficient_history(self):
+        from .backtesting import ForecastBacktest, PersistenceBacktestModel
+
+        with self.assertRaises(ValueError):
+            ForecastBacktest(self.hourly_df, [PersistenceBacktestModel()], n_origins=5, train_days=10).run()
@@ -1,65 +1,101 @@
 import os
 import json
-import pickle
 import pandas as pd
 from datetime import datetime, timedelta
 
+from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse
-from django.db.models import OuterRef, Subquery
+from django.utils.timezone import make_aware
+from django.db.models import F, Max
 from django.db.models.functions import Coalesce
 from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.views.decorators.vary import vary_on_headers
+
+from project.caching import cache_post_response
+from project.registry import model_registry
+from project.shards import get_sharded_path
+from project.responses import get_representation_etag, tabular_response
 
 from .models import BikeDistance
-from .models import BikeStation, BikeAvailability
+from .models import BikeStation, BikeAvailabilityLatest, BikeRecommendationPlan, BikeForecast
+from .forecasts import FORECAST_HORIZON_HOURS, PREDICTIONS_CACHE_NAMESPACE, get_forecast_hour
 from .recommender import BikeRecommender
+from .history import BikeAvailabilityHistory, DOWNSAMPLING_METHODS
+
+_PROPHET_MODELS_FILE = 'bikes/analytics/bike_model.pkl'
+_GLOBAL_MODEL_FILE = 'bikes/analytics/bike_global_model.pkl'
+
+# Destinations considered for the surplus of each station in the recommendations, the radius in kilometres as the
+# distances of the BikeDistance table
+_CANDIDATE_NEIGHBOURS = 15
+_CANDIDATE_RADIUS = 3.0
+
+# Default and maximum number of points per station returned by the history endpoint
+_HISTORY_DEFAULT_POINTS = 500
+_HISTORY_MAX_POINTS = 5000
+_HISTORY_DEFAULT_RANGE = timedelta(days=7)
+
+# Maximum age of a stored plan that can be updated incrementally instead of recomputed
+_INCREMENTAL_MAX_AGE = timedelta(hours=1)
+
+# Seconds the display data of a snapshot is kept in the cache
+_DISPLAY_CACHE_TIMEOUT = 60 * 10
 
-def get_latest_bike_availability():
+def get_latest_bike_availability(since=None, include_harvest_time=False):
     """
     Retrieves the latest bike availability data for each bike station from a database using Django ORM. 
-    This function performs a subquery for each station to find the most recent availability update and then 
-    annotates the main query of bike stations with this data. It ensures that all stations are listed with 
-    their most recent availability of bikes and bike stands, including handling cases where recent data might be null.
+    The latest availability of every station is kept in the bike availability latest table, which the ETL pipeline
+    upserts on each snapshot, so the stations are joined with one row each instead of searching the availability
+    history. It ensures that all stations are listed with their most recent availability of bikes and bike stands,
+    including handling cases where recent data might be null.
 
     The function constructs a queryset that:
-    - Executes a subquery for the latest update time, available bikes, and bike stands per station.
-    - Annotates the results with these details, ensuring every station record is updated with its latest figures.
+    - Joins every station with its row in the latest availability table.
+    - Annotates the results with the latest update time, available bikes and bike stands of the station.
     - Uses Coalesce to handle null values, ensuring fields without data receive a default value (0 for bikes and stands, None for time).
-    
+    - If `since` is given, keeps only the stations whose reading was first harvested after it. The ETL pipeline only
+      replaces the row of a station with a newer reading, so the stations with unchanged readings are left out.
+
+    :param since: Only return the stations harvested after this time, such as the harvest time of a previous response.
+                  All stations are returned if None.
+    :type since: datetime, optional
+    :param include_harvest_time: Whether to include the harvest time of the snapshot of every station, so that the
+                                 snapshot is identified by the same query as the availability.
+    :type include_harvest_time: bool
+
     :returns: A list of dictionaries, each containing the station's id, name, latitude, longitude, capacity,
               and latest availability data including the last update time, number of available bikes, and bike stands.
     :rtype: list
 
     This method provides essential data for real-time applications requiring up-to-date information on bike station statuses.
     """
-    most_recent_availability_subquery = BikeAvailability.objects.filter(
-        station=OuterRef('pk')
-    ).order_by('-last_update_time').values('last_update_time', 'available_bikes', 'available_bike_stands')[:1]
-
-    stations_with_recent_data = BikeStation.objects.annotate(
-        last_update_time=Subquery(most_recent_availability_subquery.values('last_update_time')[:1]),
-        available_bikes=Subquery(most_recent_availability_subquery.values('available_bikes')[:1]),
-        available_bike_stands=Subquery(most_recent_availability_subquery.values('available_bike_stands')[:1])
-    ).values('id', 'name', 'latitude', 'longitude', 'capacity').order_by('id')
-
-    # Use Coalesce for null values
-    stations_with_recent_data = stations_with_recent_data.annotate(
-        last_update_time=Coalesce('last_update_time', None),  
-        available_bikes=Coalesce('available_bikes', 0),
-        available_bike_stands=Coalesce('available_bike_stands', 0)  
-    )
+    stations_with_recent_data = BikeStation.objects.values('id', 'name', 'latitude', 'longitude', 'capacity').annotate(
+        last_update_time=F('latest_availability__last_update_time'),
+        available_bikes=Coalesce('latest_availability__available_bikes', 0),
+        available_bike_stands=Coalesce('latest_availability__available_bike_stands', 0)
+    ).order_by('id')
+    if include_harvest_time:
+        stations_with_recent_data = stations_with_recent_data.annotate(harvest_time=F('latest_availability__harvest_time'))
+    if since is not None:
+        stations_with_recent_data = stations_with_recent_data.filter(latest_availability__harvest_time__gt=since)
     return list(stations_with_recent_data)
 
 
-def load_prophet_models(prophet_models_file):
+def load_prophet_models(prophet_models_file, point_forecast=False):
     """
     Loads and returns serialized Prophet forecasting models from a specified file. If the file exists, 
-    it reads and deserializes the models using Python's pickle module. If the file does not exist, the 
-    function prints an error message and returns None.
+    the models are retrieved from the process-wide model registry, which deserializes the file only once 
+    and reloads it when it changes. If the file does not exist, the function prints an error message and 
+    returns None.
 
     :param prophet_models_file: The path to the file containing the serialized Prophet models.
     :type prophet_models_file: str
+    :param point_forecast: Whether to return the point forecast version of the models, which skips the
+                           uncertainty sampling of Prophet and returns an analytic interval instead.
+    :type point_forecast: bool
 
     :returns: The loaded Prophet models if the file exists, otherwise None.
     :rtype: dict or None
@@ -68,22 +104,82 @@ def load_prophet_models(prophet_models_file):
     forecasting without needing to retrain models from scratch, thereby saving computation time and resources.
     """    
     if os.path.exists(prophet_models_file):
-        with open(prophet_models_file, 'rb') as f:
-            loaded_models = pickle.load(f)
-        return loaded_models
+        if point_forecast:
+            return model_registry.get_point_forecaster(prophet_models_file)
+        return model_registry.get(prophet_models_file)
     else:
         print(f"Prophet models file '{prophet_models_file}' not found.")
         return None
 
+def load_bike_forecast_models(point_forecast=False):
+    """
+    Loads the bike availability forecaster selected by the BIKE_FORECAST_MODEL setting. The global lag-feature model
+    is loaded when it is selected and trained, with its lag history refreshed from the database for the latest
+    snapshot. The Prophet models are loaded otherwise. Both expose the same dictionary interface, with one model
+    per station ID.
+
+    :param point_forecast: Whether to return the point forecast version of the Prophet models.
+    :type point_forecast: bool
+
+    :returns: The forecasting models, or None if no model file exists.
+    :rtype: dict or GlobalBikeForecaster or None
+    """
+    if settings.BIKE_FORECAST_MODEL == 'global' and os.path.exists(_GLOBAL_MODEL_FILE):
+        harvest_time = get_latest_harvest_time()
+        global_model = model_registry.get(_GLOBAL_MODEL_FILE)
+        if harvest_time is not None:
+            # Lag features up to the last complete hour before the latest snapshot, the origin the model is trained
+            # with, so that the current hour is the first hour of the horizon
+            global_model.refresh_history(harvest_time.replace(minute=0, second=0, microsecond=0))
+        return global_model
+    # The sharded version of the Prophet models, when exported, deserializes the station models on demand
+    return load_prophet_models(get_sharded_path(_PROPHET_MODELS_FILE), point_forecast=point_forecast)
+
+def get_bike_display_etag(request):
+    """
+    Derives the entity tag of the bike display data from the harvest time of the latest snapshot, so that the
+    data is only sent again when the ETL pipeline has written a new snapshot. The negotiated format is part of the
+    entity tag, and the `since` parameter is not, so that clients merging deltas keep receiving 304 responses.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+
+    :returns: The entity tag, or None if no bike availability data exists.
+    :rtype: str or None
+    """
+    harvest_time = get_latest_harvest_time()
+    return None if harvest_time is None else get_representation_etag(request, f"bikes-{harvest_time.isoformat()}")
+
+def get_bike_display_last_modified(request):
+    """
+    Retrieves the modification time of the bike display data, which is the harvest time of the latest snapshot.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+
+    :returns: The harvest time of the latest snapshot, or None if no bike availability data exists.
+    :rtype: datetime or None
+    """
+    return get_latest_harvest_time()
+
 @csrf_exempt
 @require_GET
-@cache_page(60 * 5)    
+@vary_on_headers('Accept')
+@condition(etag_func=get_bike_display_etag, last_modified_func=get_bike_display_last_modified)
 def get_bike_display_data(request):
     """
     Fetch and return the latest bike station availability data. This Django view handles GET requests
     and responds with a JSON object that contains current data about the availability of bikes at various stations.
     The response includes each station's ID, name, location, capacity, and current number of available bikes and bike stands.
 
+    The response carries an ETag and a Last-Modified header derived from the harvest time of the latest snapshot,
+    and conditional requests (If-None-Match or If-Modified-Since) receive a 304 response while no new snapshot
+    has been written. An optional `since` query parameter, in ISO format, restricts the response to the stations
+    harvested after that time, so that clients polling frequently can pass the harvest time of their last response
+    and merge the changes into the data they already have. Both responses vary on the Accept header. Clients accepting `application/vnd.apache.arrow.stream` receive the stations as
+    an Apache Arrow IPC stream instead, with the harvest time in the schema metadata. The station data is cached per
+    snapshot and `since` value, so that most requests are served from the in-process cache.
+
     :param request: The HTTP request object.
     :type request: HttpRequest
 
@@ -93,21 +189,101 @@ def get_bike_display_data(request):
                     {'id': int, 'name': str, 'latitude': float, 'longitude': float,
                      'capacity': int, 'available_bikes': int, 'available_bike_stands': int,
                      'last_update_time': datetime}
-                ]
+                ],
+                'harvest_time': datetime
              }
+             or an error message with status 400 if `since` is invalid.
     :rtype: JsonResponse
     """
-    station_data = get_latest_bike_availability()
-    return JsonResponse({ 'bike_station_data': station_data }, status=200)
-    
-@csrf_exempt
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError as e:
+            return JsonResponse({ 'error': str(e) }, status=400)
+        since = make_aware(since) if since.tzinfo is None else since
+
+    harvest_time = get_latest_harvest_time()
+    cache_key = f"bike_display:{harvest_time.isoformat() if harvest_time else None}:{since.isoformat() if since else None}"
+    station_data = cache.get_or_set(cache_key, lambda: get_latest_bike_availability(since=since), _DISPLAY_CACHE_TIMEOUT)
+    return tabular_response(
+        request,
+        station_data,
+        json_data={ 'bike_station_data': station_data, 'harvest_time': harvest_time },
+        metadata={ 'harvest_time': harvest_time }
+    )
+
 @require_GET
-# @cache_page(60 * 5)
-def get_bike_recommendations(request):
+def get_bike_availability_history(request):
     """
-    A Django view function to fetch and respond with bike movement recommendations based on current bike availability, 
-    bike station distances, and forecasted bike usage. This function is exposed as an API endpoint that handles GET requests 
-    and returns JSON data containing the recommended movements of bikes to optimize their distribution across stations.
+    Handles GET requests for the availability history of one or more bike stations over a time range, downsampled
+    on the server to a number of points per station so that charts of long ranges stay small. The query parameters are:
+    - `station_id`: the ID of a station, repeated for several stations (required).
+    - `start` and `end`: the time range in ISO format. Defaults to the last seven days.
+    - `points`: the maximum number of points per station, 500 by default and at most 5000.
+    - `method`: 'bucket' to average the availability over time buckets truncated in the database, or 'lttb' to keep
+      the records selected by the Largest-Triangle-Three-Buckets algorithm. Defaults to 'bucket'.
+    Clients accepting `application/vnd.apache.arrow.stream` receive an Apache Arrow IPC stream instead, with one row per
+    station and timestamp.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+
+    :return: JsonResponse containing the series of each station, formatted as:
+             {
+                'bike_history': [
+                    {'station_id': int, 'timestamps': [datetime], 'available_bikes': [float],
+                     'available_bike_stands': [float]}
+                ]
+             }
+             or an error message with status 400 if the parameters are invalid.
+    :rtype: JsonResponse
+    """
+    try:
+        station_ids = [int(station_id) for station_id in request.GET.getlist('station_id')]
+        end_time = datetime.fromisoformat(request.GET['end']) if 'end' in request.GET else datetime.now()
+        start_time = datetime.fromisoformat(request.GET['start']) if 'start' in request.GET else end_time - _HISTORY_DEFAULT_RANGE
+        n_points = min(max(int(request.GET.get('points', _HISTORY_DEFAULT_POINTS)), 2), _HISTORY_MAX_POINTS)
+    except ValueError as e:
+        return JsonResponse({ 'error': str(e) }, status=400)
+
+    method = request.GET.get('method', 'bucket')
+    if not station_ids or method not in DOWNSAMPLING_METHODS or start_time > end_time:
+        return JsonResponse({ 'error': 'At least one station_id, a valid method and a valid time range are required.' }, status=400)
+
+    start_time = make_aware(start_time) if start_time.tzinfo is None else start_time
+    end_time = make_aware(end_time) if end_time.tzinfo is None else end_time
+    series = BikeAvailabilityHistory(station_ids, start_time, end_time, n_points).get_series(method)
+
+    # The Arrow stream holds one row per station and timestamp
+    rows = [{
+        'station_id': station_id,
+        'timestamp': timestamp,
+        'available_bikes': float(available_bikes),
+        'available_bike_stands': float(available_bike_stands)
+    } for station_id, station_series in series.items() for timestamp, available_bikes, available_bike_stands in zip(
+        station_series['timestamps'], station_series['available_bikes'], station_series['available_bike_stands']
+    )]
+    return tabular_response(request, rows, json_data={
+        'bike_history': [{ 'station_id': station_id, **station_series } for station_id, station_series in series.items()]
+    })
+
+def get_latest_harvest_time():
+    """
+    Retrieves the harvest time of the most recent bike availability snapshot written by the ETL pipeline,
+    from the latest availability table, which holds one row per station.
+
+    :returns: The latest harvest time, or None if no bike availability data exists.
+    :rtype: datetime or None
+    """
+    return BikeAvailabilityLatest.objects.aggregate(latest_harvest_time=Max('harvest_time'))['latest_harvest_time']
+
+
+def compute_bike_recommendations(previous_plan=None):
+    """
+    Runs the bike recommender on the latest bike availability data and returns the recommended bike movements.
+    If a previous plan with its station state is given, the recommender only updates the moves affected by the
+    stations whose availability has changed since that plan.
 
     The function performs several steps:
     - Fetches the most recent bike availability data.
@@ -115,20 +291,24 @@ def get_bike_recommendations(request):
     - Defines a future timestamp range for which bike usage is to be predicted.
     - Loads serialized Prophet forecasting models for predicting bike usage.
     - Initializes a bike recommender system with the fetched data and models.
-    - Generates and returns bike movement recommendations based on current and forecasted data.
-
-    :param request: The HTTP request object.
-    :type request: HttpRequest
+    - Generates bike movement recommendations based on current and forecasted data.
 
-    :returns: A JsonResponse object containing the bike recommendations in a JSON format with a 200 HTTP status.
-    :rtype: JsonResponse
+    :param previous_plan: A previous recommendation plan to update incrementally.
+    :type previous_plan: BikeRecommendationPlan, optional
 
-    This endpoint is useful for client-side applications that require real-time recommendations for bike redistributions 
-    to ensure optimal availability across a network of bike stations.
+    :returns: A tuple containing the list of recommended moves, each with 'station_from_id', 'station_to_id' and
+              'bikes_to_move', the list of station states reached by the moves, and the harvest time of the snapshot
+              the recommendations are computed from, or None if it is unknown.
+    :rtype: tuple
     """
-    # Fetch the most recent bike availability data
-    bike_availability = get_latest_bike_availability()
+    # Fetch the most recent bike availability data, with the harvest time of the snapshot read by the same query, so
+    # that the snapshot is identified consistently even if the ETL pipeline writes a new one in the meantime
+    bike_availability = get_latest_bike_availability(include_harvest_time=True)
     bike_availability_df = pd.DataFrame(bike_availability)
+    snapshot_harvest_time = None
+    if 'harvest_time' in bike_availability_df and bike_availability_df['harvest_time'].notna().any():
+        snapshot_harvest_time = bike_availability_df['harvest_time'].max().to_pydatetime()
+        bike_availability_df = bike_availability_df.drop(columns='harvest_time')
 
     # Fetch the bike station distances
     bike_distances = BikeDistance.objects.all().values('station_from', 'station_to', 'distance')
@@ -140,76 +320,202 @@ def get_bike_recommendations(request):
     timestamps_to_predict = pd.DataFrame(timestamps_to_predict, columns=['ds'])
 
     # Load the forecasting model
-    prophet_models_file = 'bikes/analytics/bike_model.pkl'
-    prophet_model = load_prophet_models(prophet_models_file)
+    prophet_model = load_bike_forecast_models()
 
     # Initialize the bike recommender
     bike_recommender = BikeRecommender(
         stations_df=bike_availability_df,
         distances_df=bike_distances_df,
         forecast_model=prophet_model,
-        timestamps_to_predict=timestamps_to_predict
+        timestamps_to_predict=timestamps_to_predict,
+        candidate_neighbours=_CANDIDATE_NEIGHBOURS,
+        candidate_radius=_CANDIDATE_RADIUS
     )
-    recommendations = bike_recommender.generate_recommendations()
+    if previous_plan is not None and previous_plan.station_state:
+        recommendations = bike_recommender.update_recommendations(
+            previous_state_df=pd.DataFrame(previous_plan.station_state),
+            previous_moves=previous_plan.recommendations
+        )
+    else:
+        recommendations = bike_recommender.generate_recommendations()
+    station_state = bike_recommender.recommendation_state.to_dict(orient='records')
+    return recommendations, station_state, snapshot_harvest_time
+
+
+def refresh_bike_recommendations(harvest_time, incremental=False):
+    """
+    Computes the bike recommendations and stores them as the plan of the given bike availability snapshot,
+    replacing the plans of older snapshots. Nothing is stored if there is no bike availability snapshot. If the ETL
+    pipeline has written a newer snapshot since `harvest_time` was read, the plan is stored under the harvest time of
+    the snapshot it was actually computed from.
+    In incremental mode, the most recent older plan is updated instead of recomputed, as long as it is not
+    older than `_INCREMENTAL_MAX_AGE`.
+
+    :param harvest_time: The harvest time of the bike availability snapshot the plan is computed for.
+    :type harvest_time: datetime or None
+    :param incremental: Whether to update the previous plan instead of computing a new one from scratch.
+    :type incremental: bool
+
+    :returns: The recommendation plan, which is not saved to the database if harvest_time is None.
+    :rtype: BikeRecommendationPlan
+    """
+    previous_plan = None
+    if incremental and harvest_time is not None:
+        previous_plan = BikeRecommendationPlan.objects.filter(
+            harvest_time__lt=harvest_time,
+            harvest_time__gte=harvest_time - _INCREMENTAL_MAX_AGE
+        ).order_by('-harvest_time').first()
+
+    recommendations, station_state, snapshot_harvest_time = compute_bike_recommendations(previous_plan)
+    if snapshot_harvest_time is not None:
+        harvest_time = snapshot_harvest_time
+    if harvest_time is None:
+        return BikeRecommendationPlan(harvest_time=None, recommendations=recommendations, station_state=station_state)
+
+    plan, _ = BikeRecommendationPlan.objects.update_or_create(
+        harvest_time=harvest_time,
+        defaults={'recommendations': recommendations, 'station_state': station_state}
+    )
+    BikeRecommendationPlan.objects.filter(harvest_time__lt=harvest_time).delete()
+    return plan
+
+
+@csrf_exempt
+@require_GET
+def get_bike_recommendations(request):
+    """
+    A Django view function to fetch and respond with bike movement recommendations based on current bike availability, 
+    bike station distances, and forecasted bike usage. This function is exposed as an API endpoint that handles GET requests 
+    and returns JSON data containing the recommended movements of bikes to optimize their distribution across stations.
+
+    The recommendations are precomputed by the `refresh_bike_recommendations` management command once per bike availability 
+    snapshot. The stored plan of the latest snapshot is served if it exists, otherwise the recommendations are computed on 
+    demand and stored. Passing `?fresh=1` forces the recommendations to be recomputed.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+
+    :returns: A JsonResponse object containing the bike recommendations, the station names and the harvest time of the 
+              snapshot used for the recommendations in a JSON format with a 200 HTTP status.
+    :rtype: JsonResponse
+
+    This endpoint is useful for client-side applications that require real-time recommendations for bike redistributions 
+    to ensure optimal availability across a network of bike stations.
+    """
+    force_refresh = request.GET.get('fresh') == '1'
+    harvest_time = get_latest_harvest_time()
+
+    plan = None
+    if not force_refresh and harvest_time is not None:
+        plan = BikeRecommendationPlan.objects.filter(harvest_time=harvest_time).first()
+    if plan is None:
+        plan = refresh_bike_recommendations(harvest_time)
 
     # Get bike station names and ids from BikeStation model
     bike_stations = BikeStation.objects.values('id', 'name')
     bike_stations_dict = { station['id']: station['name'] for station in bike_stations }
 
-    return JsonResponse({ 'bike_recommendations': recommendations, 'bike_stations': bike_stations_dict }, status=200)
+    return JsonResponse({
+        'bike_recommendations': plan.recommendations,
+        'bike_stations': bike_stations_dict,
+        'harvest_time': plan.harvest_time
+    }, status=200)
+
+def get_bike_predictions_version(request):
+    """
+    Derives the version of the bike predictions from the current hour, since the requested hours are relative to it.
+
+    :param request: HttpRequest object representing the incoming request.
+    :type request: HttpRequest
+    :return: The start of the current hour, as the materialised forecasts.
+    :rtype: datetime
+    """
+    return get_forecast_hour(datetime.now())
 
 @csrf_exempt
 @require_POST
-# @cache_page(60 * 5)
+@cache_post_response(60 * 60, namespace=PREDICTIONS_CACHE_NAMESPACE, version_func=get_bike_predictions_version)
 def get_bike_predictions(request):
     """
     Handles POST requests to predict the availability of bikes at various stations after a specified number of hours.
-    The endpoint requires a JSON body with a `forecast_timedelta` indicating the number of hours into the future to predict.
-    This function loads pre-trained Prophet models for each station, uses them to predict bike availability, and returns the predictions.
-
-    :param request: The HTTP request object containing the forecast timedelta.
+    The endpoint requires a JSON body with a `forecast_timedelta` indicating the number of hours into the future to predict,
+    and accepts an optional `horizon` with the number of consecutive hours to return (1 by default).
+    Predictions are read from the bike forecasts table, which is materialised hourly by the `refresh_bike_forecasts`
+    management command. If the requested hours are not materialised, the pre-trained Prophet models are run on demand,
+    and requests for hours outside the horizon of the global model, when it is served, are rejected.
+    Clients accepting `application/vnd.apache.arrow.stream` receive the predictions as an Apache Arrow IPC stream.
+    Responses are cached per request body within the hour, until new forecasts are materialised.
+
+    :param request: The HTTP request object containing the forecast timedelta and the optional horizon.
     :type request: HttpRequest
 
-    :return: JsonResponse containing predictions for each bike station, formatted as:
+    :return: JsonResponse containing predictions for each bike station and requested hour, formatted as:
              {
                 'bike_predictions': [
                     {'id': int, 'name': str, 'latitude': float, 'longitude': float,
-                     'capacity': int, 'prediction': int}
+                     'capacity': int, 'timestamp': datetime, 'prediction': int}
                 ]
              }
+             or an error message with status 400 if the requested hours cannot be predicted.
     :rtype: JsonResponse
 
-    The function retrieves the forecast time from the request, loads forecasting models, and computes predictions for
-    each station using the specified forecast timestamp. The results include the station's ID, name, location, capacity,
-    and the predicted number of available bikes.
+    The function retrieves the forecast time from the request and fetches the forecasts of every station for the
+    requested hours, truncated to the start of the hour as the materialised forecasts. The results include the
+    station's ID, name, location, capacity, the predicted number of available bikes, and in `timestamp` the forecast
+    hour actually used rather than the exact requested time.
     """
     # Retrieve forecast time from request
     request_data = json.loads(request.body)
     forecast_timedelta = int(request_data.get('forecast_timedelta', 0))
-
-    # Load the forecasting model
-    prophet_models_file = 'bikes/analytics/bike_model.pkl'
-    prophet_models = load_prophet_models(prophet_models_file)
+    horizon = min(max(int(request_data.get('horizon', 1)), 1), FORECAST_HORIZON_HOURS)
+
+    forecast_start = get_forecast_hour(datetime.now() + timedelta(hours=forecast_timedelta))
+    forecast_timestamps = [forecast_start + timedelta(hours=i) for i in range(horizon)]
+
+    # Read the materialised forecasts of the requested hours with a single query
+    forecasts = list(BikeForecast.objects.filter(
+        ts__in=[make_aware(ts) for ts in forecast_timestamps]
+    ).values(
+        'ts', 'prediction', 'station_id', 'station__name', 'station__latitude', 'station__longitude', 'station__capacity'
+    ).order_by('ts', 'station_id'))
+
+    if len({forecast['ts'] for forecast in forecasts}) == horizon:
+        predictions = [{
+            'id': forecast['station_id'],
+            'name': forecast['station__name'],
+            'longitude': forecast['station__longitude'],
+            'latitude': forecast['station__latitude'],
+            'capacity': forecast['station__capacity'],
+            'timestamp': forecast['ts'],
+            'prediction': round(max(0, forecast['prediction']))
+        } for forecast in forecasts]
+        return tabular_response(request, predictions, json_data={ 'bike_predictions': predictions })
+
+    # Load the forecasting model, only the point forecasts are needed
+    prophet_models = load_bike_forecast_models(point_forecast=True)
 
     # Retrieve bike station id, name, latitude, and longitude
     bike_stations = BikeStation.objects.values('id', 'name', 'latitude', 'longitude', 'capacity')
 
     # Forecast the requested bike availability
     predictions = []
-    forecast_timestamp = datetime.now() + timedelta(hours=forecast_timedelta)
-    
     for station in bike_stations:
         station_id = station['id']
         station_model = prophet_models[station_id]
-        station_pred = station_model.predict(pd.DataFrame({ 'ds': [forecast_timestamp] }))
-        pred_value = round(max(0, station_pred.yhat.values[0]))
-        predictions.append({ 
-            'id': station_id,
-            'name': station['name'],
-            'longitude': station['longitude'],
-            'latitude': station['latitude'],
-            'capacity': station['capacity'],
-            'prediction': pred_value
-        })
-
-    return JsonResponse({ 'bike_predictions': predictions }, status=200)
\ No newline at end of file
+        try:
+            station_pred = station_model.predict(pd.DataFrame({ 'ds': forecast_timestamps }))
+        except ValueError as e:
+            return JsonResponse({ 'error': str(e) }, status=400)
+        for i, forecast_timestamp in enumerate(forecast_timestamps):
+            pred_value = round(max(0, station_pred.yhat.values[i]))
+            predictions.append({ 
+                'id': station_id,
+                'name': station['name'],
+                'longitude': station['longitude'],
+                'latitude': station['latitude'],
+                'capacity': station['capacity'],
+                'timestamp': make_aware(forecast_timestamp),
+                'prediction': pred_value
+            })
+
+    return tabular_response(request, predictions, json_data={ 'bike_predictions': predictions })
@@ -1,6 +1,7 @@
 from datetime import datetime
 import pandas as pd
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from unittest.mock import patch
 from .monitor import BusDelayMonitor
 from .timetables import TimetableOptimizer
@@ -88,6 +89,31 @@ class TestBusDelayMonitor(TestCase):
         self.monitor.delay_quartiles = np.array([])
         self.assertIsNone(self.monitor.classify_delays(10))
 
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bus-display'}})
+class TestBusDisplayData(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.body = {'start_time': '2024-01-01 06:00', 'end_time': '2024-01-01 10:00'}
+
+    @patch('buses.views.BusPositions')
+    @patch('buses.views.BusDelayMonitor.calculate_delays')
+    def test_bus_display_data_invalidated_by_new_batch(self, mock_calculate_delays, mock_positions):
+        # The bus tables are written by the ETL pipeline, so the latest position is mocked
+        mock_positions.objects.aggregate.return_value = {'latest_timestamp': datetime(2024, 1, 1, 9, 59)}
+        mock_calculate_delays.return_value = pd.DataFrame({'route_short_name': ['39A'], 'delay': [60.0]})
+
+        response = self.client.post('/api/bus/display', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept', response['Vary'])
+        response = self.client.post('/api/bus/display', self.body, content_type='application/json')
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(mock_calculate_delays.call_count, 1)
+
+        # The ETL pipeline writes a new batch, so the cached response is stale
+        mock_positions.objects.aggregate.return_value = {'latest_timestamp': datetime(2024, 1, 1, 10, 0)}
+        self.client.post('/api/bus/display', self.body, content_type='application/json')
+        self.assertEqual(mock_calculate_delays.call_count, 2)
+
 class TestTimetableOptimizer(TestCase):
     def setUp(self):
         self.first_bus = datetime(2024, 1, 1, 5, 0)
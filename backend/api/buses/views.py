@@ -1,23 +1,43 @@
 import json
 from datetime import datetime
 
+from django.db.models import Max
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from project.caching import cache_post_response
+from project.responses import tabular_response
+
+from .models import BusPositions
 from .monitor import BusDelayMonitor
 from .timetables import TimetableOptimizer
 
+def get_bus_data_version(request):
+    """
+    Derives the version of the bus data from the timestamp of the latest position written by the ETL pipeline,
+    which writes the trips and the positions of the buses together every minute.
+
+    :param request: HttpRequest object representing the incoming request.
+    :type request: HttpRequest
+    :return: The timestamp of the latest bus position, or None if no positions exist.
+    :rtype: datetime or None
+    """
+    return BusPositions.objects.aggregate(latest_timestamp=Max('timestamp'))['latest_timestamp']
+
 @csrf_exempt
 @require_POST
+@cache_post_response(60, version_func=get_bus_data_version)
 def get_bus_display_data(request):
     """
     Handles a POST request containing start and end times and returns bus delay data between these times.
+    Responses are cached for a minute per request body, and are invalidated as soon as the ETL pipeline writes
+    a new batch of bus data.
 
     :param request: HttpRequest object containing JSON with 'start_time' and 'end_time'.
     :type request: HttpRequest
-    :return: JsonResponse object with bus delays data.
-    :rtype: JsonResponse
+    :return: JsonResponse object with bus delays data, or an Apache Arrow IPC stream if the Accept header asks for it.
+    :rtype: HttpResponse
     """
     request_data = json.loads(request.body)
     start_time = request_data['start_time']
@@ -28,7 +48,7 @@ def get_bus_display_data(request):
     bus_monitor = BusDelayMonitor(start_time, end_time)
     delays_df = bus_monitor.calculate_delays()
 
-    return JsonResponse(delays_df.to_dict('records'), safe=False, status = 200)
+    return tabular_response(request, delays_df)
 
 @csrf_exempt
 @require_POST
@@ -1,25 +1,122 @@
-import pickle
+import threading
 import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from datetime import datetime
 
+from project.forecasting import CompactProphetEngine
+from project.registry import model_registry
+from project.shards import get_sharded_path
+
 _PREDICTIVE_MODEL_PATH = 'pedestrians/analytics/pedestrian_model.pkl'
 
+# Number of dates whose (streets x hours) prediction matrix is kept in memory
+_DAY_MATRIX_CACHE_SIZE = 32
+
+_day_matrices = OrderedDict()
+_day_matrices_lock = threading.Lock()
+
 class PedestrianPredictor():
 
     def __init__(self):
         """
         Initializes the instance by loading predictive models from a binary file.
         The models are stored in a predefined file path (`_PREDICTIVE_MODEL_PATH`), which is a class attribute.
-        These models are deserialized using pickle and stored in the instance variable `self.models` for later use.
+        These models are retrieved from the process-wide model registry, which deserializes the file only once,
+        and stored in the instance variable `self.models` for later use. Only `yhat` is used, so the point forecast
+        version of the models is retrieved, which skips the uncertainty sampling of Prophet. The sharded version of
+        the file is preferred when it exists.
 
         :param self: Reference to the current instance of the class.
         :type self: instance
         """
-        with open(_PREDICTIVE_MODEL_PATH, 'rb') as file:
-            self.models = pickle.load(file)
+        self.models = model_registry.get_point_forecaster(get_sharded_path(_PREDICTIVE_MODEL_PATH))
         
-    def predict_footfall(self, date, hour):
+    @staticmethod
+    def format_street_name(street_name):
+        """
+        Converts the key of a street model into the street name returned to the clients.
+
+        :param street_name: The key of the street model.
+        :type street_name: str
+
+        :returns: The formatted street name.
+        :rtype: str
+        """
+        # Remove the suffix '_model' and replace underscores with spaces to match the 'Street' names
+        return street_name.replace("_model", "").replace(" ", '_').replace('/','_')
+
+    def get_street_names(self):
+        """
+        Lists the formatted names of the streets with a model, in the order of the models.
+
+        :param self: Reference to the current instance of the class.
+        :type self: instance
+
+        :returns: The formatted street names.
+        :rtype: list of str
+        """
+        return [self.format_street_name(street_name) for street_name in self.models.keys()]
+
+    def predict_matrix(self, timestamps, streets=None):
+        """
+        Predicts the pedestrian footfall of every street for all the given timestamps, with a single pass per model.
+        When the models are stacked in a compact engine, all the streets are predicted at once.
+
+        :param self: Reference to the current instance of the class.
+        :type self: instance
+        :param timestamps: The timestamps to predict.
+        :type timestamps: list of datetime
+        :param streets: The formatted names of the streets to predict. All streets are predicted if None.
+        :type streets: list of str, optional
+
+        :returns: DataFrame with the formatted street names as index and the timestamps as columns. Ensures all
+                  footfall values are non-negative.
+        :rtype: pandas.DataFrame
+        """
+        timestamps = pd.to_datetime(pd.Series(timestamps))
+        street_names = [street_name for street_name in self.models.keys() if streets is None or self.format_street_name(street_name) in streets]
+        if isinstance(self.models, CompactProphetEngine):
+            indices = None if streets is None else [self.models.keys().index(street_name) for street_name in street_names]
+            values = self.models.predict(timestamps, indices=indices)
+        else:
+            future = pd.DataFrame({'ds': timestamps})
+            values = np.array([self.models[street_name].predict(future)['yhat'].values for street_name in street_names])
+        values = np.maximum(values.reshape(len(street_names), len(timestamps)), 0)
+        return pd.DataFrame(values, index=[self.format_street_name(name) for name in street_names], columns=timestamps.values)
+
+    def get_day_matrix(self, date):
+        """
+        Retrieves the footfall predictions of every street for the 24 hours of a date. The matrix is computed on first
+        use and kept in a process-wide cache, evicting the least recently used dates, so that requests for other hours
+        of the same date are served as slices of it. It is recomputed when the model registry reloads the models.
+
+        :param self: Reference to the current instance of the class.
+        :type self: instance
+        :param date: The date of the predictions, in 'YYYY-MM-DD' format.
+        :type date: str
+
+        :returns: DataFrame with the formatted street names as index and the hours 0 to 23 as columns.
+        :rtype: pandas.DataFrame
+        """
+        with _day_matrices_lock:
+            entry = _day_matrices.get(date)
+            if entry is not None and entry[0] is self.models:
+                _day_matrices.move_to_end(date)
+                return entry[1]
+
+        day = datetime.strptime(date, '%Y-%m-%d')
+        day_matrix = self.predict_matrix(pd.date_range(day, periods=24, freq='1H'))
+        day_matrix.columns = range(24)
+
+        with _day_matrices_lock:
+            _day_matrices[date] = (self.models, day_matrix)
+            _day_matrices.move_to_end(date)
+            while len(_day_matrices) > _DAY_MATRIX_CACHE_SIZE:
+                _day_matrices.popitem(last=False)
+        return day_matrix
+
+    def predict_footfall(self, date, hour, day_matrix=False):
         """
         Predicts pedestrian footfall for each street using preloaded models. This method processes each model corresponding to different streets,
         constructs a future date-time scenario, and then applies the model to predict footfall for that scenario.
@@ -30,21 +127,24 @@ class PedestrianPredictor():
         :type date: str
         :param hour: The hour for which footfall prediction is required, specified in 'HH:MM' format.
         :type hour: str
+        :param day_matrix: Whether to serve the prediction as a slice of the cached predictions of the whole day.
+                           Only applies to whole hours.
+        :type day_matrix: bool
 
         :returns: A dictionary with street names as keys and predicted footfall values as values. Ensures all footfall values are non-negative.
         :rtype: dict
         """
+        date_time_obj = datetime.strptime(f"{date} {hour}", '%Y-%m-%d %H:%M')
+        if day_matrix and date_time_obj.minute == 0:
+            return self.get_day_matrix(date)[date_time_obj.hour].to_dict()
+
+        # Constructing a DataFrame with the expected format, shared by all the street models
+        future = pd.DataFrame({'ds': [date_time_obj]})
+
         predictions = {}
         for street_name in self.models.keys():
+            formatted_street_name = self.format_street_name(street_name)
 
-            # Remove the suffix '_model' and replace underscores with spaces to match the 'Street' names
-            formatted_street_name = street_name.replace("_model", "").replace(" ", '_').replace('/','_')
-            
-            # Constructing a DataFrame with the expected format
-            date_time_str = f"{date} {hour}"
-            date_time_obj = datetime.strptime(date_time_str, '%Y-%m-%d %H:%M')
-            future = pd.DataFrame({'ds': [date_time_obj]})
-            
             # Use the model to make predictions
             forecast = self.models[street_name].predict(future)
             predicted_footfall = forecast['yhat'].iloc[0]
@@ -2,8 +2,10 @@ import json
 from django.test import TestCase, RequestFactory
 from unittest.mock import patch, MagicMock
 
-from pedestrians.views import get_pedestrian_predictions
+from pedestrians.views import get_pedestrian_predictions, get_pedestrian_range_predictions
 from pedestrians.predictions import PedestrianPredictor
+from pedestrians import predictions
+import pandas as pd
 
 
 
@@ -39,3 +41,81 @@ class TestPedestrianPredictor(TestCase):
         result = self.predictor.predict_footfall('2024-04-10', '14:00')
         self.assertEqual(result, {'main_street': 150, 'side_avenue': 0})
         self.predictor.predict_footfall.assert_called_once_with('2024-04-10', '14:00')
+
+
+class MockStreetModel:
+    def __init__(self, scale):
+        self.scale = scale
+        self.predict_calls = 0
+
+    def predict(self, df):
+        self.predict_calls += 1
+        return pd.DataFrame({'ds': df['ds'], 'yhat': (df['ds'].dt.hour - 2) * self.scale})
+
+
+class TestPedestrianDayMatrix(TestCase):
+    def setUp(self):
+        predictions._day_matrices.clear()
+        self.models = {'Main Street_model': MockStreetModel(10.0), 'Side/Avenue_model': MockStreetModel(1.0)}
+        with patch('pedestrians.predictions.model_registry') as mock_registry:
+            mock_registry.get_point_forecaster.return_value = self.models
+            self.predictor = PedestrianPredictor()
+
+    def test_day_matrix_slices(self):
+        result = self.predictor.predict_footfall('2024-04-10', '14:00', day_matrix=True)
+        self.assertEqual(result, {'Main_Street': 120.0, 'Side_Avenue': 12.0})
+        self.assertEqual(result, self.predictor.predict_footfall('2024-04-10', '14:00'))
+
+        # The other hours of the day are served from the cached matrix, and negative predictions are clipped
+        self.assertEqual(self.predictor.predict_footfall('2024-04-10', '01:00', day_matrix=True), {'Main_Street': 0.0, 'Side_Avenue': 0.0})
+        self.assertEqual(self.models['Main Street_model'].predict_calls, 2)
+
+    def test_day_matrix_lru_eviction(self):
+        with patch('pedestrians.predictions._DAY_MATRIX_CACHE_SIZE', 2):
+            for date in ['2024-04-10', '2024-04-11', '2024-04-10', '2024-04-12']:
+                self.predictor.get_day_matrix(date)
+        self.assertEqual(list(predictions._day_matrices), ['2024-04-10', '2024-04-12'])
+        self.assertEqual(self.models['Main Street_model'].predict_calls, 3)
+
+
+class PedestrianRangeTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.models = {'Main Street_model': MockStreetModel(10.0), 'Side/Avenue_model': MockStreetModel(1.0)}
+
+    def request_range(self, params):
+        with patch('pedestrians.predictions.model_registry') as mock_registry:
+            mock_registry.get_point_forecaster.return_value = self.models
+            return get_pedestrian_range_predictions(self.factory.get('/api/pedestrian/predictions/range', params))
+
+    def test_range_predictions(self):
+        response = self.request_range({'start': '2024-04-10T00:00', 'end': '2024-04-16T23:00'})
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['streets'], ['Main_Street', 'Side_Avenue'])
+        self.assertEqual(len(data['timestamps']), 168)
+        self.assertEqual(data['footfall'][0][14], 120.0)
+        self.assertEqual(self.models['Main Street_model'].predict_calls, 1)
+
+    def test_range_street_subset(self):
+        response = self.request_range({'start': '2024-04-10T12:00', 'end': '2024-04-10T14:00', 'street': 'Side_Avenue'})
+        data = json.loads(response.content)
+
+        self.assertEqual(data['streets'], ['Side_Avenue'])
+        self.assertEqual(data['footfall'], [[10.0, 11.0, 12.0]])
+        self.assertEqual(self.models['Main Street_model'].predict_calls, 0)
+
+    def test_range_invalid(self):
+        self.assertEqual(self.request_range({'start': '2024-04-10T00:00'}).status_code, 400)
+        self.assertEqual(self.request_range({'start': '2024-04-10T00:00', 'end': '2024-06-10T00:00'}).status_code, 400)
+
+    def test_range_timezone_aware(self):
+        response = self.request_range({'start': '2024-04-10T00:00+01:00', 'end': '2024-04-10T23:00+01:00'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_range_unknown_streets(self):
+        response = self.request_range({'start': '2024-04-10T12:00', 'end': '2024-04-10T14:00', 'street': ['Side_Avenue', 'Elm_Road']})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['unknown_streets'], ['Elm_Road'])
+        self.assertEqual(self.models['Side/Avenue_model'].predict_calls, 0)
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import get_pedestrian_predictions
+from .views import get_pedestrian_predictions, get_pedestrian_range_predictions
 
 urlpatterns = [
     path('api/pedestrian/predictions', get_pedestrian_predictions),
+    path('api/pedestrian/predictions/range', get_pedestrian_range_predictions),
 ]
\ No newline at end of file
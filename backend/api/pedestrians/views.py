@@ -1,18 +1,25 @@
 import json
+import pandas as pd
+from datetime import datetime
 from .predictions import PedestrianPredictor
 
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.cache import cache_page
+from project.caching import cache_post_response
+from project.responses import tabular_response
+
+# Maximum number of hourly timestamps predicted by a range request
+_RANGE_MAX_HOURS = 24 * 31
 
 @require_POST
 @csrf_exempt
-@cache_page(60 * 5)
+@cache_post_response(60 * 5)
 def get_pedestrian_predictions(request):
     """
     Handles a POST request containing target date and hour, predicts pedestrian footfall for each street,
-    and returns the predictions as a JSON response.
+    and returns the predictions as a JSON response. The predictions of all the hours of the date are computed
+    together and cached, so that requests for the other hours of the same date are served from memory.
 
     :param request: HttpRequest object containing JSON data with 'date' and 'hour'.
     :type request: HttpRequest
@@ -24,7 +31,60 @@ def get_pedestrian_predictions(request):
     target_hour = request_data.get('hour')
 
     predictor = PedestrianPredictor()
-    predictions = predictor.predict_footfall(target_date, target_hour)
+    predictions = predictor.predict_footfall(target_date, target_hour, day_matrix=True)
 
     return JsonResponse({ 'pedestrian_predictions': predictions }, status=200)
-    
+
+
+@require_GET
+def get_pedestrian_range_predictions(request):
+    """
+    Handles GET requests for the hourly pedestrian footfall predictions of a range of dates, predicting every street
+    for the whole range with a single call per model. The query parameters are:
+    - `start` and `end`: the first and last hour of the range in ISO format (required), at most 31 days apart. They
+      are local times without a UTC offset, as the counts the models were trained on.
+    - `street`: the name of a street, repeated for several streets. Defaults to all the streets. Unknown street names
+      are rejected, with the list of them in the error response.
+    Clients accepting `application/vnd.apache.arrow.stream` receive an Apache Arrow IPC stream instead, with one row per
+    street and timestamp.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+
+    :return: JsonResponse containing the predictions as a (street x timestamp) matrix, formatted as:
+             {
+                'streets': [str],
+                'timestamps': [datetime],
+                'footfall': [[float]]
+             }
+             or an error message with status 400 if the parameters are invalid, with the `unknown_streets` list if
+             some of the streets have no model.
+    :rtype: JsonResponse
+    """
+    try:
+        start_time = datetime.fromisoformat(request.GET['start'])
+        end_time = datetime.fromisoformat(request.GET['end'])
+    except (KeyError, ValueError) as e:
+        return JsonResponse({ 'error': f'Invalid start or end: {e}' }, status=400)
+    if start_time.tzinfo is not None or end_time.tzinfo is not None:
+        return JsonResponse({ 'error': 'The start and end must be local times without a UTC offset.' }, status=400)
+
+    timestamps = pd.date_range(start_time, end_time, freq='1H')
+    if len(timestamps) == 0 or len(timestamps) > _RANGE_MAX_HOURS:
+        return JsonResponse({ 'error': f'The range must contain between 1 and {_RANGE_MAX_HOURS} hours.' }, status=400)
+
+    streets = request.GET.getlist('street') or None
+    predictor = PedestrianPredictor()
+    if streets is not None:
+        unknown_streets = sorted(set(streets) - set(predictor.get_street_names()))
+        if unknown_streets:
+            return JsonResponse({ 'error': 'Unknown streets.', 'unknown_streets': unknown_streets }, status=400)
+    footfall = predictor.predict_matrix(timestamps, streets=streets)
+
+    # The Arrow stream holds one row per street and timestamp
+    rows = footfall.rename_axis(index='street', columns='timestamp').stack().rename('footfall').reset_index()
+    return tabular_response(request, rows, json_data={
+        'streets': footfall.index.tolist(),
+        'timestamps': timestamps.tolist(),
+        'footfall': footfall.values.tolist()
+    })
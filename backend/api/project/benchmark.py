@@ -0,0 +1,134 @@
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+from .forecasting import CompactProphetEngine, PointForecastModel
+
+class PointForecastBenchmark:
+
+    def __init__(self, models, n_models=None, horizon_hours=48, start_time=None, seed=0):
+        """
+        Initializes a benchmark comparing the latency and accuracy of the Prophet forecasts with uncertainty
+        sampling against the point forecast modes, which skip the sampling and use the analytic interval.
+
+        :param models: A dictionary of fitted Prophet models.
+        :type models: dict
+        :param n_models: The number of models sampled for the benchmark. All models are used if None.
+        :type n_models: int, optional
+        :param horizon_hours: The number of hourly timestamps predicted by each model.
+        :type horizon_hours: int
+        :param start_time: The first timestamp to predict. Defaults to the current hour.
+        :type start_time: datetime, optional
+        :param seed: Seed used to sample the models.
+        :type seed: int
+        """
+        self.models = models
+        self.n_models = n_models
+        self.horizon_hours = horizon_hours
+        self.start_time = datetime.now().replace(minute=0, second=0, microsecond=0) if start_time is None else start_time
+        self.seed = seed
+
+    def sample_keys(self):
+        """
+        Samples the keys of the benchmarked models.
+
+        :returns: The sampled keys.
+        :rtype: list
+        """
+        keys = list(self.models.keys())
+        if self.n_models is None or self.n_models >= len(keys):
+            return keys
+        rng = np.random.default_rng(self.seed)
+        return [keys[i] for i in sorted(rng.choice(len(keys), self.n_models, replace=False))]
+
+    def get_timestamps(self):
+        """
+        Creates the hourly timestamps to predict.
+
+        :returns: DataFrame with a 'ds' column containing the timestamps to predict.
+        :rtype: pandas.DataFrame
+        """
+        return pd.DataFrame({ 'ds': [self.start_time + timedelta(hours=i) for i in range(self.horizon_hours)] })
+
+    @staticmethod
+    def time_forecasts(models, keys, future):
+        """
+        Predicts the timestamps with every model, one call per model as the endpoints do.
+
+        :param models: A dictionary of forecast models.
+        :type models: dict
+        :param keys: The keys of the models to run.
+        :type keys: list
+        :param future: DataFrame with a 'ds' column containing the timestamps to predict.
+        :type future: pandas.DataFrame
+
+        :returns: A tuple with the elapsed seconds and the stacked yhat, yhat_lower and yhat_upper arrays.
+        :rtype: tuple
+        """
+        start = time.perf_counter()
+        forecasts = [models[key].predict(future) for key in keys]
+        seconds = time.perf_counter() - start
+        return seconds, tuple(np.array([forecast[column].values for forecast in forecasts]) for column in ('yhat', 'yhat_lower', 'yhat_upper'))
+
+    @staticmethod
+    def compare(reference, forecast):
+        """
+        Measures the accuracy of a forecast against the reference forecast with uncertainty sampling.
+
+        :param reference: The yhat, yhat_lower and yhat_upper arrays of the reference forecast.
+        :type reference: tuple of numpy.ndarray
+        :param forecast: The yhat, yhat_lower and yhat_upper arrays of the compared forecast.
+        :type forecast: tuple of numpy.ndarray
+
+        :returns: A dictionary with the maximum absolute error of yhat, the mean relative error of the interval
+                  width, and the mean absolute error of the interval bounds.
+        :rtype: dict
+        """
+        reference_width = reference[2] - reference[1]
+        width = forecast[2] - forecast[1]
+        return {
+            'max_abs_yhat_error': float(np.max(np.abs(forecast[0] - reference[0]))),
+            'mean_rel_width_error': float(np.mean(np.abs(width - reference_width)) / np.mean(reference_width)),
+            'mean_abs_bound_error': float(np.mean(np.abs(forecast[1:] - np.array(reference[1:]))))
+        }
+
+    def run(self):
+        """
+        Runs the models with uncertainty sampling, wrapped in the point forecast mode, and stacked in the compact
+        engine if they are supported by it, and reports the latency and accuracy of every mode side by side.
+
+        :returns: A dictionary with the benchmark settings, a result per mode and the reason every skipped mode was
+                  not run.
+        :rtype: dict
+        """
+        keys = self.sample_keys()
+        future = self.get_timestamps()
+
+        sampled_seconds, reference = self.time_forecasts(self.models, keys, future)
+        modes = { 'sampled': { 'seconds': sampled_seconds } }
+        skipped_modes = {}
+
+        point_models = {key: PointForecastModel(self.models[key]) for key in keys}
+        point_seconds, point_forecast = self.time_forecasts(point_models, keys, future)
+        modes['point'] = { 'seconds': point_seconds, **self.compare(reference, point_forecast) }
+
+        try:
+            engine = CompactProphetEngine.from_models({key: self.models[key] for key in keys})
+        except ValueError as e:
+            skipped_modes['engine'] = str(e)
+        else:
+            start = time.perf_counter()
+            engine_forecast = engine.predict_interval(future['ds'])
+            modes['engine'] = { 'seconds': time.perf_counter() - start, **self.compare(reference, engine_forecast) }
+
+        for result in modes.values():
+            result['speedup'] = sampled_seconds / result['seconds']
+
+        return {
+            'run_time': datetime.now().isoformat(timespec='seconds'),
+            'n_models': len(keys),
+            'horizon_hours': self.horizon_hours,
+            'modes': modes,
+            'skipped_modes': skipped_modes
+        }
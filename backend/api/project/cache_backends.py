@@ -0,0 +1,204 @@
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+_GENERATION_KEY = 'two_level_cache:generation'
+
+class TwoLevelCache(BaseCache):
+
+    def __init__(self, location, params):
+        """
+        Initializes a two-level cache backend: a bounded least recently used cache in the memory of the process, with a
+        short timeout, in front of a shared cache backend such as Redis. Reads are served from memory when possible and
+        fall back to the shared cache, and writes go to both.
+
+        The local caches of all the processes are invalidated together through a generation counter stored in the
+        shared cache, which each process checks at most every GENERATION_CHECK_INTERVAL seconds. Incrementing it with
+        `invalidate_local` broadcasts the invalidation, e.g. when a new ingest batch lands.
+
+        The OPTIONS of the backend are:
+        - SHARED_CACHE: the alias of the shared cache. Defaults to the location of the backend, or 'shared'.
+        - LOCAL_MAX_ENTRIES: the maximum number of entries kept in memory, 1000 by default.
+        - LOCAL_TIMEOUT: the maximum number of seconds an entry is kept in memory, 5 by default.
+        - GENERATION_CHECK_INTERVAL: the number of seconds between checks of the generation, 1 by default.
+
+        :param location: The alias of the shared cache, if not given in the options.
+        :type location: str
+        :param params: The parameters of the backend in the CACHES setting.
+        :type params: dict
+        """
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED_CACHE', location or 'shared')
+        self.local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.generation_check_interval = options.get('GENERATION_CHECK_INTERVAL', 1)
+
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked = 0
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def check_generation(self):
+        """
+        Clears the local cache if the generation in the shared cache has changed since the last check. The shared
+        cache is only read once per check interval.
+        """
+        now = time.monotonic()
+        if now - self._generation_checked < self.generation_check_interval:
+            return
+        generation = self.shared.get(_GENERATION_KEY, 0)
+        with self._lock:
+            if self._generation is not None and generation != self._generation:
+                self._local.clear()
+            self._generation = generation
+            self._generation_checked = now
+
+    def invalidate_local(self):
+        """
+        Invalidates the local caches of every process by incrementing the generation in the shared cache. The entries
+        of the shared cache are kept.
+        """
+        try:
+            self.shared.incr(_GENERATION_KEY)
+        except ValueError:
+            self.shared.set(_GENERATION_KEY, 1, None)
+        with self._lock:
+            self._local.clear()
+            self._generation_checked = 0
+
+    def get_local_expiry(self, timeout):
+        """
+        Calculates when an entry expires from the local cache, which is never later than its shared timeout.
+
+        :param timeout: The timeout of the entry in the shared cache, in seconds.
+        :type timeout: float or None
+
+        :returns: The expiry time on the monotonic clock.
+        :rtype: float
+        """
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        local_timeout = self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+        return time.monotonic() + local_timeout
+
+    def set_local(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """
+        Stores an entry in the local cache, evicting the least recently used entries beyond the maximum size. Values
+        are pickled, so that callers modifying the returned objects do not alter the cached entries.
+        """
+        expiry = self.get_local_expiry(timeout)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[key] = (expiry, pickled)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def get_local(self, key):
+        """
+        Retrieves an entry of the local cache.
+
+        :returns: A tuple of a boolean indicating if the entry was found and its value.
+        :rtype: tuple
+        """
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self._local[key]
+                return False, None
+            self._local.move_to_end(key)
+        return True, pickle.loads(entry[1])
+
+    def delete_local(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        added = self.shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            self.set_local(local_key, value, timeout)
+        return added
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.check_generation()
+        found, value = self.get_local(local_key)
+        if found:
+            return value
+
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        self.set_local(local_key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self.set_local(local_key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.delete_local(self.make_and_validate_key(key, version=version))
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.delete_local(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.delete_local(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.check_generation()
+        return self.get_local(local_key)[0] or self.shared.has_key(key, version=version)
+
+    def get_many(self, keys, version=None):
+        self.check_generation()
+        values = {}
+        missing = []
+        for key in keys:
+            found, value = self.get_local(self.make_and_validate_key(key, version=version))
+            if found:
+                values[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            shared_values = self.shared.get_many(missing, version=version)
+            for key, value in shared_values.items():
+                self.set_local(self.make_and_validate_key(key, version=version), value)
+            values.update(shared_values)
+        return values
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed_keys = self.shared.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key not in failed_keys:
+                self.set_local(self.make_and_validate_key(key, version=version), value, timeout)
+        return failed_keys
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete_local(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,143 @@
+import json
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+def get_namespace_generation(namespace):
+    """
+    Retrieves the generation of a namespace of cached POST responses. The generation is part of the cache keys, so
+    incrementing it invalidates every response cached in the namespace.
+
+    :param namespace: The namespace of the cached responses.
+    :type namespace: str
+
+    :returns: The current generation of the namespace.
+    :rtype: int
+    """
+    return cache.get_or_set(f"post_response_generation:{namespace}", 0, None) or 0
+
+def invalidate_post_responses(namespace):
+    """
+    Invalidates every response cached in a namespace. It is meant to be called by the jobs that write new data, e.g.
+    after a new batch of forecasts is materialised.
+
+    :param namespace: The namespace of the cached responses.
+    :type namespace: str
+    """
+    key = f"post_response_generation:{namespace}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+    invalidate_local_caches()
+
+def invalidate_local_caches():
+    """
+    Invalidates the in-process caches of every process when the cache backend is a two-level cache, so that the new
+    data is served as soon as a new batch lands rather than after the local timeout. Other backends are left as they are.
+    """
+    invalidate_local = getattr(cache, 'invalidate_local', None)
+    if invalidate_local is not None:
+        invalidate_local()
+
+def is_cache_process_local():
+    """
+    Checks whether the cache lives in the memory of the process, so that the data written by a background job in
+    another process is never seen by the web processes. The shared cache of a two-level cache is the one checked.
+
+    :returns: True if the cache, or its shared cache, is not shared between processes.
+    :rtype: bool
+    """
+    default_cache = caches['default']
+    shared_cache = getattr(default_cache, 'shared', default_cache)
+    return isinstance(shared_cache, (LocMemCache, DummyCache))
+
+def normalise_request_body(body):
+    """
+    Normalises a JSON request body, so that bodies with the same content share a cache key regardless of the
+    order of the keys and the whitespace.
+
+    :param body: The raw request body.
+    :type body: bytes
+
+    :returns: The normalised body, or None if the body is not valid JSON.
+    :rtype: str or None
+    """
+    try:
+        return json.dumps(json.loads(body or b'{}'), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        return None
+
+def get_post_response_key(request, namespace, version):
+    """
+    Builds the cache key of a POST response from the hash of the normalised body, the Accept header, since the
+    format of the response is negotiated, and the version of the underlying data.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param namespace: The namespace of the cached responses.
+    :type namespace: str
+    :param version: The version of the data the response depends on.
+    :type version: object
+
+    :returns: The cache key, or None if the request cannot be cached.
+    :rtype: str or None
+    """
+    body = normalise_request_body(request.body)
+    if body is None:
+        return None
+    digest = hashlib.sha256('\n'.join([body, request.headers.get('Accept', ''), str(version)]).encode()).hexdigest()
+    return f"post_response:{namespace}:{get_namespace_generation(namespace)}:{digest}"
+
+def cache_post_response(timeout, namespace=None, version_func=None):
+    """
+    Decorator caching the responses of a POST view in the configured cache backend, keyed by the normalised JSON body
+    of the request. Only successful responses are cached. Unlike `cache_page`, which never caches POST requests, it
+    suits the analytics endpoints that receive their parameters in the body.
+
+    The cached responses are invalidated when the value returned by `version_func` changes, e.g. when the ETL pipeline
+    writes a new batch, or when `invalidate_post_responses` is called with the namespace.
+
+    :param timeout: The number of seconds the responses are cached.
+    :type timeout: int
+    :param namespace: The namespace of the cached responses. Defaults to the name of the view.
+    :type namespace: str, optional
+    :param version_func: A function of the request returning the version of the data the response depends on.
+    :type version_func: callable, optional
+
+    :returns: The decorator.
+    :rtype: callable
+    """
+    def decorator(view_func):
+        view_namespace = namespace or view_func.__name__
+
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            if request.method != 'POST':
+                return view_func(request, *args, **kwargs)
+
+            version = version_func(request) if version_func is not None else None
+            key = get_post_response_key(request, view_namespace, version)
+            cached = cache.get(key) if key is not None else None
+            if cached is not None:
+                response = HttpResponse(cached['content'], content_type=cached['content_type'], status=cached['status'])
+                patch_vary_headers(response, ['Accept'])
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if key is not None and response.status_code == 200 and not response.streaming:
+                cache.set(key, {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'status': response.status_code
+                }, timeout)
+            patch_vary_headers(response, ['Accept'])
+            return response
+
+        return wrapped_view
+    return decorator
@@ -0,0 +1,452 @@
+import copy
+import json
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+
+def get_uncertainty_parameters(model):
+    """
+    Extracts the parameters of the analytic uncertainty interval of a fitted Prophet model. Prophet estimates its
+    interval by simulating future changepoints, whose number follows a Poisson process with the rate of the
+    changepoints in the history and whose rate changes follow a Laplace distribution with the mean absolute
+    rate change of the fit, and by adding observation noise. The variance of the simulated trend at a distance h
+    past the history is 2 * mean_delta^2 * rate * h^3 / 3 in the scaled units, so the interval can be computed in
+    closed form instead of sampled.
+
+    :param model: A fitted Prophet model.
+    :type model: prophet.Prophet
+
+    :returns: A dictionary with the noise level (sigma_obs), the trend variance rate and the z-score of the
+              interval width of the model.
+    :rtype: dict
+    """
+    deltas = np.nanmean(model.params['delta'], axis=0)
+    n_changepoints = len(model.changepoints_t) if model.changepoints_t is not None else 0
+    trend_variance_rate = 0.0
+    if model.growth != 'flat' and n_changepoints > 0:
+        mean_delta = np.mean(np.abs(deltas)) + 1e-8
+        trend_variance_rate = 2 * mean_delta ** 2 * n_changepoints / 3
+    return {
+        'sigma_obs': float(np.nanmean(model.params['sigma_obs'])),
+        'trend_variance_rate': trend_variance_rate,
+        'interval_z': NormalDist().inv_cdf((1 + model.interval_width) / 2)
+    }
+
+
+def calculate_interval_half_width(t, y_scale, sigma_obs, trend_variance_rate, interval_z):
+    """
+    Calculates the half width of the analytic uncertainty interval. The arguments are broadcast together, so the
+    interval of many models can be calculated at once.
+
+    :param t: The scaled time of the timestamps, 1 at the end of the history.
+    :type t: numpy.ndarray
+    :param y_scale: The scale of the series.
+    :type y_scale: numpy.ndarray or float
+    :param sigma_obs: The scaled noise level.
+    :type sigma_obs: numpy.ndarray or float
+    :param trend_variance_rate: The rate at which the scaled trend variance grows with the cube of the horizon.
+    :type trend_variance_rate: numpy.ndarray or float
+    :param interval_z: The z-score of the interval width.
+    :type interval_z: numpy.ndarray or float
+
+    :returns: The half width of the interval around yhat.
+    :rtype: numpy.ndarray
+    """
+    horizon = np.maximum(t - 1, 0)
+    return interval_z * y_scale * np.sqrt(sigma_obs ** 2 + trend_variance_rate * horizon ** 3)
+
+
+def to_native_key(key):
+    """
+    Converts a model key into a native Python value, so that it can be serialized to JSON. The keys of the pickled
+    models are NumPy integers when they come from `unique()`, e.g. the station IDs in the training notebooks.
+
+    :param key: The key of a model.
+    :type key: object
+
+    :returns: The key as a native Python value.
+    :rtype: object
+    """
+    return key.item() if isinstance(key, np.generic) else key
+
+
+class PointForecastModel:
+
+    def __init__(self, model):
+        """
+        Initializes a wrapper of a fitted Prophet model that predicts without simulating the uncertainty interval,
+        and replaces the simulated interval with the analytic one. The wrapped model is a shallow copy, so the
+        model shared through the model registry is not modified.
+
+        :param model: A fitted Prophet model.
+        :type model: prophet.Prophet
+        """
+        self.model = copy.copy(model)
+        self.model.uncertainty_samples = 0
+        self.uncertainty = get_uncertainty_parameters(model)
+
+    def predict(self, future):
+        """
+        Predicts the series for the requested timestamps.
+
+        :param future: DataFrame with a 'ds' column containing the timestamps to predict.
+        :type future: pandas.DataFrame
+
+        :returns: The Prophet forecast, with the analytic yhat_lower and yhat_upper.
+        :rtype: pandas.DataFrame
+        """
+        forecast = self.model.predict(future)
+        t = ((forecast['ds'] - self.model.start) / self.model.t_scale).values
+        half_width = calculate_interval_half_width(t, self.model.y_scale, **self.uncertainty)
+        forecast['yhat_lower'] = forecast['yhat'] - half_width
+        forecast['yhat_upper'] = forecast['yhat'] + half_width
+        return forecast
+
+class CompactForecastModel:
+
+    def __init__(self, engine, index):
+        """
+        Initializes a view of a single series of a compact forecast engine, exposing the `predict` interface
+        of a Prophet model so that it can replace one in the existing code.
+
+        :param engine: The engine holding the parameters of the series.
+        :type engine: CompactProphetEngine
+        :param index: The position of the series in the engine.
+        :type index: int
+        """
+        self.engine = engine
+        self.index = index
+
+    def predict(self, future):
+        """
+        Predicts the series for the requested timestamps.
+
+        :param future: DataFrame with a 'ds' column containing the timestamps to predict.
+        :type future: pandas.DataFrame
+
+        :returns: DataFrame with columns ds, yhat, yhat_lower and yhat_upper, the latter with the analytic interval.
+        :rtype: pandas.DataFrame
+        """
+        yhat, yhat_lower, yhat_upper = self.engine.predict_interval(future['ds'], indices=[self.index])
+        return pd.DataFrame({
+            'ds': pd.to_datetime(future['ds']).values,
+            'yhat': yhat[0],
+            'yhat_lower': yhat_lower[0],
+            'yhat_upper': yhat_upper[0]
+        })
+
+
+class CompactProphetEngine:
+
+    def __init__(self, keys, arrays, seasonalities):
+        """
+        Initializes a forecast engine that evaluates the point forecasts of many fitted Prophet models at once,
+        from their parameters stacked into NumPy arrays.
+
+        :param keys: The keys of the series, in the order of the rows of the arrays (e.g. station IDs).
+        :type keys: list
+        :param arrays: Dictionary with the stacked parameters: start and t_scale (in nanoseconds), y_scale, floor,
+                       k, m, flat, changepoints_t, deltas, beta_additive, beta_multiplicative, and the parameters
+                       of the analytic interval sigma_obs, trend_variance_rate and interval_z.
+        :type arrays: dict of numpy.ndarray
+        :param seasonalities: The (period, fourier_order) of the blocks of the seasonal coefficient matrices.
+        :type seasonalities: list of tuple
+        """
+        self.keys_list = list(keys)
+        self.arrays = arrays
+        self.seasonalities = [(float(period), int(order)) for period, order in seasonalities]
+        self._key_index = {key: i for i, key in enumerate(self.keys_list)}
+
+    @staticmethod
+    def extract_parameters(model):
+        """
+        Extracts the trend and seasonality parameters of a fitted Prophet model.
+
+        :param model: A fitted Prophet model with linear or flat growth and without holidays, extra regressors
+                      or conditional seasonalities.
+        :type model: prophet.Prophet
+
+        :returns: A dictionary with the trend parameters and the coefficients of each seasonality.
+        :rtype: dict
+
+        :raises ValueError: If the model uses features that the engine does not support.
+        """
+        if model.growth not in ('linear', 'flat'):
+            raise ValueError(f"Unsupported growth '{model.growth}'.")
+        if model.holidays is not None or getattr(model, 'country_holidays', None) is not None or model.extra_regressors:
+            raise ValueError("Holidays and extra regressors are not supported.")
+
+        beta = np.nanmean(model.params['beta'], axis=0)
+        seasonalities = []
+        column = 0
+        for name, props in model.seasonalities.items():
+            if props['condition_name'] is not None:
+                raise ValueError(f"Conditional seasonality '{name}' is not supported.")
+            width = 2 * props['fourier_order']
+            seasonalities.append({
+                'period': props['period'],
+                'fourier_order': props['fourier_order'],
+                'mode': props['mode'],
+                'beta': beta[column:column + width]
+            })
+            column += width
+
+        scaling = getattr(model, 'scaling', 'absmax')
+        return {
+            'start': pd.Timestamp(model.start).value,
+            't_scale': pd.Timedelta(model.t_scale).value,
+            'y_scale': model.y_scale,
+            'floor': model.y_min if scaling == 'minmax' else 0.0,
+            'k': np.nanmean(model.params['k']),
+            'm': np.nanmean(model.params['m']),
+            'flat': model.growth == 'flat',
+            'changepoints_t': np.asarray(model.changepoints_t, dtype=float),
+            'deltas': np.nanmean(model.params['delta'], axis=0),
+            'seasonalities': seasonalities,
+            **get_uncertainty_parameters(model)
+        }
+
+    @classmethod
+    def from_models(cls, models):
+        """
+        Builds an engine from fitted Prophet models, stacking their parameters. Changepoints are padded with
+        zero rate changes, and the seasonal coefficients are laid out over the union of the seasonalities of
+        all the models, with zeros for the seasonalities a model does not have.
+
+        :param models: A dictionary of fitted Prophet models.
+        :type models: dict
+
+        :returns: The compact forecast engine.
+        :rtype: CompactProphetEngine
+        """
+        keys = list(models.keys())
+        parameters = [cls.extract_parameters(models[key]) for key in keys]
+
+        seasonalities = []
+        for params in parameters:
+            for seasonality in params['seasonalities']:
+                block = (float(seasonality['period']), int(seasonality['fourier_order']))
+                if block not in seasonalities:
+                    seasonalities.append(block)
+        offsets = np.cumsum([0] + [2 * order for _, order in seasonalities])
+
+        n_changepoints = max([len(params['changepoints_t']) for params in parameters] + [0])
+        changepoints_t = np.zeros((len(keys), n_changepoints))
+        deltas = np.zeros((len(keys), n_changepoints))
+        beta_additive = np.zeros((len(keys), offsets[-1]))
+        beta_multiplicative = np.zeros((len(keys), offsets[-1]))
+        for i, params in enumerate(parameters):
+            changepoints_t[i, :len(params['changepoints_t'])] = params['changepoints_t']
+            deltas[i, :len(params['deltas'])] = params['deltas']
+            for seasonality in params['seasonalities']:
+                block = seasonalities.index((float(seasonality['period']), int(seasonality['fourier_order'])))
+                beta = beta_multiplicative if seasonality['mode'] == 'multiplicative' else beta_additive
+                beta[i, offsets[block]:offsets[block + 1]] = seasonality['beta']
+
+        arrays = {
+            'start': np.array([params['start'] for params in parameters], dtype=np.int64),
+            't_scale': np.array([params['t_scale'] for params in parameters], dtype=float),
+            'y_scale': np.array([params['y_scale'] for params in parameters], dtype=float),
+            'floor': np.array([params['floor'] for params in parameters], dtype=float),
+            'k': np.array([params['k'] for params in parameters], dtype=float),
+            'm': np.array([params['m'] for params in parameters], dtype=float),
+            'flat': np.array([params['flat'] for params in parameters], dtype=bool),
+            'changepoints_t': changepoints_t,
+            'deltas': deltas,
+            'beta_additive': beta_additive,
+            'beta_multiplicative': beta_multiplicative,
+            'sigma_obs': np.array([params['sigma_obs'] for params in parameters], dtype=float),
+            'trend_variance_rate': np.array([params['trend_variance_rate'] for params in parameters], dtype=float),
+            'interval_z': np.array([params['interval_z'] for params in parameters], dtype=float)
+        }
+        return cls(keys, arrays, seasonalities)
+
+    def make_seasonality_features(self, timestamps_ns):
+        """
+        Builds the Fourier features of every seasonality block for the given timestamps, in the same way as Prophet.
+
+        :param timestamps_ns: The timestamps, in nanoseconds since the epoch.
+        :type timestamps_ns: numpy.ndarray
+
+        :returns: The feature matrix of shape (timestamps, features).
+        :rtype: numpy.ndarray
+        """
+        days = (timestamps_ns // 10 ** 9) / (3600 * 24.)
+        features = []
+        for period, order in self.seasonalities:
+            angles = 2 * np.pi * days[:, None] * np.arange(1, order + 1)[None, :] / period
+            block = np.empty((len(days), 2 * order))
+            block[:, 0::2] = np.sin(angles)
+            block[:, 1::2] = np.cos(angles)
+            features.append(block)
+        return np.hstack(features) if features else np.zeros((len(days), 0))
+
+    def get_arrays(self, indices=None):
+        """
+        Retrieves the stacked parameters of the requested series.
+
+        :param indices: Positions of the series. All series are returned if None.
+        :type indices: list of int, optional
+
+        :returns: Dictionary with the stacked parameters.
+        :rtype: dict of numpy.ndarray
+        """
+        return self.arrays if indices is None else {name: values[indices] for name, values in self.arrays.items()}
+
+    @staticmethod
+    def get_scaled_time(timestamps_ns, arrays):
+        """
+        Scales the timestamps to the time of each series, 0 at the start and 1 at the end of its history.
+
+        :param timestamps_ns: The timestamps, in nanoseconds since the epoch.
+        :type timestamps_ns: numpy.ndarray
+        :param arrays: Dictionary with the stacked parameters.
+        :type arrays: dict of numpy.ndarray
+
+        :returns: The scaled time, with shape (series, timestamps).
+        :rtype: numpy.ndarray
+        """
+        return (timestamps_ns[None, :] - arrays['start'][:, None]) / arrays['t_scale'][:, None]
+
+    @staticmethod
+    def to_nanoseconds(timestamps):
+        """
+        Converts timestamps to nanoseconds since the epoch, the unit of the start and t_scale parameters.
+
+        :param timestamps: The timestamps to convert.
+        :type timestamps: list of datetime or pandas.Series
+
+        :returns: The timestamps in nanoseconds.
+        :rtype: numpy.ndarray
+        """
+        return pd.to_datetime(pd.Series(timestamps)).values.astype('datetime64[ns]').astype(np.int64)
+
+    def predict(self, timestamps, indices=None):
+        """
+        Computes the point forecast (yhat) of the series for the given timestamps.
+
+        :param timestamps: The timestamps to predict.
+        :type timestamps: list of datetime or pandas.Series
+        :param indices: Positions of the series to predict. All series are predicted if None.
+        :type indices: list of int, optional
+
+        :returns: The forecasts, with shape (series, timestamps).
+        :rtype: numpy.ndarray
+        """
+        arrays = self.get_arrays(indices)
+        timestamps_ns = self.to_nanoseconds(timestamps)
+
+        # Piecewise linear trend, with the rate changes of the changepoints already passed at each timestamp
+        t = self.get_scaled_time(timestamps_ns, arrays)
+        active = arrays['changepoints_t'][:, None, :] <= t[:, :, None]
+        k_t = arrays['k'][:, None] + np.einsum('stc,sc->st', active, arrays['deltas'])
+        m_t = arrays['m'][:, None] - np.einsum('stc,sc->st', active, arrays['deltas'] * arrays['changepoints_t'])
+        trend = np.where(arrays['flat'][:, None], arrays['m'][:, None], k_t * t + m_t)
+        trend = trend * arrays['y_scale'][:, None] + arrays['floor'][:, None]
+
+        # Seasonal components as matrix products of the shared features with the stacked coefficients
+        features = self.make_seasonality_features(timestamps_ns)
+        additive = (features @ arrays['beta_additive'].T).T * arrays['y_scale'][:, None]
+        multiplicative = (features @ arrays['beta_multiplicative'].T).T
+        return trend * (1 + multiplicative) + additive
+
+    def predict_interval(self, timestamps, indices=None):
+        """
+        Computes the point forecast of the series together with the analytic uncertainty interval, which
+        approximates the interval Prophet simulates.
+
+        :param timestamps: The timestamps to predict.
+        :type timestamps: list of datetime or pandas.Series
+        :param indices: Positions of the series to predict. All series are predicted if None.
+        :type indices: list of int, optional
+
+        :returns: A tuple with the yhat, yhat_lower and yhat_upper arrays, each of shape (series, timestamps).
+        :rtype: tuple of numpy.ndarray
+        """
+        arrays = self.get_arrays(indices)
+        yhat = self.predict(timestamps, indices)
+        half_width = calculate_interval_half_width(
+            self.get_scaled_time(self.to_nanoseconds(timestamps), arrays),
+            arrays['y_scale'][:, None],
+            arrays['sigma_obs'][:, None],
+            arrays['trend_variance_rate'][:, None],
+            arrays['interval_z'][:, None]
+        )
+        return yhat, yhat - half_width, yhat + half_width
+
+    def predict_frame(self, timestamps):
+        """
+        Computes the point forecasts of all the series as a DataFrame.
+
+        :param timestamps: The timestamps to predict.
+        :type timestamps: list of datetime or pandas.Series
+
+        :returns: DataFrame with the series keys as index and the timestamps as columns.
+        :rtype: pandas.DataFrame
+        """
+        return pd.DataFrame(self.predict(timestamps), index=self.keys_list, columns=pd.to_datetime(pd.Series(timestamps)).values)
+
+    def keys(self):
+        return list(self.keys_list)
+
+    def __contains__(self, key):
+        return key in self._key_index
+
+    def __getitem__(self, key):
+        return CompactForecastModel(self, self._key_index[key])
+
+    def __len__(self):
+        return len(self.keys_list)
+
+    def save(self, path):
+        """
+        Saves the engine to a compressed NumPy archive.
+
+        :param path: The path of the archive.
+        :type path: str
+        """
+        np.savez_compressed(
+            path,
+            keys=np.array(json.dumps([to_native_key(key) for key in self.keys_list])),
+            seasonalities=np.array(self.seasonalities, dtype=float).reshape(-1, 2),
+            **self.arrays
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an engine saved with `save`.
+
+        :param path: The path of the archive.
+        :type path: str
+
+        :returns: The compact forecast engine.
+        :rtype: CompactProphetEngine
+        """
+        with np.load(path) as archive:
+            keys = json.loads(str(archive['keys']))
+            seasonalities = [tuple(block) for block in archive['seasonalities']]
+            arrays = {name: archive[name] for name in archive.files if name not in ('keys', 'seasonalities')}
+        return cls(keys, arrays, seasonalities)
+
+
+def make_point_forecaster(models):
+    """
+    Converts a dictionary of fitted Prophet models into models that predict without uncertainty sampling. The
+    models are stacked into a compact engine when all of them are supported by it, and wrapped one by one
+    otherwise. Compact engines are returned as they are, and sharded artifacts provide their own point forecaster.
+
+    :param models: A dictionary of fitted Prophet models, a compact engine or a sharded artifact.
+    :type models: dict or CompactProphetEngine or ShardedModelStore
+
+    :returns: An object with the same dictionary interface, whose models return yhat with the analytic interval.
+    :rtype: CompactProphetEngine or dict
+    """
+    if isinstance(models, CompactProphetEngine):
+        return models
+    if hasattr(models, 'point_forecaster'):
+        return models.point_forecaster()
+    try:
+        return CompactProphetEngine.from_models(models)
+    except ValueError:
+        return {key: PointForecastModel(model) for key, model in models.items()}
@@ -0,0 +1,47 @@
+import json
+import pickle
+
+from django.core.management.base import BaseCommand
+
+from project.benchmark import PointForecastBenchmark
+
+class Command(BaseCommand):
+    help = 'Compares the latency and accuracy of Prophet forecasts with and without uncertainty sampling.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models_file', help='Pickled dictionary of Prophet models.')
+        parser.add_argument('--models', type=int, default=None, help='Number of models sampled for the benchmark, all by default.')
+        parser.add_argument('--horizon', type=int, default=48, help='Number of hourly timestamps predicted by each model.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed used to sample the models.')
+        parser.add_argument('--output', default=None, help='File the result is appended to, as one JSON object per line.')
+
+    def handle(self, *args, **options):
+        """
+        Runs the point forecast benchmark on the pickled models and prints the latency and accuracy of each mode.
+        """
+        with open(options['models_file'], 'rb') as f:
+            models = pickle.load(f)
+
+        result = PointForecastBenchmark(
+            models,
+            n_models=options['models'],
+            horizon_hours=options['horizon'],
+            seed=options['seed']
+        ).run()
+        result['models_file'] = options['models_file']
+
+        if options['output']:
+            with open(options['output'], 'a') as f:
+                f.write(json.dumps(result) + '\n')
+
+        self.stdout.write(f"{result['n_models']} models, {result['horizon_hours']} hours")
+        for mode, mode_result in result['modes'].items():
+            accuracy = ''
+            if 'max_abs_yhat_error' in mode_result:
+                accuracy = (
+                    f", max yhat error {mode_result['max_abs_yhat_error']:.2e}"
+                    f", interval width error {100 * mode_result['mean_rel_width_error']:.1f}%"
+                )
+            self.stdout.write(f"    {mode}: {mode_result['seconds']:.3f}s ({mode_result['speedup']:.1f}x){accuracy}")
+        for mode, reason in result['skipped_modes'].items():
+            self.stdout.write(f"    {mode}: skipped, {reason}")
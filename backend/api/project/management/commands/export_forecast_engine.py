@@ -0,0 +1,35 @@
+import os
+import pickle
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.forecasting import CompactProphetEngine
+
+class Command(BaseCommand):
+    help = 'Exports pickled Prophet models to a compact NumPy forecast engine archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models_file', help='Pickled dictionary of Prophet models, or a single pickled model.')
+        parser.add_argument('--output', help='Path of the archive. Defaults to the models file with the .npz extension.')
+
+    def handle(self, *args, **options):
+        """
+        Loads the pickled models, stacks their parameters into a compact forecast engine and saves it next to
+        the models. A single model, or a dictionary with the model under the 'model' key as stored for the tram
+        lines, is exported under the 'model' key, so that the archive can replace the pickle in the registry.
+        """
+        with open(options['models_file'], 'rb') as f:
+            models = pickle.load(f)
+        if hasattr(models, 'predict'):
+            models = { 'model': models }
+        elif 'model' in models:
+            models = { 'model': models['model'] }
+
+        try:
+            engine = CompactProphetEngine.from_models(models)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = options['output'] or f"{os.path.splitext(options['models_file'])[0]}.npz"
+        engine.save(output)
+        self.stdout.write(f"Exported {len(engine)} models to {output}.")
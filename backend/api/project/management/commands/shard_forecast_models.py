@@ -0,0 +1,26 @@
+import os
+import pickle
+
+from django.core.management.base import BaseCommand
+
+from project.shards import write_sharded_models
+
+class Command(BaseCommand):
+    help = 'Exports a pickled dictionary of Prophet models to a sharded artifact, loaded one model at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models_file', help='Pickled dictionary of Prophet models.')
+        parser.add_argument('--output', help='Path of the sharded artifact. Defaults to the models file with the .shards extension.')
+
+    def handle(self, *args, **options):
+        """
+        Loads the pickled models and writes them as a sharded artifact next to them, which the API loads instead of
+        the pickle. Running it again replaces the manifest atomically and reuses the shards of unchanged models.
+        """
+        with open(options['models_file'], 'rb') as f:
+            models = pickle.load(f)
+
+        output = options['output'] or f"{os.path.splitext(options['models_file'])[0]}.shards"
+        index = write_sharded_models(models, output)
+        compact = 'with' if index['compact'] is not None else 'without'
+        self.stdout.write(f"Exported {len(index['models'])} models to {output}, {compact} the compact engine arrays.")
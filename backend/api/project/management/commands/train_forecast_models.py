@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import make_aware
+
+from project.training import ForecastTrainingPipeline, hourly_frame_to_series, read_pedestrian_counts
+
+# Keyword arguments of the Prophet models of every target, as in the training notebooks
+_MODEL_PARAMS = {
+    'bikes': { 'changepoint_prior_scale': 0.01 },
+    'pedestrians': {}
+}
+
+class Command(BaseCommand):
+    help = 'Trains the per-station bike or per-street pedestrian Prophet models in parallel, retraining only the changed series.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['bikes', 'pedestrians'], help='The models to train.')
+        parser.add_argument('--input', nargs='+', help='CSV or Excel exports of the pedestrian counts.')
+        parser.add_argument('--days', type=int, default=90, help='Days of bike availability history used for training.')
+        parser.add_argument('--output', help='Path of the pickled models. Defaults to the path served by the API.')
+        parser.add_argument('--workers', type=int, help='Number of worker processes. Defaults to the number of CPUs.')
+        parser.add_argument('--min-new-fraction', type=float, default=0.05, help='Fraction of new observations that triggers a retrain.')
+        parser.add_argument('--max-mean-shift', type=float, default=0.25, help='Shift of the mean, in standard deviations, that triggers a retrain.')
+        parser.add_argument('--keep', type=int, default=3, help='Number of versions of the models kept.')
+        parser.add_argument('--full', action='store_true', help='Retrain every series.')
+        parser.add_argument('--sharded', action='store_true', help='Also write the models as a sharded artifact.')
+
+    def load_series(self, options):
+        """
+        Loads the training data of every series of the target: the hourly availability of the bike stations from the
+        bike availability table, or the hourly counts of the streets from the pedestrian exports.
+        """
+        if options['target'] == 'bikes':
+            from bikes.global_model import load_hourly_availability
+            end_time = make_aware(datetime.now().replace(minute=0, second=0, microsecond=0))
+            return hourly_frame_to_series(load_hourly_availability(end_time - timedelta(days=options['days']), end_time))
+
+        if not options['input']:
+            raise CommandError('The pedestrian counts exports are required with --input.')
+        return read_pedestrian_counts(options['input'])
+
+    def handle(self, *args, **options):
+        """
+        Fits the models of the series whose data has changed materially since the last run in a process pool, and
+        atomically replaces the served models with a new version, which the model registry picks up on its next request.
+        """
+        if options['target'] == 'bikes':
+            from bikes.views import _PROPHET_MODELS_FILE as default_output
+        else:
+            from pedestrians.predictions import _PREDICTIVE_MODEL_PATH as default_output
+
+        pipeline = ForecastTrainingPipeline(
+            options['output'] or default_output,
+            model_params=_MODEL_PARAMS[options['target']],
+            n_workers=options['workers'],
+            min_new_fraction=options['min_new_fraction'],
+            max_mean_shift=options['max_mean_shift'],
+            keep_versions=options['keep'],
+            sharded=options['sharded']
+        )
+        result = pipeline.run(self.load_series(options), full=options['full'])
+
+        if not result['retrained']:
+            self.stdout.write(f"No series changed materially, version {result['version']} is kept.")
+        else:
+            self.stdout.write(
+                f"Retrained {len(result['retrained'])} models and carried over {len(result['carried_over'])}, "
+                f"saved version {result['version']} to {pipeline.artifact_path}."
+            )
@@ -0,0 +1,227 @@
+import gc
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .forecasting import CompactProphetEngine, make_point_forecaster
+from .shards import SHARD_INDEX_FILE, ShardedModelStore, get_referenced_files, get_sharded_path, read_shard_index
+
+_DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3
+
+class ModelRegistry:
+
+    def __init__(self, memory_budget=None):
+        """
+        Initializes a process-wide registry of the pickled forecasting models used by the applications.
+        Each model artifact is loaded lazily the first time it is requested, and kept in memory for the
+        next requests as long as the file does not change.
+
+        :param memory_budget: The maximum total size in bytes of the artifacts kept in memory. The size of
+                              an artifact is estimated by the size of its files. Defaults to the
+                              MODEL_REGISTRY_MEMORY_BUDGET setting.
+        :type memory_budget: int, optional
+        """
+        self.memory_budget = memory_budget
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get_memory_budget(self):
+        """
+        Retrieves the memory budget of the registry, falling back to the Django settings.
+
+        :returns: The maximum total size in bytes of the artifacts kept in memory.
+        :rtype: int
+        """
+        if self.memory_budget is not None:
+            return self.memory_budget
+        return getattr(settings, 'MODEL_REGISTRY_MEMORY_BUDGET', _DEFAULT_MEMORY_BUDGET)
+
+    @staticmethod
+    def calculate_checksum(path):
+        """
+        Calculates the SHA-256 checksum of a file, reading it in chunks.
+
+        :param path: The path to the file.
+        :type path: str
+
+        :returns: The hexadecimal checksum of the file.
+        :rtype: str
+        """
+        checksum = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
+    @staticmethod
+    def get_version_file(path):
+        """
+        Retrieves the file whose changes mark a new version of an artifact: the manifest of a sharded artifact,
+        which is replaced last when the artifact is written, or the artifact file itself.
+
+        :param path: The path to the artifact.
+        :type path: str
+
+        :returns: The path of the file.
+        :rtype: str
+        """
+        if os.path.isdir(path):
+            return os.path.join(path, SHARD_INDEX_FILE)
+        return path
+
+    @staticmethod
+    def get_artifact_size(path):
+        """
+        Estimates the memory taken by an artifact from the size of its files. The size of a sharded artifact is the
+        size of its manifest and of the shard files and compact engine arrays the manifest references.
+
+        :param path: The path to the artifact.
+        :type path: str
+
+        :returns: The size of the artifact in bytes.
+        :rtype: int
+        """
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        size = os.path.getsize(os.path.join(path, SHARD_INDEX_FILE))
+        for name in get_referenced_files(read_shard_index(path)):
+            name_path = os.path.join(path, name)
+            if os.path.isdir(name_path):
+                size += sum(os.path.getsize(os.path.join(name_path, file_name)) for file_name in os.listdir(name_path))
+            elif os.path.exists(name_path):
+                size += os.path.getsize(name_path)
+        return size
+
+    @staticmethod
+    def load_artifact(path):
+        """
+        Deserializes a model artifact. NumPy archives are loaded as compact forecast engines, sharded artifact
+        directories as lazily loaded stores, and any other file is unpickled.
+
+        :param path: The path to the artifact.
+        :type path: str
+
+        :returns: The deserialized artifact.
+        :rtype: object
+        """
+        if path.endswith('.npz'):
+            return CompactProphetEngine.load(path)
+        if os.path.isdir(path):
+            return ShardedModelStore.load(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def get(self, path):
+        """
+        Retrieves a model artifact, loading it on first use. The file is checked on every call: if its
+        modification time or size has changed and its checksum differs from the loaded version, the artifact
+        is reloaded. Least recently used artifacts are evicted when the memory budget is exceeded.
+
+        :param path: The path to the pickled artifact, or to a sharded artifact directory.
+        :type path: str
+
+        :returns: The deserialized artifact.
+        :rtype: object
+
+        :raises FileNotFoundError: If the artifact file does not exist.
+        """
+        path = os.path.normpath(path)
+        version_file = self.get_version_file(path)
+        file_stat = os.stat(version_file)
+        file_version = (file_stat.st_mtime_ns, file_stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry['version'] != file_version:
+                checksum = self.calculate_checksum(version_file)
+                if checksum == entry['checksum']:
+                    entry['version'] = file_version
+                else:
+                    entry = None
+
+            if entry is None:
+                entry = {
+                    'artifact': self.load_artifact(path),
+                    'version': file_version,
+                    'checksum': self.calculate_checksum(version_file),
+                    'size': self.get_artifact_size(path)
+                }
+                self._entries[path] = entry
+
+            self._entries.move_to_end(path)
+            self.evict(keep=path)
+            return entry['artifact']
+
+    def get_point_forecaster(self, path):
+        """
+        Retrieves the point forecast version of a dictionary of Prophet models, which predicts without uncertainty
+        sampling. It is built on first use and kept with the artifact, so it is rebuilt when the artifact is reloaded
+        and released when the artifact is evicted.
+
+        :param path: The path to the pickled dictionary of models.
+        :type path: str
+
+        :returns: The point forecast models, with the same dictionary interface as the artifact.
+        :rtype: CompactProphetEngine or dict
+
+        :raises FileNotFoundError: If the artifact file does not exist.
+        """
+        with self._lock:
+            artifact = self.get(path)
+            entry = self._entries[os.path.normpath(path)]
+            if 'point_forecaster' not in entry:
+                entry['point_forecaster'] = make_point_forecaster(artifact)
+            return entry['point_forecaster']
+
+    def evict(self, keep=None):
+        """
+        Evicts the least recently used artifacts until the artifacts kept in memory fit in the memory budget.
+        The most recently requested artifact is never evicted, even if it exceeds the budget on its own.
+
+        :param keep: The path of an artifact that must not be evicted.
+        :type keep: str, optional
+        """
+        with self._lock:
+            memory_budget = self.get_memory_budget()
+            for path in list(self._entries):
+                if sum(entry['size'] for entry in self._entries.values()) <= memory_budget:
+                    break
+                if path != keep:
+                    del self._entries[path]
+
+    def preload(self, paths, point_forecast_paths=()):
+        """
+        Loads the given artifacts ahead of the first request, as the views request them: the sharded version of an
+        artifact when it exists, and its point forecaster when the views predict without uncertainty sampling. When
+        called in the gunicorn master process before the workers are forked, the workers share the loaded objects
+        copy-on-write. The loaded objects are moved to the permanent generation of the garbage collector, so that
+        collections in the workers do not touch, and therefore copy, their memory pages. Missing artifacts are skipped.
+
+        :param paths: The paths to the pickled artifacts.
+        :type paths: list of str
+        :param point_forecast_paths: The paths among them whose point forecasters are served by the views.
+        :type point_forecast_paths: list of str
+        """
+        for path in paths:
+            served_path = get_sharded_path(path)
+            if not os.path.exists(served_path):
+                print(f"Model artifact '{path}' not found, skipping preload.")
+                continue
+            self.get(served_path)
+            if path in point_forecast_paths:
+                self.get_point_forecaster(served_path)
+        gc.freeze()
+
+    def clear(self):
+        """
+        Removes all the artifacts from the registry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+model_registry = ModelRegistry()
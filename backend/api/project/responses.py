@@ -0,0 +1,103 @@
+import json
+import pandas as pd
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import pyarrow as pa
+except ImportError:
+    # Without pyarrow every endpoint keeps answering in JSON
+    pa = None
+
+ARROW_STREAM_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+def accepts_arrow(request):
+    """
+    Checks whether the client asked for an Apache Arrow IPC stream in the Accept header, and the server can produce it.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+
+    :returns: True if the response should be an Arrow stream.
+    :rtype: bool
+    """
+    return pa is not None and ARROW_STREAM_CONTENT_TYPE in request.headers.get('Accept', '')
+
+
+def get_representation_etag(request, version):
+    """
+    Derives the entity tag of one representation of versioned data, from the version of the data and the format
+    negotiated with the Accept header, so that a JSON payload is never validated for an Arrow one. Query parameters
+    selecting a delta, such as `since`, are left out: a client holds the entity tag of a version once it has merged
+    it, so it is up to date with that version whatever delta it asks for.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param version: The version of the data, such as the harvest time of a snapshot.
+    :type version: str
+
+    :returns: The entity tag.
+    :rtype: str
+    """
+    return f"{version}-{'arrow' if accepts_arrow(request) else 'json'}"
+
+
+def arrow_response(data, metadata=None, status=200):
+    """
+    Serializes tabular data into an Apache Arrow IPC stream response. Values that do not belong to the table, such as
+    the harvest time of a snapshot, are stored JSON encoded in the schema metadata.
+
+    :param data: The rows of the table, as a list of dictionaries or a DataFrame.
+    :type data: list of dict or pandas.DataFrame
+    :param metadata: Values stored in the schema metadata, keyed by name.
+    :type metadata: dict, optional
+    :param status: The HTTP status of the response.
+    :type status: int
+
+    :returns: The response with the Arrow stream.
+    :rtype: HttpResponse
+    """
+    if isinstance(data, pd.DataFrame):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    else:
+        table = pa.Table.from_pylist(list(data))
+    if metadata:
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata.update({key: json.dumps(value, cls=DjangoJSONEncoder) for key, value in metadata.items()})
+        table = table.replace_schema_metadata(schema_metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return HttpResponse(sink.getvalue().to_pybytes(), content_type=ARROW_STREAM_CONTENT_TYPE, status=status)
+
+
+def tabular_response(request, rows, json_data=None, metadata=None, status=200):
+    """
+    Returns tabular data in the format negotiated with the client: an Apache Arrow IPC stream if the Accept header
+    asks for it, and JSON otherwise.
+
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param rows: The rows of the table, as a list of dictionaries or a DataFrame.
+    :type rows: list of dict or pandas.DataFrame
+    :param json_data: The JSON payload. Defaults to the rows themselves.
+    :type json_data: dict or list, optional
+    :param metadata: Values sent in the schema metadata of the Arrow stream, which the JSON payload carries itself.
+    :type metadata: dict, optional
+    :param status: The HTTP status of the response.
+    :type status: int
+
+    :returns: The response in the negotiated format, varying on the Accept header.
+    :rtype: HttpResponse
+    """
+    if accepts_arrow(request):
+        response = arrow_response(rows, metadata=metadata, status=status)
+    else:
+        if json_data is None:
+            json_data = rows.to_dict('records') if isinstance(rows, pd.DataFrame) else rows
+        response = JsonResponse(json_data, safe=False, status=status)
+    patch_vary_headers(response, ['Accept'])
+    return response
@@ -134,7 +134,11 @@ if (ENVIRONMENT == 'development'):
     }
     CACHES = {
         'default': {
-            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            'BACKEND': 'project.cache_backends.TwoLevelCache',
+            'LOCATION': 'shared',
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 elif ENVIRONMENT == 'production':
@@ -148,8 +152,17 @@ elif ENVIRONMENT == 'production':
             'PORT': '5432'
         }
     }
+    # Per-process memory cache in front of the shared Redis cache
     CACHES = {
         'default': {
+            'BACKEND': 'project.cache_backends.TwoLevelCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 5,
+            }
+        },
+        'shared': {
             'BACKEND': 'django_redis.cache.RedisCache',
             'LOCATION': 'redis://redis-service:6379/1',
             'OPTIONS': {
@@ -161,6 +174,27 @@ else:
     raise ValueError("Invalid DJANGO_ENV value. Use 'development' or 'production'.")
 
 
+# Forecast model registry
+# Artifacts loaded in the gunicorn master process before forking and memory budget of the loaded artifacts
+
+MODEL_REGISTRY_PRELOAD = [
+    'bikes/analytics/bike_model.pkl',
+    'pedestrians/analytics/pedestrian_model.pkl',
+    'trams/analytics/all_line_model.pkl',
+    'trams/analytics/red_line_model.pkl',
+    'trams/analytics/green_line_model.pkl',
+]
+# Preloaded artifacts whose point forecasters, rather than the models themselves, are served by the views
+MODEL_REGISTRY_PRELOAD_POINT_FORECASTERS = [
+    'bikes/analytics/bike_model.pkl',
+    'pedestrians/analytics/pedestrian_model.pkl',
+]
+MODEL_REGISTRY_MEMORY_BUDGET = 2 * 1024 ** 3
+
+# Bike availability forecaster: 'prophet' for one Prophet model per station, 'global' for the global lag-feature model
+BIKE_FORECAST_MODEL = os.getenv('BIKE_FORECAST_MODEL', 'prophet')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,295 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from datetime import datetime
+from collections import OrderedDict
+
+from .forecasting import CompactProphetEngine, PointForecastModel, to_native_key
+
+# Name of the manifest of a sharded artifact, listing the shard of every model
+SHARD_INDEX_FILE = 'index.json'
+
+# Maximum number of deserialized models kept in memory by a sharded artifact
+_MAX_LOADED_SHARDS = 256
+
+# Number of versions of a sharded artifact whose files are kept, the current one included, so that readers holding an
+# older manifest can still load its models
+_KEPT_GENERATIONS = 3
+
+def get_sharded_path(path):
+    """
+    Retrieves the sharded version of a pickled model artifact, e.g. `bike_model.shards` for `bike_model.pkl`, which
+    is preferred when it exists.
+
+    :param path: The path of the pickled artifact.
+    :type path: str
+
+    :returns: The path of the sharded artifact if it exists, otherwise the given path.
+    :rtype: str
+    """
+    sharded_path = f"{os.path.splitext(path)[0]}.shards"
+    if os.path.exists(os.path.join(sharded_path, SHARD_INDEX_FILE)):
+        return sharded_path
+    return path
+
+def write_atomically(path, content):
+    """
+    Writes a file through a temporary file in the same directory, renamed over the target, so that readers see
+    either the previous or the new content.
+
+    :param path: The path of the file.
+    :type path: str
+    :param content: The content of the file.
+    :type content: bytes
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def read_shard_index(path):
+    """
+    Reads the manifest of a sharded artifact.
+
+    :param path: The path of the sharded artifact.
+    :type path: str
+
+    :returns: The manifest, or None if the artifact does not exist.
+    :rtype: dict or None
+    """
+    index_path = os.path.join(path, SHARD_INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        return json.load(f)
+
+def get_referenced_files(index):
+    """
+    Lists the files and directories of a sharded artifact referenced by a manifest.
+
+    :param index: The manifest of the artifact.
+    :type index: dict
+
+    :returns: The sorted names of the model files and of the compact engine directory.
+    :rtype: list of str
+    """
+    referenced = {file_name for _, file_name in index['models']}
+    if index['compact'] is not None:
+        referenced.add(index['compact']['directory'])
+    return sorted(referenced)
+
+def write_sharded_models(models, path, keep_generations=_KEPT_GENERATIONS):
+    """
+    Writes a dictionary of fitted Prophet models as a sharded artifact: a directory with one JSON file per model,
+    serialized with `model_to_json`, the parameters of the compact forecast engine as uncompressed NumPy arrays that
+    can be memory-mapped, and a manifest listing the file of every model.
+
+    The files are named after the hash of their content, so the files of unchanged models are reused and a new
+    version never overwrites the files of the previous one. The manifest is written last and atomically. It records
+    the files of the previous versions, and the files referenced by none of the last `keep_generations` versions are
+    removed, so that readers of the previous versions can still load their models.
+
+    :param models: A dictionary of fitted Prophet models. The keys must be JSON serializable, or NumPy scalars.
+    :type models: dict
+    :param path: The path of the sharded artifact.
+    :type path: str
+    :param keep_generations: The number of versions whose files are kept, the new one included.
+    :type keep_generations: int
+
+    :returns: The manifest of the artifact.
+    :rtype: dict
+    """
+    from prophet.serialize import model_to_json
+
+    # The keys are written to the manifest and hashed in the engine checksum, so NumPy keys are converted first
+    models = {to_native_key(key): model for key, model in models.items()}
+    os.makedirs(path, exist_ok=True)
+    previous_index = read_shard_index(path)
+
+    entries = []
+    for key, model in models.items():
+        content = model_to_json(model).encode()
+        file_name = f"{hashlib.sha256(content).hexdigest()[:24]}.json"
+        if not os.path.exists(os.path.join(path, file_name)):
+            write_atomically(os.path.join(path, file_name), content)
+        entries.append([key, file_name])
+
+    try:
+        engine = CompactProphetEngine.from_models(models)
+    except ValueError:
+        compact = None
+    else:
+        checksum = hashlib.sha256(json.dumps(list(models.keys())).encode())
+        for name in sorted(engine.arrays):
+            checksum.update(np.ascontiguousarray(engine.arrays[name]).tobytes())
+        compact = {'directory': f"compact-{checksum.hexdigest()[:24]}", 'seasonalities': engine.seasonalities}
+        compact_path = os.path.join(path, compact['directory'])
+        if not os.path.exists(compact_path):
+            temp_path = tempfile.mkdtemp(dir=path, suffix='.tmp')
+            for name, values in engine.arrays.items():
+                np.save(os.path.join(temp_path, f"{name}.npy"), values)
+            os.rename(temp_path, compact_path)
+
+    generations = []
+    if previous_index is not None:
+        generations = [get_referenced_files(previous_index)] + previous_index.get('generations', [])
+    index = {
+        'created': datetime.now().isoformat(),
+        'models': entries,
+        'compact': compact,
+        'generations': generations[:max(keep_generations - 1, 0)]
+    }
+    write_atomically(os.path.join(path, SHARD_INDEX_FILE), json.dumps(index).encode())
+
+    referenced = {SHARD_INDEX_FILE, *get_referenced_files(index)}
+    for generation in index['generations']:
+        referenced.update(generation)
+    for name in os.listdir(path):
+        if name not in referenced and not name.endswith('.tmp'):
+            name_path = os.path.join(path, name)
+            if os.path.isdir(name_path):
+                for array_file in os.listdir(name_path):
+                    os.remove(os.path.join(name_path, array_file))
+                os.rmdir(name_path)
+            else:
+                os.remove(name_path)
+    return index
+
+
+class ShardedModelStore:
+
+    def __init__(self, path, index=None, wrap=None, max_loaded=_MAX_LOADED_SHARDS):
+        """
+        Initializes a lazily loaded view of a sharded artifact, with the dictionary interface of the pickled models.
+        Only the manifest is read up front, and a model is deserialized from its shard the first time it is requested.
+        The deserialized models are kept in a bounded least recently used cache.
+
+        :param path: The path of the sharded artifact.
+        :type path: str
+        :param index: The manifest of the artifact, read from the directory if None.
+        :type index: dict, optional
+        :param wrap: A function applied to the models when they are loaded, e.g. PointForecastModel.
+        :type wrap: callable, optional
+        :param max_loaded: The maximum number of deserialized models kept in memory.
+        :type max_loaded: int
+        """
+        self.path = path
+        self.index = read_shard_index(path) if index is None else index
+        if self.index is None:
+            raise FileNotFoundError(f"No sharded artifact at '{path}'.")
+        self.wrap = wrap
+        self.max_loaded = max_loaded
+
+        self.keys_list = [key for key, _ in self.index['models']]
+        self._files = {key: file_name for key, file_name in self.index['models']}
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._engine = None
+
+    @classmethod
+    def load(cls, path):
+        return cls(path)
+
+    def load_model(self, key):
+        """
+        Deserializes the model of a key from its shard. If the shard has been removed since the manifest was read,
+        because newer versions of the artifact were written, the model is read from the current manifest instead.
+
+        :param key: The key of the model.
+        :type key: object
+
+        :returns: The model, wrapped if a wrapper was given.
+        :rtype: object
+        """
+        from prophet.serialize import model_from_json
+
+        try:
+            with open(os.path.join(self.path, self._files[key])) as f:
+                content = f.read()
+        except FileNotFoundError:
+            current_index = read_shard_index(self.path)
+            current_files = {} if current_index is None else {model_key: file_name for model_key, file_name in current_index['models']}
+            if key not in current_files:
+                raise
+            self._files[key] = current_files[key]
+            with open(os.path.join(self.path, current_files[key])) as f:
+                content = f.read()
+        model = model_from_json(content)
+        return model if self.wrap is None else self.wrap(model)
+
+    def load_compact_engine(self):
+        """
+        Loads the compact forecast engine of the artifact, with its parameter arrays memory-mapped read-only. The
+        arrays are shared through the page cache by the processes loading the same artifact, and only the rows of
+        the requested series are read.
+
+        :returns: The compact forecast engine, or None if the models are not supported by it or its arrays have been
+                  removed since the manifest was read.
+        :rtype: CompactProphetEngine or None
+        """
+        compact = self.index['compact']
+        if compact is None:
+            return None
+        if self._engine is None:
+            compact_path = os.path.join(self.path, compact['directory'])
+            try:
+                arrays = {
+                    os.path.splitext(file_name)[0]: np.load(os.path.join(compact_path, file_name), mmap_mode='r')
+                    for file_name in os.listdir(compact_path)
+                }
+            except FileNotFoundError:
+                return None
+            self._engine = CompactProphetEngine(self.keys_list, arrays, compact['seasonalities'])
+        return self._engine
+
+    def point_forecaster(self):
+        """
+        Retrieves the point forecast version of the models: the memory-mapped compact engine when the models are
+        supported by it, and otherwise a sharded view that wraps the models in PointForecastModel as they are loaded.
+
+        :returns: The point forecast models, with the same dictionary interface.
+        :rtype: CompactProphetEngine or ShardedModelStore
+        """
+        engine = self.load_compact_engine()
+        if engine is not None:
+            return engine
+        return ShardedModelStore(self.path, index=self.index, wrap=PointForecastModel, max_loaded=self.max_loaded)
+
+    def keys(self):
+        return list(self.keys_list)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys_list]
+
+    def values(self):
+        return [self[key] for key in self.keys_list]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __contains__(self, key):
+        return key in self._files
+
+    def __getitem__(self, key):
+        if key not in self._files:
+            raise KeyError(key)
+        with self._lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return self._loaded[key]
+
+        model = self.load_model(key)
+        with self._lock:
+            self._loaded[key] = model
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return model
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def __len__(self):
+        return len(self.keys_list)
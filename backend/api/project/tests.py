@@ -0,0 +1,480 @@
+import gc
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+from django.http import JsonResponse
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from prophet import Prophet
+
+from .registry import ModelRegistry
+from .forecasting import CompactProphetEngine, PointForecastModel
+from .benchmark import PointForecastBenchmark
+from .responses import pa, tabular_response, ARROW_STREAM_CONTENT_TYPE
+from .caching import cache_post_response, invalidate_post_responses
+from .cache_backends import TwoLevelCache
+from .timeseries import TimeSeriesModel
+from .shards import ShardedModelStore, write_sharded_models
+from .training import ForecastTrainingPipeline, has_changed_materially, summarise_series
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.registry = ModelRegistry(memory_budget=1024 ** 2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_artifact(self, name, artifact, mtime=None):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            pickle.dump(artifact, f)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_get_loads_once(self):
+        path = self.write_artifact('model.pkl', {'station': 1})
+        first = self.registry.get(path)
+        second = self.registry.get(path)
+        self.assertEqual(first, {'station': 1})
+        self.assertIs(first, second)
+
+    def test_get_reloads_changed_file(self):
+        path = self.write_artifact('model.pkl', {'station': 1}, mtime=1000)
+        first = self.registry.get(path)
+
+        # Touching the file without changing its content keeps the loaded artifact
+        os.utime(path, (2000, 2000))
+        self.assertIs(self.registry.get(path), first)
+
+        self.write_artifact('model.pkl', {'station': 2}, mtime=3000)
+        self.assertEqual(self.registry.get(path), {'station': 2})
+
+    def test_evict_least_recently_used(self):
+        first_path = self.write_artifact('first.pkl', 'a' * 600 * 1024)
+        second_path = self.write_artifact('second.pkl', 'b' * 600 * 1024)
+        first = self.registry.get(first_path)
+        self.registry.get(second_path)
+
+        self.assertIsNot(self.registry.get(first_path), first)
+
+    def test_get_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            self.registry.get(os.path.join(self.directory.name, 'missing.pkl'))
+
+
+def make_prophet_model(history_df, rng, **kwargs):
+    # Sets the parameters of the model without running Stan, which is enough to compare the predictions
+    with patch.object(Prophet, '_load_stan_backend'):
+        model = Prophet(uncertainty_samples=0, **kwargs)
+    inputs = model.preprocess(history_df)
+    initial_params = model.calculate_initial_params(inputs.K)
+    model.params = {
+        'k': np.array([initial_params.k]),
+        'm': np.array([initial_params.m]),
+        'delta': rng.normal(0, 0.05, (1, len(model.changepoints_t))),
+        'beta': rng.normal(0, 0.1, (1, inputs.K)),
+        'sigma_obs': np.array([0.1])
+    }
+    return model
+
+
+class CompactProphetEngineTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        ds = pd.date_range('2023-01-01', periods=24 * 40, freq='H')
+        y = 10 + 3 * np.sin(2 * np.pi * ds.hour / 24) + rng.normal(0, 1, len(ds))
+        history_df = pd.DataFrame({ 'ds': ds, 'y': y })
+        self.models = {
+            1: make_prophet_model(history_df, rng),
+            2: make_prophet_model(history_df.assign(y=y + 5), rng, seasonality_mode='multiplicative', scaling='minmax'),
+            3: make_prophet_model(history_df, rng, growth='flat', daily_seasonality=True, n_changepoints=5)
+        }
+        self.future = pd.DataFrame({ 'ds': pd.date_range('2022-12-20', periods=24 * 80, freq='H') })
+
+    def test_predict_matches_prophet(self):
+        engine = CompactProphetEngine.from_models(self.models)
+        yhat = engine.predict(self.future['ds'])
+
+        self.assertEqual(yhat.shape, (3, len(self.future)))
+        for i, model in enumerate(self.models.values()):
+            np.testing.assert_allclose(yhat[i], model.predict(self.future)['yhat'].values, atol=1e-8)
+
+    def test_save_and_load(self):
+        engine = CompactProphetEngine.from_models(self.models)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'models.npz')
+            engine.save(path)
+            loaded = ModelRegistry().get(path)
+
+        self.assertEqual(loaded.keys(), [1, 2, 3])
+        self.assertIn(2, loaded)
+        forecast = loaded[2].predict(self.future)
+        np.testing.assert_allclose(forecast['yhat'].values, self.models[2].predict(self.future)['yhat'].values, atol=1e-8)
+
+    def test_save_numpy_integer_keys(self):
+        # The station IDs of the pickled models come from `unique()` in the training notebook
+        models = {np.int64(key): model for key, model in self.models.items()}
+        engine = CompactProphetEngine.from_models(models)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'models.npz')
+            engine.save(path)
+            loaded = CompactProphetEngine.load(path)
+
+        self.assertEqual(loaded.keys(), [1, 2, 3])
+        self.assertIn(np.int64(2), loaded)
+        np.testing.assert_allclose(loaded.predict(self.future['ds']), engine.predict(self.future['ds']))
+
+    def test_unsupported_model(self):
+        self.models[1].growth = 'logistic'
+        with self.assertRaises(ValueError):
+            CompactProphetEngine.from_models(self.models)
+
+    def test_point_forecast_interval(self):
+        model = self.models[1]
+        point_model = PointForecastModel(model)
+        model.uncertainty_samples = 2000
+        np.random.seed(0)
+        sampled = model.predict(self.future)
+        forecast = point_model.predict(self.future)
+
+        self.assertEqual(point_model.model.uncertainty_samples, 0)
+        np.testing.assert_allclose(forecast['yhat'].values, sampled['yhat'].values)
+        np.testing.assert_allclose(forecast['yhat_upper'] - forecast['yhat_lower'], sampled['yhat_upper'] - sampled['yhat_lower'], rtol=0.1)
+
+        engine_forecast = CompactProphetEngine.from_models(self.models)[1].predict(self.future)
+        np.testing.assert_allclose(engine_forecast['yhat_lower'].values, forecast['yhat_lower'].values)
+
+    def test_get_point_forecaster(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'models.pkl')
+            with open(path, 'wb') as f:
+                pickle.dump(self.models, f)
+            registry = ModelRegistry()
+            forecaster = registry.get_point_forecaster(path)
+            self.assertIs(registry.get_point_forecaster(path), forecaster)
+
+        self.assertIsInstance(forecaster, CompactProphetEngine)
+        self.assertEqual(forecaster.keys(), [1, 2, 3])
+
+    def test_point_forecast_benchmark(self):
+        for model in self.models.values():
+            model.uncertainty_samples = 200
+        result = PointForecastBenchmark(self.models, n_models=2, horizon_hours=12).run()
+
+        self.assertEqual(result['n_models'], 2)
+        self.assertEqual(set(result['modes']), {'sampled', 'point', 'engine'})
+        self.assertLess(result['modes']['engine']['max_abs_yhat_error'], 1e-8)
+        self.assertEqual(result['skipped_modes'], {})
+
+    def test_point_forecast_benchmark_engine_skipped(self):
+        for model in self.models.values():
+            model.uncertainty_samples = 200
+        with patch('project.benchmark.CompactProphetEngine.from_models', side_effect=ValueError('Unsupported model.')):
+            result = PointForecastBenchmark(self.models, n_models=2, horizon_hours=12).run()
+
+        self.assertEqual(set(result['modes']), {'sampled', 'point'})
+        self.assertEqual(result['skipped_modes'], {'engine': 'Unsupported model.'})
+
+
+class ShardedModelStoreTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        ds = pd.date_range('2023-01-01', periods=24 * 40, freq='H')
+        history_df = pd.DataFrame({ 'ds': ds, 'y': 10 + rng.normal(0, 1, len(ds)) })
+        self.models = {station_id: make_prophet_model(history_df.assign(y=history_df['y'] + station_id), rng) for station_id in (1, 2, 3)}
+        self.future = pd.DataFrame({ 'ds': pd.date_range('2023-02-10', periods=48, freq='H') })
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'models.shards')
+        # Deserializing a Prophet model constructs it, which loads the Stan backend
+        self.stan_patch = patch.object(Prophet, '_load_stan_backend')
+        self.stan_patch.start()
+
+    def tearDown(self):
+        self.stan_patch.stop()
+        self.directory.cleanup()
+
+    def test_models_are_loaded_on_demand(self):
+        write_sharded_models(self.models, self.path)
+        store = ModelRegistry().get(self.path)
+
+        self.assertIsInstance(store, ShardedModelStore)
+        self.assertEqual(store.keys(), [1, 2, 3])
+        self.assertEqual(len(store._loaded), 0)
+        forecast = store[2].predict(self.future)
+        self.assertEqual(list(store._loaded), [2])
+        np.testing.assert_allclose(forecast['yhat'].values, self.models[2].predict(self.future)['yhat'].values, atol=1e-8)
+
+    def test_point_forecaster_is_memory_mapped(self):
+        write_sharded_models(self.models, self.path)
+        forecaster = ModelRegistry().get_point_forecaster(self.path)
+
+        self.assertIsInstance(forecaster, CompactProphetEngine)
+        self.assertIsInstance(forecaster.arrays['deltas'], np.memmap)
+        expected = CompactProphetEngine.from_models(self.models).predict(self.future['ds'])
+        np.testing.assert_allclose(forecaster.predict(self.future['ds']), expected)
+
+    def test_rewrite_reuses_unchanged_shards(self):
+        first = write_sharded_models(self.models, self.path, keep_generations=2)
+        self.models[3] = self.models[1]
+        second = write_sharded_models(self.models, self.path, keep_generations=2)
+
+        self.assertEqual(first['models'][:2], second['models'][:2])
+        self.assertEqual(second['models'][2][1], second['models'][0][1])
+        # The shards of the previous version are kept for its readers, and older ones are removed
+        self.assertIn(first['models'][2][1], os.listdir(self.path))
+        third = write_sharded_models(self.models, self.path, keep_generations=2)
+        files = {file_name for _, file_name in third['models']} | {third['compact']['directory'], 'index.json'}
+        self.assertEqual(set(os.listdir(self.path)), files)
+
+    def test_older_versions_kept(self):
+        first = write_sharded_models(self.models, self.path)
+        store = ShardedModelStore(self.path)
+        expected = self.models[3].predict(self.future)['yhat'].values
+        self.models[3] = self.models[1]
+        write_sharded_models(self.models, self.path)
+        write_sharded_models(self.models, self.path)
+
+        # A reader of the version before the previous one still loads its shards
+        self.assertIn(first['models'][2][1], os.listdir(self.path))
+        np.testing.assert_allclose(store[3].predict(self.future)['yhat'].values, expected, atol=1e-8)
+
+        # Once they are removed, the model is read from the current manifest
+        write_sharded_models(self.models, self.path)
+        self.assertNotIn(first['models'][2][1], os.listdir(self.path))
+        store._loaded.clear()
+        np.testing.assert_allclose(store[3].predict(self.future)['yhat'].values, self.models[1].predict(self.future)['yhat'].values, atol=1e-8)
+
+    def test_registry_size_counts_shards(self):
+        write_sharded_models(self.models, self.path)
+        registry = ModelRegistry()
+        registry.get(self.path)
+
+        size = 0
+        for root, _, file_names in os.walk(self.path):
+            size += sum(os.path.getsize(os.path.join(root, file_name)) for file_name in file_names)
+        self.assertEqual(registry._entries[os.path.normpath(self.path)]['size'], size)
+
+    def test_preload_served_objects(self):
+        pickle_path = os.path.join(self.directory.name, 'models.pkl')
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(self.models, f)
+        write_sharded_models(self.models, self.path)
+        registry = ModelRegistry()
+        try:
+            registry.preload([pickle_path], [pickle_path])
+        finally:
+            gc.unfreeze()
+
+        # The sharded version and its memory-mapped engine are loaded, as the views request them
+        self.assertEqual(list(registry._entries), [os.path.normpath(self.path)])
+        self.assertIsInstance(registry._entries[os.path.normpath(self.path)]['point_forecaster'], CompactProphetEngine)
+
+    def test_numpy_keys(self):
+        index = write_sharded_models({np.int64(key): model for key, model in self.models.items()}, self.path)
+
+        self.assertEqual([key for key, _ in index['models']], [1, 2, 3])
+        self.assertEqual(ModelRegistry().get_point_forecaster(self.path).keys(), [1, 2, 3])
+
+
+class TabularResponseTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.rows = [{'id': 1, 'available_bikes': 5}, {'id': 2, 'available_bikes': 8}]
+
+    def test_json_by_default(self):
+        response = tabular_response(self.factory.get('/'), self.rows, json_data={'stations': self.rows})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Vary'], 'Accept')
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_arrow_stream(self):
+        request = self.factory.get('/', HTTP_ACCEPT=ARROW_STREAM_CONTENT_TYPE)
+        response = tabular_response(request, pd.DataFrame(self.rows), metadata={'harvest_time': '2024-03-12T12:00:00'})
+
+        self.assertEqual(response['Content-Type'], ARROW_STREAM_CONTENT_TYPE)
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.to_pylist(), self.rows)
+        self.assertEqual(table.schema.metadata[b'harvest_time'], b'"2024-03-12T12:00:00"')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'post-responses'}})
+class CachePostResponseTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+        self.version = 1
+
+        @cache_post_response(60, namespace='test', version_func=lambda request: self.version)
+        def view(request):
+            self.calls += 1
+            return JsonResponse({'calls': self.calls})
+        self.view = view
+
+    def post(self, body):
+        return self.view(self.factory.post('/', body, content_type='application/json'))
+
+    def test_normalised_body(self):
+        self.post('{"date": "2024-04-10", "hour": "12:00"}')
+        response = self.post('{ "hour": "12:00",  "date": "2024-04-10" }')
+        self.assertEqual(response.content, b'{"calls": 1}')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        self.post('{"date": "2024-04-11", "hour": "12:00"}')
+        self.assertEqual(self.calls, 2)
+
+    def test_vary_on_accept(self):
+        self.assertEqual(self.post('{"date": "2024-04-10"}')['Vary'], 'Accept')
+        self.assertEqual(self.post('{"date": "2024-04-10"}')['Vary'], 'Accept')
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidation(self):
+        self.post('{"date": "2024-04-10"}')
+        self.version = 2
+        self.post('{"date": "2024-04-10"}')
+        invalidate_post_responses('test')
+        self.post('{"date": "2024-04-10"}')
+        self.assertEqual(self.calls, 3)
+
+    def test_invalid_body_not_cached(self):
+        self.post('not json')
+        self.post('not json')
+        self.assertEqual(self.calls, 2)
+
+
+@override_settings(CACHES={'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'two-level'}})
+class TwoLevelCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.options = {'LOCAL_MAX_ENTRIES': 2, 'LOCAL_TIMEOUT': 60, 'GENERATION_CHECK_INTERVAL': 0}
+        self.cache = TwoLevelCache('shared', {'OPTIONS': self.options})
+        self.cache.clear()
+
+    def test_local_hits(self):
+        self.cache.set('a', [1, 2])
+        with patch.object(self.cache.shared, 'get', wraps=self.cache.shared.get) as shared_get:
+            value = self.cache.get('a')
+            value.append(3)
+            self.assertEqual(self.cache.get('a'), [1, 2])
+        # Only the generation is read from the shared cache
+        self.assertTrue(all(call.args[0] == 'two_level_cache:generation' for call in shared_get.call_args_list))
+
+    def test_lru_eviction(self):
+        for key in ['a', 'b', 'a', 'c']:
+            self.cache.set(key, key)
+        self.assertEqual(list(self.cache._local), [self.cache.make_key('a'), self.cache.make_key('c')])
+        self.assertEqual(self.cache.get('b'), 'b')
+
+    def test_invalidation_broadcast(self):
+        other_process = TwoLevelCache('shared', {'OPTIONS': self.options})
+        self.cache.set('a', 1)
+        self.assertEqual(other_process.get('a'), 1)
+
+        self.cache.shared.set('a', 2)
+        self.assertEqual(other_process.get('a'), 1)
+        self.cache.invalidate_local()
+        self.assertEqual(other_process.get('a'), 2)
+
+
+class TimeSeriesModelTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.usage = rng.poisson(lam=[[20], [50], [80]], size=(3, 30)).astype(float)
+
+    def test_batched_fit_matches_single_series(self):
+        predictions = TimeSeriesModel(previous_days_to_consider=3).predict_bikes_usage_many(self.usage)
+        expected = [TimeSeriesModel(previous_days_to_consider=3).predict_bikes_usage(list(series)) for series in self.usage]
+        np.testing.assert_array_equal(predictions, expected)
+
+    def test_online_update_matches_refit(self):
+        model = TimeSeriesModel(previous_days_to_consider=3).fit_many(self.usage[:, :-2])
+        model.update(self.usage[:, -2]).update(self.usage[:, -1])
+
+        refit = TimeSeriesModel(previous_days_to_consider=3).fit_many(self.usage)
+        np.testing.assert_allclose(model.coefficients, refit.coefficients, rtol=1e-6)
+        np.testing.assert_allclose(model.predict_next(), refit.predict_next(), rtol=1e-6)
+
+
+class MeanModel:
+    """
+    Model predicting the mean of its training data, pickled across the worker processes of the training pipeline.
+    """
+    def fit(self, df):
+        self.mean = df['y'].mean()
+        return self
+
+
+class ForecastTrainingPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'models.pkl')
+        ds = pd.date_range('2024-01-01', periods=100, freq='H')
+        self.series = {key: pd.DataFrame({'ds': ds, 'y': np.full(100, float(key))}) for key in (1, 2, 3)}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_pipeline(self, **kwargs):
+        return ForecastTrainingPipeline(self.path, model_class=MeanModel, n_workers=2, **kwargs)
+
+    def test_material_change(self):
+        previous = summarise_series(self.series[1])
+        self.assertTrue(has_changed_materially(None, previous))
+        self.assertFalse(has_changed_materially(previous, previous))
+        self.assertTrue(has_changed_materially(previous, dict(previous, n=110)))
+        self.assertTrue(has_changed_materially(dict(previous, std=1.0), dict(previous, mean=2.0)))
+
+    def test_material_change_rolling_window(self):
+        ds = pd.date_range('2024-01-01', periods=200, freq='H')
+
+        def window(offset):
+            return pd.DataFrame({'ds': ds[offset:offset + 100], 'y': np.ones(100)})
+
+        previous = summarise_series(window(0))
+
+        # The window keeps its length, and its end advances by 2 and then 10 percent of its span
+        self.assertFalse(has_changed_materially(previous, summarise_series(window(2))))
+        self.assertTrue(has_changed_materially(previous, summarise_series(window(10))))
+
+        # Summaries of earlier runs have no start, and only the growth of the series counts
+        self.assertFalse(has_changed_materially(dict(previous, start=None), summarise_series(window(10))))
+
+    def test_rolling_window_training(self):
+        pipeline = self.make_pipeline()
+        pipeline.run(self.series)
+
+        ds = pd.date_range('2024-01-01', periods=100, freq='H') + pd.Timedelta(hours=10)
+        series = {**self.series, 1: pd.DataFrame({'ds': ds, 'y': np.full(100, 1.0)})}
+        result = pipeline.run(series)
+        self.assertEqual(result['retrained'], [1])
+
+    def test_incremental_training(self):
+        result = self.make_pipeline().run(self.series)
+        self.assertEqual(result['version'], 1)
+        self.assertCountEqual(result['retrained'], [1, 2, 3])
+
+        self.assertEqual(self.make_pipeline().run(self.series)['retrained'], [])
+
+        self.series[2] = pd.concat([self.series[2], self.series[2].assign(ds=self.series[2]['ds'] + pd.Timedelta(days=5), y=5.0)])
+        result = self.make_pipeline().run(self.series)
+        self.assertEqual(result['version'], 2)
+        self.assertEqual(result['retrained'], [2])
+        self.assertCountEqual(result['carried_over'], [1, 3])
+
+        with open(self.path, 'rb') as f:
+            models = pickle.load(f)
+        self.assertEqual(models[1].mean, 1.0)
+        self.assertAlmostEqual(models[2].mean, 3.5)
+
+    def test_versions_are_pruned(self):
+        pipeline = self.make_pipeline(keep_versions=2)
+        for _ in range(3):
+            pipeline.run(self.series, full=True)
+        self.assertEqual(sorted(os.listdir(pipeline.versions_dir)), ['manifest.json', 'v0002.pkl', 'v0003.pkl'])
+        self.assertEqual(pipeline.load_manifest()['version'], 3)
@@ -1,17 +1,27 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.linear_model import LinearRegression
 
 class TimeSeriesModel:
-    def __init__(self, previous_days_to_consider=2):
+    def __init__(self, previous_days_to_consider=2, forgetting_factor=1.0):
         """
         Initializes the time series model with the specified number of previous days to consider.
 
         :param previous_days_to_consider: The number of previous days to consider for prediction.
         :type previous_days_to_consider: int
+        :param forgetting_factor: The weight of the past observations in the recursive least squares updates, between
+                                  0 and 1. With 1, the updates give the same coefficients as a refit on all the days.
+        :type forgetting_factor: float
         """
         self.previous_days_to_consider = previous_days_to_consider
+        self.forgetting_factor = forgetting_factor
         self.model = LinearRegression()
 
+        # State of the batched models, one row per series
+        self.coefficients = None
+        self.inverse_covariance = None
+        self.recent_days = None
+
     def predict_bikes_usage(self, arrayOfUsagePerDay):
         """
         Predicts bike usage for the next day based on the usage data of previous days.
@@ -38,3 +48,81 @@ class TimeSeriesModel:
         y_pred = self.model.predict(to_predict)
 
         return int(np.ceil(y_pred[0]))
+
+    def make_lag_windows(self, usage_per_day):
+        """
+        Builds the lagged features and targets of many series at once, as views over the data without copying it.
+
+        :param usage_per_day: The usage of every series for each day, with shape (series, days).
+        :type usage_per_day: numpy.ndarray
+        :return: The lagged features with shape (series, samples, previous days) and the targets with shape
+                 (series, samples).
+        :rtype: tuple of numpy.ndarray
+        """
+        windows = sliding_window_view(usage_per_day[:, :-1], self.previous_days_to_consider, axis=1)
+        return windows, usage_per_day[:, self.previous_days_to_consider:]
+
+    @staticmethod
+    def add_intercept(X):
+        return np.concatenate([X, np.ones(X.shape[:-1] + (1,))], axis=-1)
+
+    def fit_many(self, usage_per_day):
+        """
+        Fits one linear model per series with a single batched least squares solve. The inverse of the covariance
+        of the features is kept to update the models with recursive least squares as new days arrive.
+
+        :param usage_per_day: The usage of every series for each day, with shape (series, days).
+        :type usage_per_day: numpy.ndarray
+        :return: The fitted model.
+        :rtype: TimeSeriesModel
+        """
+        usage_per_day = np.asarray(usage_per_day, dtype=float)
+        X, y = self.make_lag_windows(usage_per_day)
+        X = self.add_intercept(X)
+
+        covariance = np.einsum('snp,snq->spq', X, X)
+        self.inverse_covariance = np.linalg.pinv(covariance, hermitian=True)
+        self.coefficients = np.einsum('spq,sq->sp', self.inverse_covariance, np.einsum('snp,sn->sp', X, y))
+        self.recent_days = usage_per_day[:, -self.previous_days_to_consider:].copy()
+        return self
+
+    def update(self, usage):
+        """
+        Updates the models of all the series with the usage of a new day, with one recursive least squares step
+        instead of a refit.
+
+        :param usage: The usage of the new day for every series, with shape (series,).
+        :type usage: numpy.ndarray
+        :return: The updated model.
+        :rtype: TimeSeriesModel
+        """
+        usage = np.asarray(usage, dtype=float)
+        x = self.add_intercept(self.recent_days)
+        Px = np.einsum('spq,sq->sp', self.inverse_covariance, x)
+        gain = Px / (self.forgetting_factor + np.einsum('sp,sp->s', x, Px))[:, None]
+        error = usage - np.einsum('sp,sp->s', x, self.coefficients)
+
+        self.coefficients = self.coefficients + gain * error[:, None]
+        self.inverse_covariance = (self.inverse_covariance - np.einsum('sp,sq->spq', gain, Px)) / self.forgetting_factor
+        self.recent_days = np.concatenate([self.recent_days[:, 1:], usage[:, None]], axis=1)
+        return self
+
+    def predict_next(self):
+        """
+        Predicts the usage of the next day of every series from its most recent days.
+
+        :return: The predicted usage of every series, with shape (series,).
+        :rtype: numpy.ndarray
+        """
+        return np.einsum('sp,sp->s', self.add_intercept(self.recent_days), self.coefficients)
+
+    def predict_bikes_usage_many(self, usage_per_day):
+        """
+        Predicts the bike usage of the next day of many series, e.g. every station, with a single call.
+
+        :param usage_per_day: The usage of every series for each day, with shape (series, days).
+        :type usage_per_day: numpy.ndarray
+        :return: The predicted usage of every series for the next day.
+        :rtype: numpy.ndarray of int
+        """
+        return np.ceil(self.fit_many(usage_per_day).predict_next()).astype(int)
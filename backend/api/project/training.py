@@ -0,0 +1,329 @@
+import os
+import json
+import pickle
+import tempfile
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from .shards import write_sharded_models
+
+# Minimum number of observations of a series to fit a model
+_MIN_OBSERVATIONS = 2
+
+def summarise_series(series_df):
+    """
+    Summarises the training data of a series, to detect material changes between two training runs.
+
+    :param series_df: DataFrame with the ds and y columns of the series.
+    :type series_df: pandas.DataFrame
+
+    :returns: A dictionary with the number of observations, the first and last timestamps, the mean and the standard
+              deviation.
+    :rtype: dict
+    """
+    y = series_df['y'].dropna()
+    return {
+        'n': int(len(y)),
+        'start': pd.Timestamp(series_df['ds'].min()).isoformat() if len(series_df) else None,
+        'end': pd.Timestamp(series_df['ds'].max()).isoformat() if len(series_df) else None,
+        'mean': float(y.mean()) if len(y) else 0.0,
+        'std': float(y.std()) if len(y) > 1 else 0.0
+    }
+
+def has_changed_materially(previous, current, min_new_fraction=0.05, max_mean_shift=0.25):
+    """
+    Decides whether the data of a series has changed enough since the last training run to retrain its model:
+    when the new observations amount to a fraction of the previous ones, or when the mean has shifted by a fraction
+    of the previous standard deviation. The new observations are counted from the growth of the series, and from the
+    advance of its last timestamp over the time span of the previous data, so that a rolling window of constant
+    length is retrained as it slides forward.
+
+    :param previous: The summary of the series at the last training run, or None if it was not trained.
+    :type previous: dict or None
+    :param current: The current summary of the series.
+    :type current: dict
+    :param min_new_fraction: The fraction of new observations that triggers a retrain.
+    :type min_new_fraction: float
+    :param max_mean_shift: The shift of the mean, in standard deviations, that triggers a retrain.
+    :type max_mean_shift: float
+
+    :returns: True if the model of the series should be retrained.
+    :rtype: bool
+    """
+    if previous is None or current['n'] < previous['n']:
+        return True
+
+    new_observations = current['n'] - previous['n']
+    if previous.get('start') and previous.get('end') and current.get('end'):
+        # Observations of the previous data per unit of time, applied to the time the end has advanced
+        span = pd.Timestamp(previous['end']) - pd.Timestamp(previous['start'])
+        advance = pd.Timestamp(current['end']) - pd.Timestamp(previous['end'])
+        if span > pd.Timedelta(0):
+            new_observations = max(new_observations, previous['n'] * (advance / span))
+    if new_observations >= min_new_fraction * max(previous['n'], 1):
+        return True
+    return abs(current['mean'] - previous['mean']) > max_mean_shift * max(previous['std'], 1e-9)
+
+def fit_series(key, series_df, model_class, model_params):
+    """
+    Fits the model of a single series. It runs in the worker processes of the training pipeline.
+
+    :param key: The key of the series.
+    :type key: object
+    :param series_df: DataFrame with the ds and y columns of the series.
+    :type series_df: pandas.DataFrame
+    :param model_class: The class of the model, e.g. Prophet.
+    :type model_class: type
+    :param model_params: The keyword arguments of the model.
+    :type model_params: dict
+
+    :returns: The key and the fitted model.
+    :rtype: tuple
+    """
+    model = model_class(**model_params)
+    model.fit(series_df[['ds', 'y']].dropna())
+    return key, model
+
+
+class ForecastTrainingPipeline:
+
+    def __init__(self, artifact_path, model_class=None, model_params=None, n_workers=None, min_new_fraction=0.05,
+                 max_mean_shift=0.25, keep_versions=3, sharded=False):
+        """
+        Initializes a pipeline training one forecasting model per series, e.g. per bike station or per street, in a
+        pool of processes. Only the series whose data has changed materially since the last run are retrained, and
+        the models of the other series are carried over from the current artifact.
+
+        Every run writes a new version of the artifact next to it, in the `<artifact>.versions` directory with a
+        manifest of the training data of every series, and then atomically replaces the artifact read by the serving
+        side, which the model registry reloads on its next request.
+
+        :param artifact_path: The path of the pickled dictionary of models served by the API.
+        :type artifact_path: str
+        :param model_class: The class of the models. Defaults to Prophet.
+        :type model_class: type, optional
+        :param model_params: The keyword arguments of the models.
+        :type model_params: dict, optional
+        :param n_workers: The number of worker processes. Defaults to the number of CPUs.
+        :type n_workers: int, optional
+        :param min_new_fraction: The fraction of new observations of a series that triggers a retrain.
+        :type min_new_fraction: float
+        :param max_mean_shift: The shift of the mean of a series, in standard deviations, that triggers a retrain.
+        :type max_mean_shift: float
+        :param keep_versions: The number of versions kept in the versions directory.
+        :type keep_versions: int
+        :param sharded: Whether to also write the models as a sharded artifact next to the served artifact.
+        :type sharded: bool
+        """
+        if model_class is None:
+            from prophet import Prophet
+            model_class = Prophet
+        self.artifact_path = artifact_path
+        self.model_class = model_class
+        self.model_params = model_params or {}
+        self.n_workers = n_workers
+        self.min_new_fraction = min_new_fraction
+        self.max_mean_shift = max_mean_shift
+        self.keep_versions = keep_versions
+        self.sharded = sharded
+
+    @property
+    def versions_dir(self):
+        return f"{self.artifact_path}.versions"
+
+    def load_manifest(self):
+        """
+        Loads the manifest of the latest version of the artifact.
+
+        :returns: The manifest, with the version number and the summary of every series, or None if no version exists.
+        :rtype: dict or None
+        """
+        manifest_path = os.path.join(self.versions_dir, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def load_current_models(self):
+        """
+        Loads the models of the current artifact, which are carried over for the unchanged series.
+
+        :returns: The dictionary of models, empty if the artifact does not exist.
+        :rtype: dict
+        """
+        if not os.path.exists(self.artifact_path):
+            return {}
+        with open(self.artifact_path, 'rb') as f:
+            return pickle.load(f)
+
+    def select_series(self, series, manifest, full=False):
+        """
+        Selects the series to retrain.
+
+        :param series: The training data of every series, keyed by series.
+        :type series: dict of pandas.DataFrame
+        :param manifest: The manifest of the last run, or None.
+        :type manifest: dict or None
+        :param full: Whether to retrain every series.
+        :type full: bool
+
+        :returns: The keys of the series to retrain and the current summaries of all the series.
+        :rtype: tuple
+        """
+        previous = {} if manifest is None or full else manifest['series']
+        summaries = {key: summarise_series(series_df) for key, series_df in series.items()}
+        to_train = [
+            key for key, summary in summaries.items()
+            if summary['n'] >= _MIN_OBSERVATIONS and has_changed_materially(
+                previous.get(str(key)), summary, self.min_new_fraction, self.max_mean_shift
+            )
+        ]
+        return to_train, summaries
+
+    def fit(self, series, keys):
+        """
+        Fits the models of the given series in a process pool.
+
+        :param series: The training data of every series, keyed by series.
+        :type series: dict of pandas.DataFrame
+        :param keys: The keys of the series to fit.
+        :type keys: list
+
+        :returns: The fitted models, keyed by series.
+        :rtype: dict
+        """
+        if not keys:
+            return {}
+        if self.n_workers == 1:
+            return dict(fit_series(key, series[key], self.model_class, self.model_params) for key in keys)
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            futures = [executor.submit(fit_series, key, series[key], self.model_class, self.model_params) for key in keys]
+            return dict(future.result() for future in futures)
+
+    def write_artifact(self, models, manifest):
+        """
+        Writes a new version of the artifact and its manifest, then atomically replaces the served artifact with it,
+        so that readers never see a partially written file. The sharded artifact, if enabled, is written after it.
+        Old versions beyond `keep_versions` are removed.
+
+        :param models: The models of every series.
+        :type models: dict
+        :param manifest: The manifest of the version.
+        :type manifest: dict
+
+        :returns: The path of the versioned artifact.
+        :rtype: str
+        """
+        os.makedirs(self.versions_dir, exist_ok=True)
+        version_path = os.path.join(self.versions_dir, f"v{manifest['version']:04d}.pkl")
+        with open(version_path, 'wb') as f:
+            pickle.dump(models, f)
+
+        for path, write in [
+            (self.artifact_path, lambda f: pickle.dump(models, f)),
+            (os.path.join(self.versions_dir, 'manifest.json'), lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+        ]:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+        if self.sharded:
+            write_sharded_models(models, f"{os.path.splitext(self.artifact_path)[0]}.shards")
+
+        versions = sorted(name for name in os.listdir(self.versions_dir) if name.startswith('v') and name.endswith('.pkl'))
+        for name in versions[:-self.keep_versions]:
+            os.remove(os.path.join(self.versions_dir, name))
+        return version_path
+
+    def run(self, series, full=False):
+        """
+        Retrains the models of the series whose data has changed materially, and writes a new version of the artifact
+        if any model was retrained.
+
+        :param series: The training data of every series, keyed by series, as DataFrames with the ds and y columns.
+        :type series: dict of pandas.DataFrame
+        :param full: Whether to retrain every series.
+        :type full: bool
+
+        :returns: A dictionary with the version, the retrained and carried over series and the path of the artifact.
+        :rtype: dict
+        """
+        manifest = self.load_manifest()
+        to_train, summaries = self.select_series(series, manifest, full=full)
+        if not to_train and manifest is not None:
+            return {'version': manifest['version'], 'retrained': [], 'carried_over': list(manifest['series']), 'path': None}
+
+        models = self.load_current_models()
+        models = {key: model for key, model in models.items() if key in series}
+        models.update(self.fit(series, to_train))
+
+        previous_series = {} if manifest is None else manifest['series']
+        new_manifest = {
+            'version': (0 if manifest is None else manifest['version']) + 1,
+            'created': datetime.now().isoformat(),
+            'series': {
+                str(key): summaries[key] if key in to_train else previous_series.get(str(key), summaries[key])
+                for key in models
+            }
+        }
+        path = self.write_artifact(models, new_manifest)
+        return {
+            'version': new_manifest['version'],
+            'retrained': to_train,
+            'carried_over': [key for key in models if key not in to_train],
+            'path': path
+        }
+
+
+def split_series(long_df, key_column):
+    """
+    Splits a long DataFrame into the training data of every series.
+
+    :param long_df: DataFrame with a key column and the ds and y columns.
+    :type long_df: pandas.DataFrame
+    :param key_column: The name of the key column.
+    :type key_column: str
+
+    :returns: The ds and y columns of every series, sorted by time and keyed by series.
+    :rtype: dict of pandas.DataFrame
+    """
+    return {
+        key: group[['ds', 'y']].sort_values('ds').reset_index(drop=True)
+        for key, group in long_df.groupby(key_column)
+    }
+
+def read_pedestrian_counts(paths):
+    """
+    Reads pedestrian count exports, with a Time column and one column per counter, into the series of every street.
+    The counts per direction, in the columns ending with IN or OUT, are dropped.
+
+    :param paths: The paths of the CSV or Excel exports.
+    :type paths: list of str
+
+    :returns: The training data of every street, keyed by model name.
+    :rtype: dict of pandas.DataFrame
+    """
+    frames = [pd.read_excel(path) if path.endswith(('.xls', '.xlsx')) else pd.read_csv(path) for path in paths]
+    counts_df = pd.concat(frames, ignore_index=True)
+    counts_df = counts_df.melt(id_vars='Time', var_name='location', value_name='y').rename(columns={'Time': 'ds'})
+    counts_df = counts_df[~counts_df['location'].str.endswith(('OUT', 'IN'))]
+    counts_df['ds'] = pd.to_datetime(counts_df['ds'])
+    counts_df['location'] = counts_df['location'] + '_model'
+    return split_series(counts_df, 'location')
+
+def hourly_frame_to_series(hourly_df):
+    """
+    Converts a DataFrame with hourly timestamps as index and one column per series into the training data of every
+    series, dropping the hours without data.
+
+    :param hourly_df: DataFrame with the timestamps as index and the series keys as columns.
+    :type hourly_df: pandas.DataFrame
+
+    :returns: The training data of every series, keyed by series.
+    :rtype: dict of pandas.DataFrame
+    """
+    return {
+        key: pd.DataFrame({'ds': hourly_df.index.values, 'y': hourly_df[key].values}).dropna().reset_index(drop=True)
+        for key in hourly_df.columns
+    }
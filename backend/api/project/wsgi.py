@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# Load the forecasting models once, so that gunicorn workers forked from a preloaded master share them
+from project.registry import model_registry
+model_registry.preload(settings.MODEL_REGISTRY_PRELOAD, settings.MODEL_REGISTRY_PRELOAD_POINT_FORECASTERS)
@@ -0,0 +1,158 @@
+import os
+import pandas as pd
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+
+from project.caching import invalidate_post_responses
+from project.registry import model_registry
+
+# Tram lines with a passenger forecasting model
+TRAM_LINES = ['All Line', 'Red Line', 'Green Line']
+
+# Number of days ahead materialised in the cache
+FORECAST_WINDOW_DAYS = 90
+
+# Service hours of the trams, forecasted for every date
+FORECAST_HOURS = list(range(5, 24))
+
+# Seconds the materialised forecasts are kept, so that they expire if the refresher stops running
+_FORECAST_CACHE_TIMEOUT = 60 * 60 * 48
+
+# Namespace of the cached prediction responses, invalidated when new forecasts are stored
+PREDICTIONS_CACHE_NAMESPACE = 'tram_predictions'
+
+def get_line_model_path(line):
+    """
+    Builds the path of the passenger forecasting model of a tram line.
+
+    :param line: The name of the tram line, e.g. 'Red Line'.
+    :type line: str
+
+    :returns: The path of the pickled model.
+    :rtype: str
+    """
+    return os.path.join('trams/analytics/', f'{line.lower().replace(" ", "_")}_model.pkl')
+
+def load_line_model(line):
+    """
+    Loads the passenger forecasting model of a tram line through the model registry.
+
+    :param line: The name of the tram line.
+    :type line: str
+
+    :returns: The forecasting model, or None if the model file does not exist.
+    :rtype: prophet.Prophet or None
+    """
+    model_path = get_line_model_path(line)
+    if not os.path.exists(model_path):
+        return None
+    model_data = model_registry.get(model_path)
+    return model_data['model'] if 'model' in model_data else model_data
+
+def get_forecast_cache_key(line, forecast_date):
+    """
+    Builds the cache key of the materialised passenger forecast of a tram line on a date.
+
+    :param line: The name of the tram line.
+    :type line: str
+    :param forecast_date: The forecasted date.
+    :type forecast_date: datetime.date
+
+    :returns: The cache key.
+    :rtype: str
+    """
+    return f"tram_passenger_forecast:{line.lower().replace(' ', '_')}:{forecast_date.isoformat()}"
+
+def predict_passengers(model, dates):
+    """
+    Predicts the hourly passengers of the given dates with a single call to the model.
+
+    :param model: The forecasting model of a tram line.
+    :type model: prophet.Prophet
+    :param dates: The dates to forecast.
+    :type dates: list of datetime.date
+
+    :returns: A dictionary with the dates as keys and dictionaries with the Hour and Passengers lists as values.
+    :rtype: dict
+    """
+    forecast_timestamps = [datetime.combine(day, datetime.min.time()) + timedelta(hours=hour) for day in dates for hour in FORECAST_HOURS]
+    pred = model.predict(pd.DataFrame({ 'ds': forecast_timestamps }))
+    passengers = pred['yhat'].values.reshape(len(dates), len(FORECAST_HOURS))
+    return {day: {'Hour': FORECAST_HOURS, 'Passengers': passengers[i].tolist()} for i, day in enumerate(dates)}
+
+def is_in_forecast_window(forecast_date, today=None):
+    """
+    Checks whether a date belongs to the window of materialised forecasts.
+
+    :param forecast_date: The date to check.
+    :type forecast_date: datetime.date
+    :param today: The first date of the window. Defaults to the current date.
+    :type today: datetime.date, optional
+
+    :returns: True if the forecasts of the date are materialised.
+    :rtype: bool
+    """
+    today = date.today() if today is None else today
+    return today <= forecast_date < today + timedelta(days=FORECAST_WINDOW_DAYS)
+
+def get_materialised_forecast(line, forecast_date):
+    """
+    Retrieves the materialised passenger forecast of a tram line on a date.
+
+    :param line: The name of the tram line.
+    :type line: str
+    :param forecast_date: The forecasted date.
+    :type forecast_date: datetime.date
+
+    :returns: A dictionary with the Hour and Passengers lists, or None if the forecast is not materialised.
+    :rtype: dict or None
+    """
+    if not is_in_forecast_window(forecast_date):
+        return None
+    return cache.get(get_forecast_cache_key(line, forecast_date))
+
+
+class TramForecastMaterialiser:
+
+    def __init__(self, line_models, start_date=None, window_days=FORECAST_WINDOW_DAYS):
+        """
+        Initializes a job that predicts the hourly passengers of every tram line over a rolling window of dates
+        and stores the predictions in the cache.
+
+        :param line_models: A dictionary of forecasting models, one per tram line.
+        :type line_models: dict
+        :param start_date: The first date to forecast. Defaults to the current date.
+        :type start_date: datetime.date, optional
+        :param window_days: The number of dates to forecast.
+        :type window_days: int
+        """
+        self.line_models = line_models
+        self.start_date = date.today() if start_date is None else start_date
+        self.window_days = window_days
+
+    def get_dates(self):
+        """
+        Creates the dates of the forecast window.
+
+        :returns: The dates to forecast.
+        :rtype: list of datetime.date
+        """
+        return [self.start_date + timedelta(days=i) for i in range(self.window_days)]
+
+    def run(self):
+        """
+        Predicts the whole window of every line with a single call to each line model, and stores the forecasts
+        in the cache with one key per line and date.
+
+        :returns: The number of stored forecasts.
+        :rtype: int
+        """
+        dates = self.get_dates()
+        forecasts = {}
+        for line, model in self.line_models.items():
+            for day, forecast in predict_passengers(model, dates).items():
+                forecasts[get_forecast_cache_key(line, day)] = forecast
+        cache.set_many(forecasts, _FORECAST_CACHE_TIMEOUT)
+        invalidate_post_responses(PREDICTIONS_CACHE_NAMESPACE)
+        return len(forecasts)
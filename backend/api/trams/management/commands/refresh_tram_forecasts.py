@@ -0,0 +1,43 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.caching import is_cache_process_local
+
+from trams.forecasts import TramForecastMaterialiser, TRAM_LINES, load_line_model
+
+class Command(BaseCommand):
+    help = 'Materialises the hourly passenger forecasts of every tram line over a rolling window of dates in the cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=600, help='Seconds to wait between checks for a new date or new models.')
+        parser.add_argument('--once', action='store_true', help='Materialise the forecasts once and exit.')
+
+    def handle(self, *args, **options):
+        """
+        Materialises the forecasts whenever the line models are loaded or refreshed in the model registry,
+        and whenever a new date starts so that the forecast window moves forward. The forecasts are only useful in a
+        cache shared with the web processes, such as the Redis cache of the production settings.
+        """
+        if is_cache_process_local():
+            raise CommandError(
+                'The cache is local to this process, so the web processes would never see the forecasts. '
+                'Run the command with DJANGO_ENV=production to store them in the shared Redis cache.'
+            )
+
+        last_models = None
+        last_date = None
+        while True:
+            line_models = {line: load_line_model(line) for line in TRAM_LINES}
+            line_models = {line: model for line, model in line_models.items() if model is not None}
+            current_date = date.today()
+            models_changed = last_models is None or line_models.keys() != last_models.keys() or \
+                any(line_models[line] is not model for line, model in last_models.items())
+            if line_models and (models_changed or current_date != last_date):
+                stored = TramForecastMaterialiser(line_models, start_date=current_date).run()
+                self.stdout.write(f"Stored {stored} tram passenger forecasts starting on {current_date}.")
+                last_models, last_date = line_models, current_date
+            if options['once']:
+                break
+            time.sleep(options['interval'])
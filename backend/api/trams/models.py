@@ -34,6 +34,7 @@ class TramArrivals(models.Model):
         direction (str): The direction of the tram.
         destination (str): The destination of the tram.
         status (str): The status of the tram arrival.
+        update_time (datetime): The time the arrival was estimated.
     """
     arrival_time = models.DateTimeField()
     stop_id = models.TextField()
@@ -41,8 +42,12 @@ class TramArrivals(models.Model):
     direction = models.TextField()
     destination = models.TextField()
     status = models.TextField()
- 
+    update_time = models.DateTimeField(null=True)
 
     class Meta:
         managed = True
         db_table = 'tram_arrivals'
+        indexes = [
+            models.Index(fields=['stop_id', 'direction', 'arrival_time'], name='tram_arrivals_stop_direction'),
+            models.Index(fields=['batch_id'], name='tram_arrivals_batch_id_idx')
+        ]
@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from .models import TramStop, TramArrivals
+
+# Stops are listed along each branch in the outbound direction, towards Tallaght and Saggart on the Red line and
+# towards Bride's Glen on the Green line, so inbound trams travel the stops in reverse order
+_DIRECTION_STEP = {'O': 1, 'I': -1}
+
+# Stop codes of the branches of each line in the outbound direction, with the directions served on each branch. The Red
+# line splits at Belgard, the Connolly spur joins it at Busáras, and the Green line crosses the city centre on separate
+# stops in each direction. The stops of other lines form a single branch in ID order, which is the outbound order.
+_LINE_BRANCHES = {
+    'Red': [
+        ('OI', ['TPT', 'SDK', 'MYS', 'GDK', 'BUS', 'ABB', 'JER', 'FOU', 'SMI', 'MUS', 'HEU', 'JAM', 'FAT', 'RIA', 'SUI',
+                'GOL', 'DRI', 'BLA', 'BLU', 'KYL', 'RED', 'KIN', 'BEL', 'COO', 'HOS', 'TAL']),
+        ('OI', ['CON', 'BUS']),
+        ('OI', ['BEL', 'FET', 'CVN', 'CIT', 'FOR', 'SAG'])
+    ],
+    'Green': [
+        ('O', ['BRO', 'CAB', 'PHI', 'GRA', 'BRD', 'DOM', 'OUP', 'OGP', 'WES', 'TRY', 'DAW', 'STS']),
+        ('I', ['BRO', 'CAB', 'PHI', 'GRA', 'BRD', 'PAR', 'MAR', 'TRY', 'DAW', 'STS']),
+        ('OI', ['STS', 'HAR', 'CHA', 'RAN', 'BEE', 'COW', 'MIL', 'WIN', 'DUN', 'BAL', 'KIL', 'STI', 'SAN', 'CPK', 'GLE',
+                'GAL', 'LEO', 'BAW', 'CCK', 'LAU', 'CHE', 'BRI'])
+    ]
+}
+
+# Average speed of the trams between stops, in meters per minute
+_AVERAGE_SPEED = 350
+
+# Seconds the estimated positions of a batch are kept in the cache
+_POSITIONS_CACHE_TIMEOUT = 60 * 10
+
+_EARTH_RADIUS = 6371000
+
+
+def calculate_distances(latitudes_from, longitudes_from, latitudes_to, longitudes_to):
+    """
+    Calculates the haversine distances between pairs of coordinates.
+
+    :param latitudes_from: The latitudes of the first points, in degrees.
+    :type latitudes_from: numpy.ndarray
+    :param longitudes_from: The longitudes of the first points, in degrees.
+    :type longitudes_from: numpy.ndarray
+    :param latitudes_to: The latitudes of the second points, in degrees.
+    :type latitudes_to: numpy.ndarray
+    :param longitudes_to: The longitudes of the second points, in degrees.
+    :type longitudes_to: numpy.ndarray
+
+    :returns: The distances in meters.
+    :rtype: numpy.ndarray
+    """
+    latitudes_from, longitudes_from = np.radians(latitudes_from), np.radians(longitudes_from)
+    latitudes_to, longitudes_to = np.radians(latitudes_to), np.radians(longitudes_to)
+    a = np.sin((latitudes_to - latitudes_from) / 2) ** 2 + \
+        np.cos(latitudes_from) * np.cos(latitudes_to) * np.sin((longitudes_to - longitudes_from) / 2) ** 2
+    return 2 * _EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+class TramPositionEstimator:
+
+    def __init__(self, stops_df, arrivals_df, average_speed=_AVERAGE_SPEED):
+        """
+        Initializes an estimator of the positions of the trams from the arrival estimations at the stops.
+        Walking along a line in the direction of travel, a tram is between two consecutive stops when the next
+        arrival at the second stop is sooner than at the first one, and its progress along the segment follows
+        from the time left to reach the second stop.
+
+        :param stops_df: DataFrame with columns code, name, latitude, longitude and line, ordered by stop ID.
+        :type stops_df: pandas.DataFrame
+        :param arrivals_df: DataFrame with columns stop_id, direction and minutes_to_arrival with the next arrival
+                            at each stop and direction.
+        :type arrivals_df: pandas.DataFrame
+        :param average_speed: The average speed of the trams, in meters per minute.
+        :type average_speed: float
+        """
+        self.stops_df = stops_df
+        self.arrivals_df = arrivals_df
+        self.average_speed = average_speed
+
+    def estimate_line_positions(self, line_stops_df, direction):
+        """
+        Estimates the positions of the trams travelling in one direction of a line, with vectorised operations over
+        the consecutive pairs of stops.
+
+        :param line_stops_df: The stops of a branch of the line, in the outbound order.
+        :type line_stops_df: pandas.DataFrame
+        :param direction: The direction of travel, 'O' for outbound or 'I' for inbound.
+        :type direction: str
+
+        :returns: A list of dictionaries with the line, direction, previous and next stop, the minutes to the next
+                  stop, the progress along the segment and the estimated coordinates of every tram.
+        :rtype: list of dict
+        """
+        stops = line_stops_df.iloc[::_DIRECTION_STEP[direction]]
+        minutes = self.arrivals_df[self.arrivals_df['direction'] == direction].set_index('stop_id')['minutes_to_arrival']
+        minutes = minutes.reindex(stops['code']).values.astype(float)
+        latitudes, longitudes = stops['latitude'].values, stops['longitude'].values
+
+        # A tram is between two stops when it reaches the next stop before the following tram reaches the previous one
+        minutes_from, minutes_to = minutes[:-1], minutes[1:]
+        with np.errstate(invalid='ignore'):
+            between = np.isfinite(minutes_from) & np.isfinite(minutes_to) & (minutes_from > minutes_to)
+
+        segment_minutes = calculate_distances(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:]) / self.average_speed
+        with np.errstate(divide='ignore', invalid='ignore'):
+            progress = np.clip(1 - minutes_to / segment_minutes, 0, 1)
+        progress = np.nan_to_num(progress)
+        latitude = latitudes[:-1] + progress * (latitudes[1:] - latitudes[:-1])
+        longitude = longitudes[:-1] + progress * (longitudes[1:] - longitudes[:-1])
+
+        codes, names = stops['code'].values, stops['name'].values
+        return [{
+            'line': stops['line'].iloc[0],
+            'direction': direction,
+            'from_stop_id': codes[i],
+            'from_stop_name': names[i],
+            'to_stop_id': codes[i + 1],
+            'to_stop_name': names[i + 1],
+            'minutes_to_next_stop': float(minutes_to[i]),
+            'progress': float(progress[i]),
+            'latitude': float(latitude[i]),
+            'longitude': float(longitude[i])
+        } for i in np.flatnonzero(between)]
+
+    def get_line_branches(self, line, line_stops_df):
+        """
+        Splits the stops of a line into its branches, so that only stops that are adjacent on the tracks are paired.
+        The stops of a branch missing from the stops table are kept as empty rows, which never locate a tram.
+
+        :param line: The name of the line.
+        :type line: str
+        :param line_stops_df: The stops of the line, in ID order.
+        :type line_stops_df: pandas.DataFrame
+
+        :returns: A list of tuples with the directions served on every branch and its stops in the outbound order.
+        :rtype: list of tuple
+        """
+        if line not in _LINE_BRANCHES:
+            return [(list(_DIRECTION_STEP), line_stops_df)]
+        line_stops_df = line_stops_df.set_index('code', drop=False)
+        return [
+            (list(directions), line_stops_df.reindex(codes).assign(line=line).reset_index(drop=True))
+            for directions, codes in _LINE_BRANCHES[line]
+        ]
+
+    def estimate_positions(self):
+        """
+        Estimates the positions of the trams of every line, branch and direction.
+
+        :returns: A list of dictionaries with the estimated position of every tram.
+        :rtype: list of dict
+        """
+        positions = []
+        for line, line_stops_df in self.stops_df.groupby('line', sort=True):
+            for directions, branch_stops_df in self.get_line_branches(line, line_stops_df):
+                if len(branch_stops_df) < 2:
+                    continue
+                for direction in directions:
+                    positions.extend(self.estimate_line_positions(branch_stops_df, direction))
+        return positions
+
+
+def get_tram_positions(batch_id):
+    """
+    Retrieves the estimated tram positions of a batch of arrivals, estimating them on first use. The positions are
+    cached per batch ID, since they only change when the ETL pipeline writes a new batch.
+
+    :param batch_id: The ID of the batch of arrivals.
+    :type batch_id: int
+
+    :returns: A list of dictionaries with the estimated position of every tram.
+    :rtype: list of dict
+    """
+    def estimate():
+        # The next arrival of every stop and direction locates the closest tram before the stop
+        next_arrivals = TramArrivals.objects.filter(batch_id=batch_id, direction__in=_DIRECTION_STEP).values(
+            'stop_id', 'direction'
+        ).annotate(arrival_time=Min('arrival_time'), update_time=Max('update_time'))
+        arrivals_df = pd.DataFrame(next_arrivals, columns=['stop_id', 'direction', 'arrival_time', 'update_time'])
+        arrivals_df['minutes_to_arrival'] = (
+            pd.to_datetime(arrivals_df['arrival_time'], utc=True) - pd.to_datetime(arrivals_df['update_time'], utc=True)
+        ).dt.total_seconds() / 60
+        stops_df = pd.DataFrame(
+            TramStop.objects.order_by('id').values('code', 'name', 'latitude', 'longitude', 'line'),
+            columns=['code', 'name', 'latitude', 'longitude', 'line']
+        )
+        return TramPositionEstimator(stops_df, arrivals_df).estimate_positions()
+
+    return cache.get_or_set(f"tram_positions:{batch_id}", estimate, _POSITIONS_CACHE_TIMEOUT)
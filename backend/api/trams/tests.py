@@ -1,20 +1,245 @@
-from django.test import TestCase, RequestFactory
-from .views import get_tram_display_data, get_tram_recommendations
+from django.test import TestCase, RequestFactory, override_settings
+from .views import get_tram_display_data, get_tram_position_data, get_latest_tram_arrivals, get_predictions
+from .positions import get_tram_positions
+from .forecasts import TramForecastMaterialiser, get_materialised_forecast, FORECAST_HOURS
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from .models import TramStop, TramArrivals
+from datetime import date, datetime, timedelta, timezone
+import json
 import pandas as pd 
 
 class TramTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
+        TramStop.objects.create(id=1, code='STS', name="St. Stephen's Green", latitude=53.339, longitude=-6.261, line='Green')
+        TramStop.objects.create(id=2, code='ABB', name='Abbey Street', latitude=53.348, longitude=-6.258, line='Red')
+        for stop_id, direction in [('STS', 'O'), ('STS', 'I'), ('ABB', 'I')]:
+            TramArrivals.objects.create(
+                arrival_time=datetime(2024, 3, 12, 12, 5, tzinfo=timezone.utc),
+                stop_id=stop_id, batch_id=3, direction=direction, destination='BRI', status='Normal'
+            )
 
     def test_tram_data(self):
         request = self.factory.get('/api/tram/display')
         response = get_tram_display_data(request)
         self.assertEqual(response.status_code, 200)
-        tram_data = response.json()
+        self.assertEqual(response['ETag'], '"tram-3-json"')
+        self.assertEqual(response['X-Batch-ID'], '3')
+        tram_data = json.loads(response.content)
         df = pd.DataFrame(tram_data)
-        
+
+        self.assertEqual(list(df.columns), ['stop_id', 'stop_name', 'latitude', 'longitude', 'line', 'arrivals'])
+        self.assertEqual(df['stop_id'].tolist(), [1, 2])
+        self.assertEqual([len(arrivals) for arrivals in df['arrivals']], [2, 1])
+
         #to check whether the length of both are equal
-        self.assertEqual(len(df), len(df.drop_duplicates()))
+        self.assertEqual(len(df), len(df.drop(columns='arrivals').drop_duplicates()))
 
         #to check whether there are missing values
-        self.assertFalse(df.isnull().values.any())
\ No newline at end of file
+        self.assertFalse(df.isnull().values.any())
+
+class TramDisplayConditionalTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        TramStop.objects.create(id=1, code='STS', name="St. Stephen's Green", latitude=53.339, longitude=-6.261, line='Green')
+        TramStop.objects.create(id=2, code='ABB', name='Abbey Street', latitude=53.348, longitude=-6.258, line='Red')
+        for batch_id, stop_id in [(1, 'STS'), (1, 'ABB'), (2, 'ABB')]:
+            TramArrivals.objects.create(
+                arrival_time=datetime(2024, 3, 12, 12, batch_id, tzinfo=timezone.utc),
+                stop_id=stop_id, batch_id=batch_id, direction='I', destination='BRI', status='Normal'
+            )
+
+    def test_etag_not_modified(self):
+        response = get_tram_display_data(self.factory.get('/api/tram/display'))
+        self.assertEqual(response['ETag'], '"tram-2-json"')
+
+        response = get_tram_display_data(self.factory.get('/api/tram/display', HTTP_IF_NONE_MATCH='"tram-2-json"'))
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+        # A client holding the ETag of the batch has merged it, whatever delta it asks for
+        response = get_tram_display_data(self.factory.get('/api/tram/display', {'since': 2}, HTTP_IF_NONE_MATCH='"tram-2-json"'))
+        self.assertEqual(response.status_code, 304)
+
+        # The Arrow stream of the same batch is a different representation
+        from project.responses import pa, ARROW_STREAM_CONTENT_TYPE
+        if pa is not None:
+            response = get_tram_display_data(self.factory.get(
+                '/api/tram/display', HTTP_IF_NONE_MATCH='"tram-2-json"', HTTP_ACCEPT=ARROW_STREAM_CONTENT_TYPE
+            ))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['ETag'], '"tram-2-arrow"')
+
+    def test_arrow_stream(self):
+        from project.responses import pa, ARROW_STREAM_CONTENT_TYPE
+        if pa is None:
+            self.skipTest('pyarrow is not installed')
+        response = get_tram_display_data(self.factory.get('/api/tram/display', HTTP_ACCEPT=ARROW_STREAM_CONTENT_TYPE))
+        stops = pa.ipc.open_stream(response.content).read_all().to_pylist()
+        self.assertEqual(stops[1]['arrivals'][0]['batch_id'], 2)
+
+    def test_latest_arrivals_single_query(self):
+        for minute in [5, 9]:
+            TramArrivals.objects.create(
+                arrival_time=datetime(2024, 3, 12, 12, minute, tzinfo=timezone.utc),
+                stop_id='ABB', batch_id=2, direction='O', destination='TPT', status='Normal'
+            )
+        with self.assertNumQueries(2):
+            latest_arrivals = get_latest_tram_arrivals()
+
+        self.assertEqual(set(latest_arrivals), {('ABB', 'I'), ('ABB', 'O')})
+        self.assertEqual(latest_arrivals[('ABB', 'O')]['arrival_time'], datetime(2024, 3, 12, 12, 9, tzinfo=timezone.utc))
+
+        response = get_tram_display_data(self.factory.get('/api/tram/display'))
+        stops = {stop['stop_id']: stop for stop in json.loads(response.content)}
+        self.assertEqual([arrival['direction'] for arrival in stops[2]['arrivals']], ['O', 'I'])
+        self.assertEqual(stops[1]['arrivals'], [])
+
+    def test_since_batch(self):
+        # The arrival of STS is the same in both batches, and only ABB has changed
+        TramArrivals.objects.create(
+            arrival_time=datetime(2024, 3, 12, 12, 1, tzinfo=timezone.utc),
+            stop_id='STS', batch_id=2, direction='I', destination='BRI', status='Normal'
+        )
+        response = get_tram_display_data(self.factory.get('/api/tram/display', {'since': 1}))
+        self.assertEqual([stop['stop_id'] for stop in json.loads(response.content)], [2])
+
+        response = get_tram_display_data(self.factory.get('/api/tram/display', {'since': 2}))
+        self.assertEqual(json.loads(response.content), [])
+
+    def test_since_stop_without_arrivals(self):
+        response = get_tram_display_data(self.factory.get('/api/tram/display', {'since': 1}))
+        stops = {stop['stop_id']: stop for stop in json.loads(response.content)}
+        self.assertEqual(set(stops), {1, 2})
+        self.assertEqual(stops[1]['arrivals'], [])
+
+    def test_since_unknown_batch(self):
+        response = get_tram_display_data(self.factory.get('/api/tram/display', {'since': 0}))
+        self.assertEqual([stop['stop_id'] for stop in json.loads(response.content)], [1, 2])
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tram-positions'}})
+class TramPositionTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        stops = [(1, 'BRO', 53.3725, -6.2975), (2, 'CAB', 53.3634, -6.2822), (3, 'PHI', 53.3576, -6.2730)]
+        for stop_id, code, latitude, longitude in stops:
+            TramStop.objects.create(id=stop_id, code=code, name=code, latitude=latitude, longitude=longitude, line='Green')
+
+        update_time = datetime(2024, 3, 12, 12, 0, tzinfo=timezone.utc)
+        # An outbound tram is two minutes away from CAB, and the next one five minutes away from BRO
+        for stop_id, minutes in [('BRO', 5), ('BRO', 20), ('CAB', 2), ('PHI', 8)]:
+            TramArrivals.objects.create(
+                arrival_time=update_time + timedelta(minutes=minutes), update_time=update_time,
+                stop_id=stop_id, batch_id=1, direction='O', destination='BRI', status='Normal'
+            )
+
+    def test_positions_between_stops(self):
+        positions = get_tram_positions(1)
+        self.assertEqual(len(positions), 1)
+
+        position = positions[0]
+        self.assertEqual((position['from_stop_id'], position['to_stop_id'], position['direction']), ('BRO', 'CAB', 'O'))
+        self.assertEqual(position['minutes_to_next_stop'], 2)
+        self.assertTrue(0 < position['progress'] < 1)
+        self.assertTrue(53.3634 < position['latitude'] < 53.3725)
+
+    def test_positions_cached_per_batch(self):
+        get_tram_positions(1)
+        with self.assertNumQueries(0):
+            positions = get_tram_positions(1)
+        self.assertEqual(len(positions), 1)
+
+    def test_position_endpoint(self):
+        response = get_tram_position_data(self.factory.get('/api/tram/positions'))
+        self.assertEqual(response['ETag'], '"tram-1-json"')
+
+        data = json.loads(response.content)
+        self.assertEqual(data['batch_id'], 1)
+        self.assertEqual(len(data['tram_positions']), 1)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tram-branches'}})
+class TramBranchPositionTests(TestCase):
+    def setUp(self):
+        stops = [
+            (24, 'BEL', 53.2992, -6.3748), (25, 'COO', 53.2935, -6.3843), (26, 'HOS', 53.2893, -6.3788),
+            (27, 'TAL', 53.2874, -6.3745), (28, 'FET', 53.2935, -6.3955), (29, 'CVN', 53.2909, -6.4068)
+        ]
+        for stop_id, code, latitude, longitude in stops:
+            TramStop.objects.create(id=stop_id, code=code, name=code, latitude=latitude, longitude=longitude, line='Red')
+
+    def create_arrivals(self, batch_id, minutes):
+        update_time = datetime(2024, 3, 12, 12, 0, tzinfo=timezone.utc)
+        for stop_id, direction, minute in minutes:
+            TramArrivals.objects.create(
+                arrival_time=update_time + timedelta(minutes=minute), update_time=update_time,
+                stop_id=stop_id, batch_id=batch_id, direction=direction, destination='SAG', status='Normal'
+            )
+
+    def test_branches_not_paired(self):
+        # Tallaght and Fettercairn are consecutive IDs on different branches, and no tram runs between them
+        self.create_arrivals(1, [('TAL', 'O', 9), ('FET', 'O', 2), ('BEL', 'O', 6), ('CVN', 'O', 12)])
+        positions = get_tram_positions(1)
+
+        self.assertEqual([(position['from_stop_id'], position['to_stop_id']) for position in positions], [('BEL', 'FET')])
+
+    def test_branches_inbound(self):
+        # Inbound trams on both branches travel towards Belgard
+        self.create_arrivals(2, [('COO', 'I', 1), ('HOS', 'I', 4), ('BEL', 'I', 3), ('FET', 'I', 7), ('CVN', 'I', 2)])
+        positions = get_tram_positions(2)
+
+        segments = {(position['from_stop_id'], position['to_stop_id']) for position in positions}
+        self.assertEqual(segments, {('HOS', 'COO'), ('FET', 'BEL')})
+
+class MockLineModel:
+    def predict(self, df):
+        return pd.DataFrame({'ds': df['ds'], 'yhat': df['ds'].dt.hour * 10.0})
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tram-forecasts'}})
+class TramForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def request_predictions(self, selected_date, line='Red Line'):
+        request = self.factory.post('/api/tram/predictions', json.dumps({'date': selected_date.isoformat(), 'line': line}), content_type='application/json')
+        return get_predictions(request)
+
+    def test_materialise_forecasts(self):
+        stored = TramForecastMaterialiser({'Red Line': MockLineModel(), 'Green Line': MockLineModel()}, window_days=90).run()
+        self.assertEqual(stored, 180)
+
+        forecast = get_materialised_forecast('Red Line', date.today() + timedelta(days=89))
+        self.assertEqual(forecast['Hour'], FORECAST_HOURS)
+        self.assertEqual(forecast['Passengers'][0], 50)
+        self.assertIsNone(get_materialised_forecast('Red Line', date.today() + timedelta(days=90)))
+
+    @patch('trams.management.commands.refresh_tram_forecasts.load_line_model', return_value=MockLineModel())
+    def test_refresher_requires_shared_cache(self, mock_load_model):
+        # The web processes never see the forecasts of a refresher with a cache in its own memory
+        with self.assertRaises(CommandError):
+            call_command('refresh_tram_forecasts', '--once')
+        mock_load_model.assert_not_called()
+
+    @patch('trams.views.load_line_model')
+    def test_predictions_materialised(self, mock_load_model):
+        TramForecastMaterialiser({'Red Line': MockLineModel()}, window_days=2).run()
+
+        response = self.request_predictions(date.today() + timedelta(days=1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['Passengers'][-1], 230)
+        mock_load_model.assert_not_called()
+
+    @patch('trams.views.load_line_model', return_value=MockLineModel())
+    def test_predictions_outside_window(self, mock_load_model):
+        response = self.request_predictions(date.today() + timedelta(days=365))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['Hour']), 19)
+        mock_load_model.assert_called_once_with('Red Line')
+
+    @patch('trams.views.load_line_model', return_value=None)
+    def test_predictions_model_not_found(self, mock_load_model):
+        response = self.request_predictions(date.today() + timedelta(days=365))
+        self.assertEqual(response.status_code, 404)
@@ -1,8 +1,9 @@
 from django.urls import path
 
-from .views import get_tram_display_data, get_predictions
+from .views import get_tram_display_data, get_tram_position_data, get_predictions
 
 urlpatterns = [
     path('api/tram/display', get_tram_display_data, name='get_tram_display_data'),
+    path('api/tram/positions', get_tram_position_data, name='get_tram_position_data'),
     path('api/tram/predictions',  get_predictions, name='get_predictions')
 ]
\ No newline at end of file
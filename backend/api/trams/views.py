@@ -1,9 +1,11 @@
 from django.utils import timezone
-from django.db.models import Max, Q
+from django.db.models import F, Max, Q, Window
+from django.db.models.functions import RowNumber
 from django.http import JsonResponse
 from django.db.models import Prefetch
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.http import condition, require_GET, require_POST, require_http_methods
+from django.views.decorators.vary import vary_on_headers
 
 from rest_framework.decorators import api_view
 from rest_framework.permissions import IsAuthenticated
@@ -11,55 +13,131 @@ from rest_framework.decorators import api_view, permission_classes
 
 import os
 import json
-import pickle
 import pandas as pd
 from datetime import datetime, timedelta
 
+from project.caching import cache_post_response
+from project.responses import get_representation_etag, tabular_response
+
 from .models import TramStop , TramArrivals
+from .positions import get_tram_positions
+from .forecasts import get_materialised_forecast, load_line_model, predict_passengers, PREDICTIONS_CACHE_NAMESPACE
+
+def get_latest_tram_batch_id():
+    """
+    Retrieves the ID of the most recent batch of tram arrivals written by the ETL pipeline.
+
+    :return: The latest batch ID, or None if no tram arrivals exist.
+    :rtype: int or None
+    """
+    return TramArrivals.objects.aggregate(latest_batch_id=Max('batch_id'))['latest_batch_id']
+
+def get_tram_arrivals(batch_id):
+    """
+    Retrieves the latest arrival of every stop and direction in a batch of tram arrivals, with a single query. The
+    arrivals of each stop and direction are ranked by arrival time with a window function, and only the first one is
+    kept, which the (stop_id, direction, arrival_time) index serves.
+
+    :param batch_id: The ID of the batch of tram arrivals.
+    :type batch_id: int
+    :return: A dictionary with (stop_id, direction) tuples as keys and the latest arrivals as values, each with the
+             batch_id, arrival_time, stop_id, direction, destination and status. Empty if the batch does not exist.
+    :rtype: dict
+    """
+    latest_arrivals = TramArrivals.objects.filter(
+        batch_id=batch_id, direction__in=['O', 'I']
+    ).annotate(
+        arrival_rank=Window(RowNumber(), partition_by=[F('stop_id'), F('direction')], order_by=F('arrival_time').desc())
+    ).filter(arrival_rank=1).values(
+        'batch_id', 'arrival_time', 'stop_id', 'direction', 'destination', 'status'
+    )
+    return {(arrival['stop_id'], arrival['direction']): arrival for arrival in latest_arrivals}
+
+def get_latest_tram_arrivals():
+    """
+    Retrieves the latest arrival of every stop and direction in the latest batch of tram arrivals.
+
+    :return: A dictionary with (stop_id, direction) tuples as keys and the latest arrivals as values.
+    :rtype: dict
+    """
+    latest_batch_id = get_latest_tram_batch_id()
+    return {} if latest_batch_id is None else get_tram_arrivals(latest_batch_id)
+
+def get_arrivals_content(arrivals):
+    """
+    Strips the batch ID from the arrivals of a stop, so that the arrivals of two batches can be compared.
+
+    :param arrivals: The arrivals of a stop.
+    :type arrivals: list of dict
+    :return: The arrivals without their batch ID.
+    :rtype: list of dict
+    """
+    return [{key: value for key, value in arrival.items() if key != 'batch_id'} for arrival in arrivals]
+
+def get_tram_display_etag(request):
+    """
+    Derives the entity tag of the tram display data from the latest batch ID, so that the data is only sent again
+    when the ETL pipeline has written a new batch of arrivals. The negotiated format is part of the entity tag, and
+    the `since` parameter is not, so that clients merging deltas keep receiving 304 responses.
+
+    :param request: HttpRequest object representing the incoming request.
+    :type request: HttpRequest
+    :return: The entity tag, or None if no tram arrivals exist.
+    :rtype: str or None
+    """
+    batch_id = get_latest_tram_batch_id()
+    return None if batch_id is None else get_representation_etag(request, f"tram-{batch_id}")
 
 @csrf_exempt
-@require_POST
+@require_http_methods(['GET', 'POST'])
+@vary_on_headers('Accept')
+@condition(etag_func=get_tram_display_etag)
 def get_tram_display_data(request):
     """
     Handles a GET request to retrieve tram display data.
     This endpoint queries TramStop and TramArrivals models to fetch the latest arrival information
     for each tram stop, combines outbound and inbound arrivals, and returns the data as a JSON response.
+    The arrivals of all the stops are read from the latest batch with a single query.
+
+    The response carries an ETag derived from the latest batch ID, and GET requests with a matching If-None-Match
+    header receive a 304 response while no new batch has been written. An optional `since` query parameter with a
+    batch ID restricts the response to the stops whose arrivals in the latest batch differ from their arrivals in that
+    batch, including the stops left without arrivals. The full data is returned if the batch no longer exists. POST
+    requests are still accepted for existing clients. The latest batch ID is returned in the X-Batch-ID header, for
+    the `since` parameter of the next request. Clients accepting `application/vnd.apache.arrow.stream` receive the
+    stops as an Apache Arrow IPC stream, with the arrivals as a list column, and both responses vary on the Accept
+    header.
 
     :param request: HttpRequest object representing the incoming request.
     :type request: HttpRequest
     :return: JsonResponse object with tram display data for each tram stop.
     :rtype: JsonResponse
     """
-    tram_stops = TramStop.objects.all()
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return JsonResponse({'error': 'since must be a batch ID'}, status=400)
+
     data_list = []
+    latest_batch_id = get_latest_tram_batch_id()
+    latest_arrivals = {} if latest_batch_id is None else get_tram_arrivals(latest_batch_id)
 
-    now = datetime.now()
-    formatted_datetime = now.strftime('%Y-%m-%dT%H:%M:%S')
-    print(formatted_datetime)
-
-    for stop in tram_stops:
-        # Initialize an empty list for combined arrivals
-        combined_arrivals = []
-        
-        # Fetch the latest outbound arrival
-        latest_outbound_arrival = TramArrivals.objects.filter(
-            stop_id=stop.code, direction='O'
-        ).order_by('-arrival_time').values(
-            'batch_id', 'arrival_time', 'stop_id', 'direction', 'destination', 'status'
-        ).first()
-
-        # Fetch the latest inbound arrival
-        latest_inbound_arrival = TramArrivals.objects.filter(
-            stop_id=stop.code, direction='I'
-        ).order_by('-arrival_time').values(
-            'batch_id', 'arrival_time', 'stop_id', 'direction', 'destination', 'status'
-        ).first()
-
-        # Check if the arrivals exist before adding them to the combined list
-        if latest_outbound_arrival:
-            combined_arrivals.append(latest_outbound_arrival)
-        if latest_inbound_arrival:
-            combined_arrivals.append(latest_inbound_arrival)
+    # The arrivals the client already has, None to send every stop, including when the batch no longer exists
+    previous_arrivals = None
+    if since is not None and latest_batch_id is not None:
+        previous_arrivals = latest_arrivals if since >= latest_batch_id else (get_tram_arrivals(since) or None)
+
+    for stop in TramStop.objects.all():
+        # Combine the latest outbound and inbound arrivals of the stop
+        combined_arrivals = [latest_arrivals[key] for key in [(stop.code, 'O'), (stop.code, 'I')] if key in latest_arrivals]
+
+        # Skip the stops whose arrivals have not changed since the requested batch
+        if previous_arrivals is not None:
+            previous_combined = [previous_arrivals[key] for key in [(stop.code, 'O'), (stop.code, 'I')] if key in previous_arrivals]
+            if get_arrivals_content(combined_arrivals) == get_arrivals_content(previous_combined):
+                continue
 
         # Append the stop information and its arrivals to the data list
         data_list.append({
@@ -71,37 +149,65 @@ def get_tram_display_data(request):
             'arrivals': combined_arrivals
         })
 
-    return JsonResponse(data_list, safe=False)
+    response = tabular_response(request, data_list)
+    if latest_batch_id is not None:
+        response['X-Batch-ID'] = str(latest_batch_id)
+    return response
+
+@require_GET
+@vary_on_headers('Accept')
+@condition(etag_func=get_tram_display_etag)
+def get_tram_position_data(request):
+    """
+    Handles a GET request to retrieve the estimated positions of the trams.
+    The positions are reconstructed from the latest batch of tram arrivals, by locating every tram between the
+    consecutive stops of its line and direction, and are cached per batch ID.
+
+    The response carries the same ETag as the tram display data, derived from the latest batch ID. Clients accepting
+    `application/vnd.apache.arrow.stream` receive the positions as an Apache Arrow IPC stream, with the batch ID in
+    the schema metadata.
+
+    :param request: HttpRequest object representing the incoming request.
+    :type request: HttpRequest
+    :return: JsonResponse object with the batch ID and the estimated position of every tram.
+    :rtype: JsonResponse
+    """
+    batch_id = get_latest_tram_batch_id()
+    tram_positions = [] if batch_id is None else get_tram_positions(batch_id)
+    return tabular_response(
+        request, tram_positions,
+        json_data={'batch_id': batch_id, 'tram_positions': tram_positions},
+        metadata={'batch_id': batch_id}
+    )
 
 @csrf_exempt
 @require_POST
+@cache_post_response(60 * 60, namespace=PREDICTIONS_CACHE_NAMESPACE)
 def get_predictions(request):
+    """
+    Handles a POST request to retrieve the hourly passenger predictions of a tram line on a date.
+    The predictions of the dates within the rolling window are materialised by the refresh_tram_forecasts command
+    and read from the cache. The line model is only run for the dates outside the window, or when the forecast has
+    not been materialised yet. Responses are cached per request body until new forecasts are materialised.
+
+    :param request: HttpRequest object with the date and line in the JSON body.
+    :type request: HttpRequest
+    :return: JsonResponse object with the Hour and Passengers lists.
+    :rtype: JsonResponse
+    """
     try:
         data = json.loads(request.body)
-        selected_date = data.get('date')
+        selected_date = datetime.strptime(data.get('date'), '%Y-%m-%d').date()
         selected_line = data.get('line')
-        print("selected_line",selected_line)
-
-        model_path = os.path.join('trams/analytics/', f'{selected_line.lower().replace(" ", "_")}_model.pkl')
-        print("model_path",model_path)
-        if not os.path.exists(model_path):
-            print("not found file")
-            return JsonResponse({'error': 'Model file not found'}, status=404)
-        
-        print("file found")
-
-        with open(model_path, 'rb') as file:
-            model_data = pickle.load(file)
-            model = model_data['model'] if 'model' in model_data else model_data
-            forecast_timestamps = [datetime.strptime(selected_date, '%Y-%m-%d') + timedelta(hours=i) for i in range(5, 24)]
-            future = pd.DataFrame({ 'ds': forecast_timestamps })
-            pred = model.predict(future)
-
-            passengers = pred['yhat'].tolist()
-            hours = list(range(5, 24))
-
-            response_data = {'Hour': hours, 'Passengers': passengers}
-            return JsonResponse(response_data, safe=False)
-            
+
+        forecast = get_materialised_forecast(selected_line, selected_date)
+        if forecast is None:
+            model = load_line_model(selected_line)
+            if model is None:
+                return JsonResponse({'error': 'Model file not found'}, status=404)
+            forecast = predict_passengers(model, [selected_date])[selected_date]
+
+        return JsonResponse(forecast, safe=False)
+
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
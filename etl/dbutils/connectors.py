@@ -1,5 +1,6 @@
 import configparser
 import psycopg2 as pg
+from psycopg2.extras import execute_values
 
 class db_connectors:
 
@@ -32,6 +33,19 @@ class db_connectors:
         except pg.Error as e:
             print("error connecting to postgress service:", e)
         
+    def pg_connect_exec_values(self, query, values):
+        try:
+            print("connecting....")
+            connection = pg.connect(self.connection_str)
+            with connection:
+                with connection.cursor() as cursor:
+                    print("Executing sql query....")
+                    execute_values(cursor, query, values)
+            connection.close()
+            print("Done executing sql query :)")
+        except pg.Error as e:
+            print("error connecting to postgress service:", e)
+
     def commit_transaction(self):
         self.connection.commit()
         if self.cursor:
@@ -47,6 +47,8 @@ if __name__ == "__main__":
                 df = row.get('spark_df')
                 table_name = row.get('table_name')
                 write_to_database(df, table_name)
+            for handler in [bike_handler, tram_handler, bus_handler]:
+                handler.after_write()
             time.sleep(interval)
 
     except KeyboardInterrupt:
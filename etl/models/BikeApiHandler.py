@@ -3,6 +3,7 @@ from typing import List
 from datetime import datetime
 from pyspark.sql.types import StructType
 from models.ExternalApiHandler import ExternalApiHandler
+from dbutils import connectors
 from pyspark.sql.types import StructType, StructField, StringType, IntegerType, FloatType, TimestampType
 
 class BikeApiHandler(ExternalApiHandler):
@@ -10,6 +11,7 @@ class BikeApiHandler(ExternalApiHandler):
     def __init__(self) -> None:
         self.host = 'https://data.smartdublin.ie/dublinbikes-api/last_snapshot/'
         self.headers = {'accept':'application/json'}
+        self.bike_availability_data = []
 
     def get_table_create_queries(self) -> List[str]:
         stations_create_table_query = """
@@ -32,7 +34,35 @@ class BikeApiHandler(ExternalApiHandler):
             status VARCHAR(255)
         )
         """
-        return [stations_create_table_query, availability_create_table_query]
+        latest_availability_create_table_query = """
+        CREATE TABLE IF NOT EXISTS bike_availability_latest (
+            station_id INT PRIMARY KEY,
+            harvest_time TIMESTAMP,
+            last_update_time TIMESTAMP,
+            available_bike_stands INT,
+            available_bikes INT,
+            status VARCHAR(255)
+        )
+        """
+        return [stations_create_table_query, availability_create_table_query, latest_availability_create_table_query]
+
+    def get_latest_availability_upsert_query(self) -> str:
+        # Keep one row per station, only replaced by a newer reading, so that the harvest time of a row is the time its
+        # current reading was first harvested and unchanged readings of later snapshots leave it untouched
+        latest_availability_upsert_query = """
+        INSERT INTO bike_availability_latest (
+            station_id, harvest_time, last_update_time, available_bike_stands, available_bikes, status
+        )
+        VALUES %s
+        ON CONFLICT (station_id) DO UPDATE SET
+            harvest_time = EXCLUDED.harvest_time,
+            last_update_time = EXCLUDED.last_update_time,
+            available_bike_stands = EXCLUDED.available_bike_stands,
+            available_bikes = EXCLUDED.available_bikes,
+            status = EXCLUDED.status
+        WHERE bike_availability_latest.last_update_time < EXCLUDED.last_update_time
+        """
+        return latest_availability_upsert_query
 
     def get_bike_station_table_schema(self) -> StructType:
         bike_station_schema = StructType([
@@ -75,6 +105,21 @@ class BikeApiHandler(ExternalApiHandler):
     
     def generate_spark_dataframes(self, spark_session) -> dict:
         bike_availability_schema = self.get_bike_availability_table_schema()
-        bike_availability_data = self.fetch()
-        bike_availability_df = spark_session.createDataFrame(bike_availability_data, bike_availability_schema)
+        self.bike_availability_data = self.fetch()
+        bike_availability_df = spark_session.createDataFrame(self.bike_availability_data, bike_availability_schema)
         return [{'table_name': 'bike_availability', 'spark_df': bike_availability_df}]
+
+    def after_write(self) -> None:
+        # Upsert the snapshot appended to the history into the latest availability of each station
+        if not self.bike_availability_data:
+            return
+        values = [(
+            data_entry['station_id'],
+            data_entry['harvest_time'],
+            data_entry['last_update_time'],
+            data_entry['available_bike_stands'],
+            data_entry['available_bikes'],
+            data_entry['status']
+        ) for data_entry in self.bike_availability_data]
+        db_connection = connectors.db_connectors()
+        db_connection.pg_connect_exec_values(self.get_latest_availability_upsert_query(), values)
@@ -52,7 +52,11 @@ class BusApiHandler(ExternalApiHandler):
                 trip_id VARCHAR(255)
             )
             """
-        return [trips_create_table_query, position_create_table_query]
+        # The delays endpoint derives the version of its cached responses from the latest position
+        position_timestamp_index_query = """
+            CREATE INDEX IF NOT EXISTS bus_positions_timestamp_idx ON bus_positions (timestamp)
+            """
+        return [trips_create_table_query, position_create_table_query, position_timestamp_index_query]
 
     def fetch(self) -> dict:
         resp = requests.get(self.data_endpoint, params={'format': 'json'}, headers={'x-api-key': self.api_key})
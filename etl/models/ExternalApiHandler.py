@@ -18,4 +18,7 @@ class ExternalApiHandler:
         pass
 
     def generate_spark_dataframes(self, spark_session) -> dict:
+        pass
+
+    def after_write(self) -> None:
         pass
\ No newline at end of file
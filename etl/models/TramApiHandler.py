@@ -55,7 +55,15 @@ class TramApiHandler(ExternalApiHandler):
                 status VARCHAR(255)
             )
         """
-        return [tram_stops_table_query, tram_arrivals_table_query]
+        # The display endpoint derives its ETag from the latest batch ID
+        tram_arrivals_batch_index_query = """
+            CREATE INDEX IF NOT EXISTS tram_arrivals_batch_id_idx ON tram_arrivals (batch_id)
+        """
+        # The display endpoint reads the latest arrival of each stop and direction
+        tram_arrivals_stop_index_query = """
+            CREATE INDEX IF NOT EXISTS tram_arrivals_stop_direction ON tram_arrivals (stop_id, direction, arrival_time)
+        """
+        return [tram_stops_table_query, tram_arrivals_table_query, tram_arrivals_batch_index_query, tram_arrivals_stop_index_query]
 
     def fetch(self) -> List:
 
@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 from typing import List
 from datetime import datetime
 from pyspark.sql.types import StructType
@@ -22,6 +23,26 @@ class BikeApiHandlerTests(unittest.TestCase):
         query = self.bike_handler.get_table_create_queries()
         self.assertIsInstance(query, List)
 
+    def test_get_latest_availability_upsert_query(self):
+        query = self.bike_handler.get_latest_availability_upsert_query()
+        self.assertIn('bike_availability_latest', query)
+        self.assertIn('ON CONFLICT (station_id)', query)
+        self.assertIn('WHERE bike_availability_latest.last_update_time < EXCLUDED.last_update_time', query)
+
+    @patch('models.BikeApiHandler.connectors.db_connectors')
+    def test_after_write(self, mock_connectors):
+        self.bike_handler.bike_availability_data = [{
+            'harvest_time': datetime(2024, 3, 12, 12, 0),
+            'last_update_time': datetime(2024, 3, 12, 11, 58),
+            'station_id': 1,
+            'available_bike_stands': 5,
+            'available_bikes': 10,
+            'status': 'OPEN'
+        }]
+        self.bike_handler.after_write()
+        query, values = mock_connectors.return_value.pg_connect_exec_values.call_args[0]
+        self.assertEqual(values, [(1, datetime(2024, 3, 12, 12, 0), datetime(2024, 3, 12, 11, 58), 5, 10, 'OPEN')])
+
     def test_fetch(self):
         data = self.bike_handler.fetch()
         self.assertIsInstance(data, List)
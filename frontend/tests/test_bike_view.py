@@ -1,7 +1,10 @@
 import unittest
 from unittest.mock import patch, Mock
+import json
+import pyarrow as pa
 from pandas import DataFrame
 from views.bike_view import BikeView
+from utils.arrow_response import ARROW_STREAM_CONTENT_TYPE
 
 class TestBikeView(unittest.TestCase):
     def setUp(self):
@@ -11,6 +14,7 @@ class TestBikeView(unittest.TestCase):
     def test_fetch_bike_data(self, mock_get):
         mock_resp = Mock()
         mock_resp.raise_for_status = Mock()
+        mock_resp.headers = {'Content-Type': 'application/json'}
         mock_resp.json = Mock(return_value={'bike_station_data': []})
         mock_get.return_value = mock_resp
 
@@ -21,6 +25,7 @@ class TestBikeView(unittest.TestCase):
     def test_fetch_bike_predictions(self, mock_post):
         mock_resp = Mock()
         mock_resp.raise_for_status = Mock()
+        mock_resp.headers = {'Content-Type': 'application/json'}
         mock_resp.json = Mock(return_value={'bike_predictions': []})
         mock_post.return_value = mock_resp
 
@@ -31,11 +36,32 @@ class TestBikeView(unittest.TestCase):
     def test_fetch_recommendations(self, mock_get):
         mock_resp = Mock()
         mock_resp.raise_for_status = Mock()
+        mock_resp.headers = {'Content-Type': 'application/json'}
         mock_resp.json = Mock(return_value={'bike_recommendations': []})
         mock_get.return_value = mock_resp
 
         result = self.bike_view.fetch_recommendations()
         self.assertIsInstance(result, dict)
 
+    @patch('views.bike_view.st.session_state', new_callable=dict)
+    @patch('views.bike_view.requests.get')
+    def test_fetch_bike_data_arrow(self, mock_get, session_state):
+        table = pa.Table.from_pylist([{'id': 1, 'available_bikes': 5}, {'id': 2, 'available_bikes': 7}])
+        table = table.replace_schema_metadata({'harvest_time': json.dumps('2024-03-12T12:00:00Z')})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        mock_resp = Mock()
+        mock_resp.status_code = 200
+        mock_resp.raise_for_status = Mock()
+        mock_resp.headers = {'Content-Type': ARROW_STREAM_CONTENT_TYPE, 'ETag': '"bikes-2024-03-12T12:00:00+00:00-arrow"'}
+        mock_resp.content = sink.getvalue().to_pybytes()
+        mock_get.return_value = mock_resp
+
+        result = self.bike_view.fetch_bike_data()
+        self.assertEqual(result['available_bikes'].tolist(), [5, 7])
+        self.assertEqual(session_state['bike_display']['harvest_time'], '2024-03-12T12:00:00Z')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -7,33 +7,67 @@ from streamlit_folium import st_folium
 import folium
 
 class TestTramView(unittest.TestCase):
-    @patch('requests.post')
-    def test_fetch_data(self, mock_post):
-        # Mock the response from requests.post
-        mock_post.return_value.json.return_value = {'key': 'value'}
-        mock_post.return_value.raise_for_status.return_value = None
+    def make_response(self, status_code=200, data=None, etag='"tram-2-json"', batch_id='2'):
+        response = MagicMock(status_code=status_code)
+        response.headers = {'Content-Type': 'application/json', 'ETag': etag, 'X-Batch-ID': batch_id}
+        response.json.return_value = data
+        response.raise_for_status.return_value = None
+        return response
+
+    @patch('views.tram_view.st.session_state', new_callable=dict)
+    @patch('requests.get')
+    def test_fetch_data(self, mock_get, session_state):
+        stops = [{'stop_id': 1, 'arrivals': []}, {'stop_id': 2, 'arrivals': []}]
+        mock_get.return_value = self.make_response(data=stops)
 
         tram_view = TramView()
         data = tram_view.fetch_data()
 
-        # Check if the returned data is a dictionary
-        self.assertIsInstance(data, dict)
+        self.assertEqual(data, stops)
+        self.assertEqual(session_state['tram_display']['batch_id'], '2')
+        self.assertEqual(session_state['tram_display']['etag'], '"tram-2-json"')
 
-    def test_count_trams_on_line(self):
-        tram_view = TramView()
-        df = pd.DataFrame({
-            'line': ['red', 'green', 'red', 'green'],
-            'arrivals': [[{'arrival_time': '10:00'}], [{'arrival_time': '11:00'}], [{'arrival_time': '12:00'}], [{'arrival_time': '13:00'}]]
-        })
+    @patch('views.tram_view.st.session_state', new_callable=dict)
+    @patch('requests.get')
+    def test_fetch_data_not_modified(self, mock_get, session_state):
+        stops = [{'stop_id': 1, 'arrivals': []}]
+        session_state['tram_display'] = {'etag': '"tram-2-json"', 'batch_id': '2', 'data': stops}
+        mock_get.return_value = self.make_response(status_code=304)
+
+        data = TramView().fetch_data()
+
+        self.assertEqual(data, stops)
+        self.assertEqual(mock_get.call_args.kwargs['params'], {'since': '2'})
+        self.assertEqual(mock_get.call_args.kwargs['headers']['If-None-Match'], '"tram-2-json"')
+
+    @patch('views.tram_view.st.session_state', new_callable=dict)
+    @patch('requests.get')
+    def test_fetch_data_merges_changed_stops(self, mock_get, session_state):
+        session_state['tram_display'] = {
+            'etag': '"tram-2-json"', 'batch_id': '2',
+            'data': [{'stop_id': 1, 'arrivals': ['old']}, {'stop_id': 2, 'arrivals': ['old']}]
+        }
+        mock_get.return_value = self.make_response(data=[{'stop_id': 2, 'arrivals': ['new']}], etag='"tram-3-json"', batch_id='3')
+
+        data = TramView().fetch_data()
 
-        total_trams, cutoff_index, station_names = tram_view.count_trams_on_line(df, 'red')
+        self.assertEqual(data, [{'stop_id': 1, 'arrivals': ['old']}, {'stop_id': 2, 'arrivals': ['new']}])
+        self.assertEqual(session_state['tram_display']['batch_id'], '3')
 
+    @patch('views.tram_view.st.session_state', new_callable=dict)
+    @patch('requests.get')
+    def test_fetch_tram_positions(self, mock_get, session_state):
+        positions = [{
+            'line': 'Green', 'direction': 'O', 'from_stop_id': 'BRO', 'to_stop_id': 'CAB', 'to_stop_name': 'Cabra',
+            'minutes_to_next_stop': 2.0, 'progress': 0.4, 'latitude': 53.368, 'longitude': -6.290
+        }]
+        mock_get.return_value = self.make_response(data={'batch_id': 2, 'tram_positions': positions}, batch_id=None)
 
-        # Check if the returned values are as expected
-        self.assertEqual(total_trams, 0)
-        self.assertEqual(cutoff_index, [])
-        self.assertEqual(station_names, [])
+        data = TramView().fetch_tram_positions()
 
+        self.assertEqual(data, positions)
+        self.assertEqual(mock_get.call_args.args[0], 'http://127.0.0.1:8000/api/tram/positions')
+        self.assertEqual(session_state['tram_positions'], {'etag': '"tram-2-json"', 'data': positions})
 
     @patch('requests.post')
     def test_fetch_passenger_predictions(self, mock_post):
@@ -0,0 +1,36 @@
+import json
+import pyarrow as pa
+
+ARROW_STREAM_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def accept_arrow(headers):
+    '''
+    ### Adds the Apache Arrow stream to the accepted formats of a request.
+
+    The backend answers with an Arrow IPC stream instead of JSON when it can, which is much cheaper
+    to serialize, transfer and turn into a DataFrame for large responses.
+    '''
+    headers['Accept'] = f'{ARROW_STREAM_CONTENT_TYPE}, application/json'
+    return headers
+
+
+def is_arrow(response):
+    '''
+    ### Checks whether the backend answered with an Arrow IPC stream.
+
+    The media type of the Content-Type header must match exactly, ignoring its parameters.
+    '''
+    content_type = response.headers.get('Content-Type', '')
+    return isinstance(content_type, str) and content_type.split(';')[0].strip() == ARROW_STREAM_CONTENT_TYPE
+
+
+def read_arrow_table(response):
+    '''
+    ### Reads an Arrow IPC stream response.
+
+    Returns the table and the values the backend stored JSON encoded in the schema metadata.
+    '''
+    table = pa.ipc.open_stream(response.content).read_all()
+    metadata = {key.decode(): json.loads(value) for key, value in (table.schema.metadata or {}).items() if not key.startswith(b'pandas')}
+    return table, metadata
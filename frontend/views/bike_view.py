@@ -5,6 +5,7 @@ from streamlit_folium import folium_static
 import requests
 from .views_Inerface import ViewInterface
 from utils.user_auth import UserAuthenticator
+from utils.arrow_response import accept_arrow, is_arrow, read_arrow_table
 import json
 from folium.plugins import MarkerCluster
 class BikeView(ViewInterface):
@@ -35,15 +36,39 @@ class BikeView(ViewInterface):
 
     @staticmethod
     def fetch_bike_data():
-        url = 'http://127.0.0.1:8000/api/bikes/display'
+        url = 'http://127.0.0.1:8000/api/bikes/display/'
         cookie_manager = UserAuthenticator.get_manager("bike")
-        headers = UserAuthenticator.prepare_api_headers(cookie_manager)
+        headers = accept_arrow(UserAuthenticator.prepare_api_headers(cookie_manager))
+
+        # Only ask for the stations changed since the last snapshot we have, or nothing if there is no new snapshot
+        cached = st.session_state.get('bike_display')
+        params = {}
+        if cached is not None:
+            headers['If-None-Match'] = cached['etag']
+            params['since'] = cached['harvest_time']
         try:
-            response = requests.get(url,headers=headers)
+            response = requests.get(url, headers=headers, params=params)
             response.raise_for_status()  # This will raise an exception for HTTP error responses
-            data = response.json()
-            bike_station_data = data['bike_station_data']
-            return pd.DataFrame(bike_station_data)
+            if response.status_code == 304:
+                return cached['bike_station_data'].copy()
+            if is_arrow(response):
+                table, data = read_arrow_table(response)
+                bike_station_data = table.to_pandas()
+            else:
+                data = response.json()
+                bike_station_data = pd.DataFrame(data['bike_station_data'])
+            if cached is not None and not bike_station_data.empty:
+                unchanged = cached['bike_station_data'][~cached['bike_station_data']['id'].isin(bike_station_data['id'])]
+                bike_station_data = pd.concat([unchanged, bike_station_data]).sort_values('id', ignore_index=True)
+            elif cached is not None:
+                bike_station_data = cached['bike_station_data']
+            if response.headers.get('ETag') and data.get('harvest_time'):
+                st.session_state['bike_display'] = {
+                    'etag': response.headers['ETag'],
+                    'harvest_time': data['harvest_time'],
+                    'bike_station_data': bike_station_data
+                }
+            return bike_station_data.copy()
         except requests.exceptions.RequestException as e:
             st.error(f"Error while fetching data: {e}")
             return pd.DataFrame()
@@ -54,11 +79,13 @@ class BikeView(ViewInterface):
             try:
                 url = 'http://127.0.0.1:8000/api/bikes/predictions'
                 cookie_manager = UserAuthenticator.get_manager("bike")
-                headers = UserAuthenticator.prepare_api_headers(cookie_manager)
+                headers = accept_arrow(UserAuthenticator.prepare_api_headers(cookie_manager))
                 payload = {'forecast_timedelta': prediction_timedelta}
                 headers['Content-Type'] = 'application/json'
                 response = requests.post(url, json=payload, headers=headers)
                 response.raise_for_status()  # This will raise an exception for HTTP error responses
+                if is_arrow(response):
+                    return read_arrow_table(response)[0].to_pandas()
                 data = response.json()
                 bike_predictions = data['bike_predictions']
                 return pd.DataFrame(bike_predictions)
@@ -6,6 +6,7 @@ import plotly.express as px
 from datetime import datetime
 from .views_Inerface import ViewInterface
 from utils.user_auth import UserAuthenticator
+from utils.arrow_response import accept_arrow, is_arrow, read_arrow_table
 
 class BusView(ViewInterface):
     def __init__(self):
@@ -14,7 +15,7 @@ class BusView(ViewInterface):
     def fetch_data(self):
         # Fetch bus delay data
         cookie_manager = UserAuthenticator.get_manager("bus")
-        headers = UserAuthenticator.prepare_api_headers(cookie_manager)
+        headers = accept_arrow(UserAuthenticator.prepare_api_headers(cookie_manager))
         url = 'http://127.0.0.1:8000/api/bus/display'
         now = datetime(2024, 3, 21, 21, 0, 0)
         data = {
@@ -22,6 +23,8 @@ class BusView(ViewInterface):
             'end_time': now.strftime('%Y-%m-%d %H:%M') # End at the current time
         }
         resp = requests.post(url, data=json.dumps(data), headers=headers)
+        if is_arrow(resp):
+            return read_arrow_table(resp)[0].to_pandas()
         return resp.json()
 
     def display_data(self, data):
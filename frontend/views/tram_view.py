@@ -8,6 +8,7 @@ import requests
 from .views_Inerface import ViewInterface
 import matplotlib.pyplot as plt
 from utils.user_auth import UserAuthenticator
+from utils.arrow_response import accept_arrow, is_arrow, read_arrow_table
 
 
 class TramView(ViewInterface):
@@ -16,51 +17,69 @@ class TramView(ViewInterface):
 
     def fetch_data(self):
         cookie_manager = UserAuthenticator.get_manager("tram_fetch")
-        headers = UserAuthenticator.prepare_api_headers(cookie_manager) 
+        headers = accept_arrow(UserAuthenticator.prepare_api_headers(cookie_manager))
         base_url = 'http://127.0.0.1:8000'
         url = f"{base_url}/api/tram/display"
+
+        # Only ask for the stops with newer arrivals than the batch we have, or nothing if there is no new batch
+        cached = st.session_state.get('tram_display')
+        params = {}
+        if cached is not None:
+            headers['If-None-Match'] = cached['etag']
+            params['since'] = cached['batch_id']
         try:
-            response = requests.post(url,headers=headers)
+            response = requests.get(url, headers=headers, params=params)
             response.raise_for_status()
-            data = response.json()
+            if response.status_code == 304:
+                return cached['data']
+            data = read_arrow_table(response)[0].to_pylist() if is_arrow(response) else response.json()
+            if cached is not None:
+                changed_stops = {stop['stop_id'] for stop in data}
+                data = sorted(
+                    [stop for stop in cached['data'] if stop['stop_id'] not in changed_stops] + data,
+                    key=lambda stop: stop['stop_id']
+                )
+            # The backend returns the batch of the data in a header, for the next delta request
+            etag = response.headers.get('ETag')
+            batch_id = response.headers.get('X-Batch-ID')
+            if etag and batch_id:
+                st.session_state['tram_display'] = {'etag': etag, 'batch_id': batch_id, 'data': data}
             return data
         except requests.exceptions.RequestException as e:
             print(f"Error while fetching data: {e}")
             return None
 
-    def count_trams_on_line(self, df, line):
-        #only get the rows where the line is the same as the input line
-        df = df[df['line'].str.lower() == line.lower()]
-        #apply the calculations to quantify the amount of trams on the line:
-        total_trams = 0
-        cutoff_index = []
-        station_names = []
-        for i in range(df.shape[0]-1):
-            #previous
-            p = df.iloc[i]['arrivals'][0]['arrival_time']
-            #current
-            c = df.iloc[i+1]['arrivals'][0]['arrival_time']
-            #if previous or current are none, skip
-            if (p == None) or (c == None):
-                continue
-            elif (p < c) or (p == c):
-                continue
-            elif p > c:
-                #add the tram to the counter
-                total_trams+=1
-                #add the index to the cutoff index
-                cutoff_index.append(i)
-                #add the names of the station
-                station_names.append(df.iloc[i]['stop_name'])
-        return total_trams, cutoff_index, station_names
+    def fetch_tram_positions(self):
+        '''
+        ### Fetches the tram positions the backend estimates from the latest arrivals.
+
+        The positions only change with a new batch of arrivals, so they are kept with their ETag and only
+        fetched again when the backend has a newer batch.
+        '''
+        cookie_manager = UserAuthenticator.get_manager("tram_positions")
+        headers = accept_arrow(UserAuthenticator.prepare_api_headers(cookie_manager))
+        url = 'http://127.0.0.1:8000/api/tram/positions'
+
+        cached = st.session_state.get('tram_positions')
+        if cached is not None:
+            headers['If-None-Match'] = cached['etag']
+        try:
+            response = requests.get(url, headers=headers)
+            response.raise_for_status()
+            if response.status_code == 304:
+                return cached['data']
+            data = read_arrow_table(response)[0].to_pylist() if is_arrow(response) else response.json()['tram_positions']
+            etag = response.headers.get('ETag')
+            if etag:
+                st.session_state['tram_positions'] = {'etag': etag, 'data': data}
+            return data
+        except requests.exceptions.RequestException as e:
+            print(f"Error while fetching tram positions: {e}")
+            return []
 
     def display_data(self, data):
         tram_stop_info = pd.DataFrame(data)
 
-        station_coords = {}
-        for _, row in tram_stop_info.iterrows():
-            station_coords[row['stop_name']] = [row['latitude'], row['longitude']]
-
         m = folium.Map(location=[53.349805, -6.260310], zoom_start=12)
         for _, row in tram_stop_info.iterrows():
             color = 'green' if row['line'].lower() == 'green' else 'red'
@@ -79,33 +98,18 @@ class TramView(ViewInterface):
                 tooltip=folium.Tooltip(tooltip_content, style="font-family: Arial; color: black;")
             ).add_to(m)
 
-        #Get the station names for red and green lines
-        totalred, cutred, statred = self.count_trams_on_line(tram_stop_info, 'red')
-        totalgreen, cutgreen, statgreen = self.count_trams_on_line(tram_stop_info, 'green')
-
-        # Add tram markers between stations for red line
-        for station in statred:
-            if station in station_coords:
-                station_index = tram_stop_info[tram_stop_info['stop_name'] == station].index[0]
-                if station_index > 0:
-                    prev_station = tram_stop_info.iloc[station_index - 1]['stop_name']
-                    if prev_station in station_coords:
-                        start_coords = station_coords[prev_station]
-                        end_coords = station_coords[station]
-                        midpoint_coords = [(start_coords[0] + end_coords[0]) / 2, (start_coords[1] + end_coords[1]) / 2]
-                        folium.Marker(location=midpoint_coords, icon=folium.Icon(color='red', icon='train-tram', prefix='fa')).add_to(m)
-
-        # Add tram markers between stations for green line
-        for station in statgreen:
-            if station in station_coords:
-                station_index = tram_stop_info[tram_stop_info['stop_name'] == station].index[0]
-                if station_index > 0:
-                    prev_station = tram_stop_info.iloc[station_index - 1]['stop_name']
-                    if prev_station in station_coords:
-                        start_coords = station_coords[prev_station]
-                        end_coords = station_coords[station]
-                        midpoint_coords = [(start_coords[0] + end_coords[0]) / 2, (start_coords[1] + end_coords[1]) / 2]
-                        folium.Marker(location=midpoint_coords, icon=folium.Icon(color='green', icon='train-tram', prefix='fa')).add_to(m)
+        # Add a marker at the estimated position of every tram
+        for position in self.fetch_tram_positions():
+            color = 'green' if position['line'].lower() == 'green' else 'red'
+            tooltip_content = f"Line: {position['line']}<br>" \
+                              f"Direction: {position['direction']}<br>" \
+                              f"Next Stop: {position['to_stop_name']}<br>" \
+                              f"Minutes to Next Stop: {position['minutes_to_next_stop']:.0f}"
+            folium.Marker(
+                location=[position['latitude'], position['longitude']],
+                icon=folium.Icon(color=color, icon='train-tram', prefix='fa'),
+                tooltip=folium.Tooltip(tooltip_content, style="font-family: Arial; color: black;")
+            ).add_to(m)
 
         folium_static(m)
 
@@ -126,14 +130,6 @@ class TramView(ViewInterface):
             else:
                 st.error("No passenger predictions available for the selected date.")
 
-        # Testing code, returns the text in the console for now!
-        print(f"Red trams cutoff stations: {statred}")
-        print(f"Green trams cutoff stations: {statgreen}")
-        print(f"Total red trams: {totalred}")
-        print(f"Total green trams: {totalgreen}")
-        print(cutred)
-        print(cutgreen)
-
     def fetch_passenger_predictions(self, selected_date, selected_line):
         base_url = 'http://127.0.0.1:8000'
         url = f"{base_url}/api/tram/predictions"